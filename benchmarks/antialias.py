@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import signal as sp_signal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype.effects import fuzz, overdrive  # noqa: E402
+
+
+modes = [
+    ('plain', 0, 1),
+    ('adaa1', 1, 1),
+    ('adaa2', 2, 1),
+    ('os2', 0, 2),
+    ('os2 + adaa1', 1, 2),
+    ('os2 + adaa2', 2, 2),
+]
+
+
+def alias_level(y, fs, freq, skip):
+    # power outside the true (unfolded) harmonics, relative to the fundamental
+    y = y[skip:]
+    window = sp_signal.get_window('blackmanharris', len(y))
+    power = np.abs(np.fft.rfft(y * window)) ** 2
+    bin_hz = fs / len(y)
+
+    harmonic = np.zeros(len(power), dtype=bool)
+    for k in range(1, int(fs / 2 // freq) + 1):
+        center = int(round(k * freq / bin_hz))
+        harmonic[max(center - 4, 0):center + 5] = True
+
+    fundamental = power[int(round(freq / bin_hz)) - 4:int(round(freq / bin_hz)) + 5].sum()
+    harmonic[:5] = True
+    return 10 * np.log10(power[~harmonic].sum() / fundamental)
+
+
+def brute_force(effect_fn, signal, factor=8, **kwargs):
+    up = sp_signal.resample_poly(signal, factor, 1)
+    return sp_signal.resample_poly(effect_fn(up, **kwargs), 1, factor).astype(np.float32)
+
+
+def timed(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        y = fn()
+        best = min(best, time.perf_counter() - start)
+
+    return y, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='alias level against CPU cost for the fuzz / overdrive antialiasing modes')
+    parser.add_argument('--fs', type=int, default=48000)
+    parser.add_argument('--freq', type=float, default=1244.5, help='test tone, off the bin grid of its aliases')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--gain', type=float, default=10.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    t = np.arange(int(args.seconds * args.fs)) / args.fs
+    signal = (0.8 * np.sin(2 * np.pi * args.freq * t)).astype(np.float32)
+    skip = args.fs // 10
+
+    for effect_fn, kwargs in ((fuzz, dict(gain=args.gain, threshold=0.5)), (overdrive, dict(gain=args.gain))):
+        print(f"\n{effect_fn.__name__} (gain {args.gain}, {args.freq} Hz at {args.fs} Hz)")
+        print(f"{'mode':<14} {'alias dB':>9} {'ns/sample':>10} {'x real-time':>12} {'cost':>6}")
+
+        rows = [(name, lambda adaa=adaa, oversample=oversample: effect_fn(signal, adaa=adaa, oversample=oversample, **kwargs))
+                for name, adaa, oversample in modes]
+        rows.append(('os8 (resample)', lambda: brute_force(effect_fn, signal, **kwargs)))
+
+        base = None
+        for name, fn in rows:
+            y, elapsed = timed(fn, args.repeat)
+            base = base or elapsed
+            print(f"{name:<14} {alias_level(y, args.fs, args.freq, skip):9.1f} {1e9 * elapsed / len(signal):10.1f} "
+                  f"{len(signal) / args.fs / elapsed:12.0f} {elapsed / base:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype import biquad, lowpass, highpass, bandpass  # noqa: E402
+from prototype.config import precision  # noqa: E402
+from prototype.filters import biquad_sos, butter_sos, sos_filter  # noqa: E402
+
+
+def reference_biquad(input_signal, b0, b1, b2, a1, a2):
+    # the original per-sample direct form I loop
+    output_signal = np.zeros_like(input_signal)
+
+    x_1 = 0.0
+    x_2 = 0.0
+    y_1 = 0.0
+    y_2 = 0.0
+
+    for i in range(len(input_signal)):
+        x_0 = input_signal[i]
+
+        y_0 = (b0 * x_0) + (b1 * x_1) + (b2 * x_2) - (a1 * y_1) - (a2 * y_2)
+
+        x_2 = x_1
+        x_1 = x_0
+        y_2 = y_1
+        y_1 = y_0
+
+        output_signal[i] = y_0
+
+    return output_signal
+
+
+def reference(signal, sos):
+    # every section of the cascade through the loop, one channel at a time
+    output = np.array(signal, dtype=np.float64)
+    for channel in output.reshape(-1, output.shape[-1]):
+        for b0, b1, b2, a0, a1, a2 in sos:
+            channel[...] = reference_biquad(channel, b0 / a0, b1 / a0, b2 / a0, a1 / a0, a2 / a0)
+
+    return output
+
+
+def streamed(signal, sos, block_size):
+    block = sos_filter(sos)
+    return np.concatenate([block.process_block(signal[..., start:start + block_size])
+                           for start in range(0, signal.shape[-1], block_size)], axis=-1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='vectorized SOS filters against the per-sample reference loop')
+    parser.add_argument('--fs', type=int, default=48000)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--tolerance', type=float, default=1e-9)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    fs = args.fs
+    signal = np.random.default_rng(args.seed).uniform(-1.0, 1.0, (args.channels, int(fs * args.seconds)))
+    seconds = signal.shape[-1] / fs
+
+    # (label, vectorized call, sos the reference loop runs)
+    cases = [
+        ('biquad', lambda s: biquad(s, 0.2, 0.3, 0.2, -0.5, 0.2), biquad_sos(0.2, 0.3, 0.2, -0.5, 0.2)),
+        ('lowpass 800 Hz', lambda s: lowpass(s, fs, 800.0), butter_sos('low', 800.0, fs)),
+        ('highpass 80 Hz order 4', lambda s: highpass(s, fs, 80.0, order=4), butter_sos('high', 80.0, fs, 4)),
+        ('bandpass 300-3000 Hz', lambda s: bandpass(s, fs), butter_sos('band', [300.0, 3000.0], fs)),
+    ]
+
+    failed = False
+    print(f"{args.channels} channels x {seconds:.1f} s, float64, streaming in {args.block_size}-sample blocks")
+    print(f"{'filter':<24} {'loop RTF':>10} {'RTF':>10} {'speedup':>9} {'max error':>10} {'streamed':>10}")
+
+    with precision('float64'):
+        for label, vectorized, sos in cases:
+            start = time.perf_counter()
+            expected = reference(signal, sos)
+            loop_time = time.perf_counter() - start
+
+            vectorized(signal)
+            start = time.perf_counter()
+            output = vectorized(signal)
+            elapsed = time.perf_counter() - start
+
+            error = float(np.max(np.abs(output - expected)))
+            stream_error = float(np.max(np.abs(streamed(signal, sos, args.block_size) - expected)))
+            failed |= max(error, stream_error) > args.tolerance
+
+            print(f"{label:<24} {seconds / loop_time:9.1f}x {seconds / elapsed:9.0f}x {loop_time / elapsed:8.0f}x "
+                  f"{error:10.2e} {stream_error:10.2e}")
+
+    if failed:
+        print(f"output differs from the reference loop by more than {args.tolerance:g}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+heavy_modules = ('scipy', 'matplotlib', 'numba')
+
+# statements a short-lived worker typically runs, each in a fresh interpreter
+scenarios = {
+    'numpy': 'import numpy',
+    'import prototype': 'import prototype',
+    'fuzz + save_audio': 'from prototype import fuzz, save_audio',
+    'streaming chain': 'from prototype import block_chain, fuzz, delay',
+    'cli': 'import prototype.cli',
+}
+
+# modules a scenario must not load at import time
+forbidden = {
+    'import prototype': heavy_modules,
+    'fuzz + save_audio': heavy_modules,
+    'streaming chain': heavy_modules,
+    'cli': ('matplotlib', 'numba'),
+}
+
+probe = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'max_rss_kb': rss, 'modules': sorted(sys.modules)}}))
+'''
+
+
+def measure(statement, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', probe.format(statement=statement)], cwd=root, check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(json.loads(output))
+
+    best = min(runs, key=lambda run: run['seconds'])
+    return best['seconds'], best['max_rss_kb'], set(best['modules'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='import time and memory of the prototype package, in fresh interpreters')
+    parser.add_argument('--repeat', type=int, default=5, help='interpreter launches per scenario, the fastest counts')
+    parser.add_argument('--max-ms', type=float, default=100.0,
+                        help='fail if a scenario takes this much longer than importing numpy alone')
+    args = parser.parse_args(argv)
+
+    failures = []
+    numpy_seconds = None
+
+    print(f"{'scenario':<20} {'ms':>8} {'over numpy':>11} {'max rss MB':>11}  heavy modules loaded")
+    for name, statement in scenarios.items():
+        seconds, rss_kb, modules = measure(statement, args.repeat)
+        numpy_seconds = seconds if numpy_seconds is None else numpy_seconds
+        extra_ms = (seconds - numpy_seconds) * 1e3
+
+        loaded = [m for m in heavy_modules if m in modules]
+        print(f"{name:<20} {seconds * 1e3:8.1f} {extra_ms:11.1f} {rss_kb / 1024:11.1f}  {', '.join(loaded) or '-'}")
+
+        banned = [m for m in forbidden.get(name, ()) if m in modules]
+        if banned:
+            failures.append(f"{name}: imports {', '.join(banned)}")
+        if name != 'numpy' and extra_ms > args.max_ms:
+            failures.append(f"{name}: {extra_ms:.1f} ms over numpy, limit {args.max_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype.dynamics import sliding_max, compressor, noise_gate  # noqa: E402
+from signals import guitar_signal  # noqa: E402
+
+
+def timed(fn, repeat):
+    fn()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='sliding-window peak and lookahead dynamics cost against window size')
+    parser.add_argument('--fs', type=int, default=48000)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--lookahead-ms', type=float, nargs='+', default=[0.5, 2.0, 5.0, 20.0, 100.0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    signal = guitar_signal(args.fs, args.seconds)
+    levels = np.abs(signal)
+
+    print(f"{'lookahead ms':>12} {'window':>7} {'sliding_max':>12} {'naive':>10} {'compressor':>11} {'noise_gate':>11}  ns/sample")
+    for lookahead_ms in args.lookahead_ms:
+        window = int(round(args.fs * lookahead_ms / 1000.0)) + 1
+
+        fast = timed(lambda: sliding_max(levels, window), args.repeat)
+        # the direct max over every window is O(n * window), only run it for short windows
+        naive = '-'
+        if window <= 256:
+            elapsed = timed(lambda: np.lib.stride_tricks.sliding_window_view(levels, window).max(axis=-1), 1)
+            naive = f"{1e9 * elapsed / len(signal):10.2f}"
+
+        comp = timed(lambda: compressor(signal, args.fs, lookahead_ms=lookahead_ms), args.repeat)
+        gate = timed(lambda: noise_gate(signal, args.fs, lookahead_ms=lookahead_ms, hysteresis_db=6.0), args.repeat)
+        print(f"{lookahead_ms:12.1f} {window:7d} {1e9 * fast / len(signal):12.2f} {naive:>10} "
+              f"{1e9 * comp / len(signal):11.2f} {1e9 * gate / len(signal):11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype.parallel import chunk_renderer  # noqa: E402
+from signals import guitar_signal  # noqa: E402
+from suite import full_chain  # noqa: E402
+
+
+def sequential(signal, chain):
+    for effect_fn, kwargs in chain:
+        signal = effect_fn(signal, **kwargs)
+
+    return signal
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='chunk-parallel offline rendering against one whole-file pass')
+    parser.add_argument('--fs', type=int, default=48000)
+    parser.add_argument('--seconds', type=float, default=120.0)
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    args = parser.parse_args(argv)
+
+    signal = np.stack([guitar_signal(args.fs, args.seconds)] * args.channels)
+    chain = full_chain(args.fs)
+
+    sequential(signal[..., :args.fs], chain)
+    start = time.perf_counter()
+    reference = sequential(signal, chain)
+    seq_time = time.perf_counter() - start
+    print(f"{os.cpu_count()} cores, {args.seconds:.0f} s x {args.channels} channels, sequential {seq_time:.2f} s")
+
+    print(f"{'workers':>8} {'chunks':>7} {'overlap':>8} {'time s':>8} {'speedup':>8} {'max seam error':>15}")
+    for workers in dict.fromkeys(args.workers):
+        renderer = chunk_renderer(chain, workers=workers, tolerance=args.tolerance)
+        chunks = renderer.chunks(signal.shape[-1])
+        overlap = (renderer.preroll + renderer.postroll) * (len(chunks) - 1) / signal.shape[-1]
+
+        # the pool is started before timing, a long render pays for it once
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            renderer.render(signal[..., :args.fs], pool=pool)
+            start = time.perf_counter()
+            output = renderer.render(signal, pool=pool)
+            elapsed = time.perf_counter() - start
+
+        print(f"{workers:8d} {len(chunks):7d} {overlap:7.1%} {elapsed:8.2f} {seq_time / elapsed:7.2f}x "
+              f"{np.max(np.abs(output - reference)):15.2e}")
+
+    print()
+    print(renderer.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype.pipeline import pipelined_chain  # noqa: E402
+from prototype.streaming import block_chain, block_for  # noqa: E402
+from signals import guitar_signal  # noqa: E402
+from suite import full_chain  # noqa: E402
+
+
+def timed(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best, output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='pipelined chain against sequential block execution')
+    parser.add_argument('--fs', type=int, default=48000)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[256, 1024, 4096, 16384])
+    parser.add_argument('--threads', type=int, nargs='+', default=[2, 4, 0], help='0 is one thread per stage')
+    parser.add_argument('--queue-size', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    signal = np.stack([guitar_signal(args.fs, args.seconds)] * args.channels)
+    chain = full_chain(args.fs)
+    print(f"{os.cpu_count()} cores, {len(chain)} stages, {args.seconds:.0f} s x {args.channels} channels")
+
+    print(f"{'block':>6} {'threads':>8} {'sequential s':>13} {'pipelined s':>12} {'speedup':>8} {'identical':>10}")
+    for block_size in args.block_sizes:
+        sequential = block_chain([block_for(effect_fn, **kwargs) for effect_fn, kwargs in chain])
+        seq_time, reference = timed(lambda: sequential.reset().process(signal, block_size), args.repeat)
+
+        for threads in args.threads:
+            pipeline = pipelined_chain(chain, threads=threads or None, queue_size=args.queue_size)
+            pipe_time, output = timed(lambda: pipeline.reset().process(signal, block_size), args.repeat)
+            print(f"{block_size:6d} {threads or len(chain):8d} {seq_time:13.3f} {pipe_time:12.3f} "
+                  f"{seq_time / pipe_time:7.2f}x {str(np.array_equal(output, reference)):>10}")
+
+    # the last run's per-stage report, then the same chain re-split on its measured costs
+    print()
+    print(pipeline.summary())
+    balanced = pipelined_chain(chain, threads=max(args.threads) or None, queue_size=args.queue_size,
+                               costs=[stage['cpu_s'] for stage in pipeline.report()])
+    balanced_time, _ = timed(lambda: balanced.reset().process(signal, args.block_sizes[-1]), args.repeat)
+    print(f"\nbalanced on measured cost: {balanced.groups}, {balanced_time:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype.resampling import resample, resampler, design  # noqa: E402
+from prototype.dynamics import compressor, noise_gate  # noqa: E402
+from prototype.modulation import vibrato, chorus  # noqa: E402
+from signals import guitar_signal  # noqa: E402
+
+
+def timed(fn, repeat):
+    fn()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def streamed(signal, fs_in, fs_out, quality, block_size):
+    converter = resampler(fs_in, fs_out, quality)
+    for start in range(0, len(signal), block_size):
+        converter.process_block(signal[start:start + block_size])
+    converter.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='polyphase resampling and decimated control-rate cost')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--control-rates', type=int, nargs='+', default=[1, 8, 16, 32, 64])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    from scipy import signal as sp_signal
+
+    print(f"{'conversion':>14} {'quality':>8} {'taps':>6} {'design ms':>10} {'offline':>9} {'streamed':>9} {'scipy':>9}  "
+          f"ns/input sample")
+    for fs_in, fs_out in ((44100, 48000), (48000, 44100), (96000, 48000), (48000, 96000)):
+        signal = guitar_signal(fs_in, args.seconds)
+        for quality in ('low', 'medium', 'high'):
+            start = time.perf_counter()
+            d = design(fs_in, fs_out, quality)
+            design_ms = 1000.0 * (time.perf_counter() - start)
+
+            offline = timed(lambda: resample(signal, fs_in, fs_out, quality), args.repeat)
+            stream = timed(lambda: streamed(signal, fs_in, fs_out, quality, args.block_size), 1)
+            reference = timed(lambda: sp_signal.resample_poly(signal, d.up, d.down, window=d.taps / d.up), args.repeat)
+            print(f"{fs_in // 1000:>6}k->{fs_out // 1000:>3}k {quality:>8} {len(d.taps):6d} {design_ms:10.2f} "
+                  f"{1e9 * offline / len(signal):9.2f} {1e9 * stream / len(signal):9.2f} "
+                  f"{1e9 * reference / len(signal):9.2f}")
+
+    fs = 48000
+    signal = np.stack([guitar_signal(fs, args.seconds)] * 2)
+    print(f"\n{'control rate':>12} {'compressor':>11} {'noise_gate':>11} {'vibrato':>9} {'chorus':>9}  ns/sample")
+    for control_rate in args.control_rates:
+        comp = timed(lambda: compressor(signal, fs, control_rate=control_rate), args.repeat)
+        gate = timed(lambda: noise_gate(signal, fs, control_rate=control_rate), args.repeat)
+        vib = timed(lambda: vibrato(signal, fs, control_rate=control_rate), args.repeat)
+        cho = timed(lambda: chorus(signal, fs, control_rate=control_rate), args.repeat)
+        print(f"{control_rate:12d} {1e9 * comp / signal.size:11.2f} {1e9 * gate / signal.size:11.2f} "
+              f"{1e9 * vib / signal.size:9.2f} {1e9 * cho / signal.size:9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+# open-string fundamentals of a standard-tuned guitar
+string_freqs = (82.41, 110.0, 146.83, 196.0, 246.94, 329.63)
+
+
+def guitar_signal(fs, seconds, seed=0, notes_per_second=4):
+    # deterministic plucked notes: decaying harmonics with a noisy attack and a little hum,
+    # so dynamics, gates and filters see realistic onsets, decays and quiet gaps
+    rng = np.random.default_rng(seed)
+    num_samples = int(fs * seconds)
+    signal = np.zeros(num_samples)
+
+    note_len = int(fs / notes_per_second)
+    t = np.arange(2 * note_len) / fs
+
+    for start in range(0, num_samples, note_len):
+        freq = string_freqs[rng.integers(len(string_freqs))] * 2 ** (rng.integers(0, 13) / 12)
+        velocity = rng.uniform(0.2, 0.9)
+
+        note = np.zeros(len(t))
+        for k in range(1, 12):
+            if k * freq >= fs / 2:
+                break
+            note += np.sin(2 * np.pi * k * freq * t + rng.uniform(0, 2 * np.pi)) * np.exp(-t * (3 + 2 * k)) / k
+
+        attack = min(len(t), int(0.005 * fs))
+        note[:attack] += rng.standard_normal(attack) * np.linspace(0.3, 0, attack)
+
+        end = min(num_samples, start + len(note))
+        signal[start:end] += velocity * note[:end - start]
+
+    signal += 0.002 * np.sin(2 * np.pi * 60 * np.arange(num_samples) / fs)
+    signal += 0.0005 * rng.standard_normal(num_samples)
+    return (0.9 * signal / np.max(np.abs(signal))).astype(np.float32)
@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+from prototype import (load_audio, save_audio, normalize_audio, fuzz, overdrive, waveshaper, delay,  # noqa: E402
+                       cabinet, generate_cab_ir, biquad, lowpass, highpass, bandpass, compressor, noise_gate,
+                       compute_envelope, tremolo, vibrato, chorus, flanger, plot_time_domain, plot_frequency_domain,
+                       plot_comparison, guitar_processor, block_chain, block_for, array_reader, resample,
+                       pipelined_chain, render_parallel)
+from prototype.compiler import compile_chain  # noqa: E402
+from signals import guitar_signal  # noqa: E402
+
+
+def full_chain(fs):
+    return [
+        (noise_gate, dict(fs=fs, threshold_db=-50.0)),
+        (compressor, dict(fs=fs, threshold_db=-24.0, ratio=3.0)),
+        (highpass, dict(fs=fs, cutoff_freq=80.0)),
+        (fuzz, dict(gain=20.0, threshold=0.3)),
+        (lowpass, dict(fs=fs, cutoff_freq=4000.0)),
+        (cabinet, dict(fs=fs)),
+        (delay, dict(fs=fs, delay_ms=350.0, feedback=0.4, mix=0.3)),
+    ]
+
+
+def _plot(plot_fn, signal, fs):
+    def run():
+        plt.close(plot_fn({'input': signal, 'fuzz': fuzz(signal, gain=20.0)}, fs))
+    return run
+
+
+def _offline_chain(signal, fs):
+    def run():
+        proc = guitar_processor(fs, signal, history='none')
+        for effect_fn, kwargs in full_chain(fs):
+            proc.apply(effect_fn, **kwargs)
+        return proc.get_signal()
+    return run
+
+
+def _streaming_chain(signal, fs, block_size):
+    chain = block_chain()
+    for effect_fn, kwargs in full_chain(fs):
+        chain.add(block_for(effect_fn, **kwargs))
+
+    def run():
+        chain.reset()
+        return chain.run(array_reader(signal, block_size), lambda block: None)
+    return run
+
+
+def _wav_file(signal, fs):
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'input.wav')
+    save_audio(path, signal, fs)
+    return path
+
+
+# name -> (setup(signal, fs, block_size) returning the call to time, uses block_size)
+cases = {
+    'normalize_audio': (lambda s, fs, b: lambda: normalize_audio((s * 32767).astype(np.int16)), False),
+    'save_audio': (lambda s, fs, b: lambda: save_audio(os.path.join(tempfile.gettempdir(), 'bench_out.wav'), s, fs), False),
+    'load_audio': (lambda s, fs, b: (lambda path: lambda: load_audio(path))(_wav_file(s, fs)), False),
+    'resample/44.1k-48k': (lambda s, fs, b: lambda: resample(s, 44100, 48000), False),
+    'resample/96k-48k': (lambda s, fs, b: lambda: resample(s, 96000, 48000), False),
+    'fuzz': (lambda s, fs, b: lambda: fuzz(s, gain=20.0, threshold=0.3), False),
+    'overdrive': (lambda s, fs, b: lambda: overdrive(s, gain=8.0), False),
+    'waveshaper': (lambda s, fs, b: lambda: waveshaper(s, 'tube', gain=8.0), False),
+    'delay': (lambda s, fs, b: lambda: delay(s, fs, delay_ms=350.0, feedback=0.4, mix=0.3), False),
+    'cabinet': (lambda s, fs, b: lambda: cabinet(s, fs), False),
+    'generate_cab_ir': (lambda s, fs, b: lambda: generate_cab_ir(fs, duration_ms=1000 * len(s) / fs), False),
+    'biquad': (lambda s, fs, b: lambda: biquad(s, 0.2, 0.4, 0.2, -0.5, 0.3), False),
+    'lowpass': (lambda s, fs, b: lambda: lowpass(s, fs, cutoff_freq=3000.0), False),
+    'highpass': (lambda s, fs, b: lambda: highpass(s, fs, cutoff_freq=80.0), False),
+    'bandpass': (lambda s, fs, b: lambda: bandpass(s, fs), False),
+    'compressor': (lambda s, fs, b: lambda: compressor(s, fs), False),
+    'noise_gate': (lambda s, fs, b: lambda: noise_gate(s, fs), False),
+    'noise_gate/lookahead': (lambda s, fs, b: lambda: noise_gate(s, fs, lookahead_ms=5.0, hysteresis_db=6.0), False),
+    'compressor/lookahead': (lambda s, fs, b: lambda: compressor(s, fs, lookahead_ms=5.0), False),
+    'noise_gate/control_rate': (lambda s, fs, b: lambda: noise_gate(s, fs, control_rate=16), False),
+    'compressor/control_rate': (lambda s, fs, b: lambda: compressor(s, fs, control_rate=16), False),
+    'compute_envelope': (lambda s, fs, b: lambda: compute_envelope(s, fs, 5.0, 50.0), False),
+    'tremolo': (lambda s, fs, b: lambda: tremolo(s, fs), False),
+    'vibrato': (lambda s, fs, b: lambda: vibrato(s, fs), False),
+    'chorus': (lambda s, fs, b: lambda: chorus(s, fs), False),
+    'flanger': (lambda s, fs, b: lambda: flanger(s, fs), False),
+    'vibrato/control_rate': (lambda s, fs, b: lambda: vibrato(s, fs, control_rate=32), False),
+    'plot_time_domain': (lambda s, fs, b: _plot(plot_time_domain, s, fs), False),
+    'plot_frequency_domain': (lambda s, fs, b: _plot(plot_frequency_domain, s, fs), False),
+    'plot_comparison': (lambda s, fs, b: _plot(plot_comparison, s, fs), False),
+    'chain/guitar_processor': (lambda s, fs, b: _offline_chain(s, fs), False),
+    'chain/compiled': (lambda s, fs, b: (lambda plan: lambda: plan.run(s))(compile_chain(full_chain(fs))), False),
+    'chain/block_chain': (lambda s, fs, b: _streaming_chain(s, fs, b), True),
+    'chain/parallel': (lambda s, fs, b: lambda: render_parallel(s, full_chain(fs), workers=2), False),
+    'chain/pipelined': (lambda s, fs, b: (lambda p: lambda: p.reset().process(s, b))(pipelined_chain(full_chain(fs))), True),
+}
+
+
+def time_call(fn, repeat):
+    # one warm-up call (numba compiles, caches fill), then the best of `repeat`
+    fn()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--', 'prototype'], cwd=root).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+    return commit + '-dirty' if dirty else commit
+
+
+def run_suite(args):
+    results = {}
+
+    for fs in args.rates:
+        for seconds in args.lengths:
+            signal = guitar_signal(fs, seconds, seed=args.seed)
+
+            for name, (setup, uses_block) in cases.items():
+                if args.filter and not any(f in name for f in args.filter):
+                    continue
+
+                for block_size in (args.block_sizes if uses_block else [None]):
+                    key = f"{name}|fs={fs}|len={seconds}s" + (f"|block={block_size}" if block_size else "")
+                    elapsed = time_call(setup(signal, fs, block_size), args.repeat)
+
+                    results[key] = {
+                        'seconds': elapsed,
+                        'samples_per_s': len(signal) / elapsed,
+                        'realtime': seconds / elapsed,
+                    }
+                    print(f"{key:<48} {elapsed * 1e3:10.3f} ms {len(signal) / elapsed / 1e6:10.2f} Msamples/s "
+                          f"{seconds / elapsed:10.1f}x real-time", flush=True)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+
+    print(f"\nagainst baseline {baseline['commit']} (threshold {threshold:.0%}):")
+    for key, result in results.items():
+        if key not in baseline['results']:
+            continue
+
+        ratio = result['seconds'] / baseline['results'][key]['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        elif ratio < 1 / (1 + threshold):
+            flag = '  faster'
+
+        print(f"{key:<48} {ratio:6.2f}x time{flag}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark every public function and full chains')
+    parser.add_argument('--rates', type=int, nargs='+', default=[44100, 48000], help='sample rates')
+    parser.add_argument('--lengths', type=float, nargs='+', default=[1.0, 10.0], help='signal lengths in seconds')
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[64, 256, 1024], help='streaming block sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case, the best one counts')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic guitar signal')
+    parser.add_argument('--filter', nargs='*', help='only run cases whose name contains one of these')
+    parser.add_argument('--quick', action='store_true', help='one rate, one 1 s length, 3 runs')
+    parser.add_argument('--output-dir', default=os.path.join(root, 'benchmarks', 'results'),
+                        help='results are saved here as <commit>.json')
+    parser.add_argument('--baseline', default=os.path.join(root, 'benchmarks', 'baseline.json'),
+                        help='stored baseline to compare against (skipped if missing)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='fail if a case is this much slower (0.2 = 20%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.rates, args.lengths, args.repeat = args.rates[:1], [1.0], 3
+
+    commit = git_commit()
+    results = run_suite(args)
+    report = {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'results': results,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{commit}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {path}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"saved baseline {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+
+    if regressions:
+        print(f"\n{len(regressions)} cases regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype.config import precision  # noqa: E402
+from prototype.waveshaping import table_cache, curves  # noqa: E402
+from signals import guitar_signal  # noqa: E402
+
+
+def timed(fn, repeat):
+    fn()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        y = fn()
+        best = min(best, time.perf_counter() - start)
+
+    return y, best
+
+
+def measured_curve(path):
+    # a made-up "measured" asymmetric curve, 257 points like a swept capture
+    x = np.linspace(-4.0, 4.0, 257)
+    y = np.tanh(1.2 * x) + 0.08 * x * x * np.exp(-0.3 * x * x)
+    np.savetxt(path, np.column_stack([x, y]), delimiter=',')
+    return x, y
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='lookup-table waveshaper speed and error against direct evaluation')
+    parser.add_argument('--fs', type=int, default=48000)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--gain', type=float, default=8.0)
+    parser.add_argument('--errors', type=float, nargs='+', default=[1e-3, 1e-4, 1e-5])
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'curve.csv')
+    mx, my = measured_curve(path)
+
+    # (label, table source, x_range, direct evaluation)
+    cases = [
+        ('tanh', 'tanh', None, np.tanh),
+        ('tube', 'tube', None, curves['tube'][0]),
+        ('measured (np.interp)', path, None, lambda v: np.interp(v, mx, my)),
+    ]
+
+    for dtype in ('float32', 'float64'):
+        with precision(dtype):
+            signal = args.gain * guitar_signal(args.fs, args.seconds).astype(dtype)
+            tables = table_cache()
+
+            print(f"\n{dtype}, {len(signal)} samples")
+            print(f"{'curve':<22} {'max_error':>10} {'points':>7} {'measured':>10} {'ns/sample':>10} {'speedup':>8}")
+
+            for label, source, x_range, direct in cases:
+                exact, base = timed(lambda: direct(signal), args.repeat)
+                print(f"{label:<22} {'direct':>10} {'-':>7} {'-':>10} {1e9 * base / len(signal):10.2f} {1.0:7.2f}x")
+
+                for max_error in args.errors:
+                    table = tables.get(source, x_range, max_error)
+                    y, elapsed = timed(lambda: table.apply(signal), args.repeat)
+                    error = float(np.max(np.abs(y - exact)))
+                    print(f"{'':<22} {max_error:10.0e} {table.size:7d} {error:10.2e} "
+                          f"{1e9 * elapsed / len(signal):10.2f} {base / elapsed:7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
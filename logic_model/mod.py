@@ -9,5 +9,72 @@ class LFO:
         self.phase = 0.0
         self.waveform = waveform
 
-    # to be completed
+    # whole buffer at once: phase accumulator as an array, no per-sample loop
+    def generate(self, num_samples):
+        phase = (self.phase + self.rate / self.fs * np.arange(num_samples)) % 1.0
+        self.phase = (self.phase + self.rate / self.fs * num_samples) % 1.0
 
+        if self.waveform == 'sine':
+            return np.sin(2 * np.pi * phase)
+        if self.waveform == 'triangle':
+            return 1.0 - 4.0 * np.abs((phase + 0.25) % 1.0 - 0.5)
+        if self.waveform == 'saw':
+            return 2.0 * ((phase + 0.5) % 1.0) - 1.0
+        if self.waveform == 'square':
+            return np.where(phase < 0.5, 1.0, -1.0)
+
+        raise ValueError(f"unknown waveform: {self.waveform}")
+
+
+# tremolo
+def tremolo(signal, fs, rate_hz = 5.0, depth = 0.5):
+    lfo = LFO(fs, rate_hz)
+    gain = 1.0 - depth * 0.5 * (lfo.generate(len(signal)) + 1.0)
+    return signal * gain
+
+# vibrato / chorus / flanger all read a delay line at a moving, fractional position
+def fractional_read(signal, delay_samples):
+    pos = np.arange(len(signal)) - delay_samples
+    idx = np.floor(pos).astype(int)
+    frac = pos - idx
+
+    padded = np.concatenate([np.zeros(int(np.max(delay_samples)) + 2), signal])
+    offset = int(np.max(delay_samples)) + 2
+
+    a = padded[idx + offset]
+    b = padded[idx + offset + 1]
+    return a + frac * (b - a)
+
+def chorus(signal, fs, rate_hz = 0.8, depth_ms = 3.0, delay_ms = 20.0, mix = 0.5):
+    lfo = LFO(fs, rate_hz)
+    delay_samples = (delay_ms + 0.5 * depth_ms * lfo.generate(len(signal))) * fs / 1000.0
+    wet = fractional_read(signal, delay_samples)
+    return (1 - mix) * signal + mix * wet
+
+
+fs = 44100
+t = np.arange(fs) / fs
+test_signal = 0.5 * np.sin(2 * np.pi * 220 * t)
+
+tremolo_signal = tremolo(test_signal, fs, rate_hz=4.0, depth=0.8)
+chorus_signal = chorus(test_signal, fs)
+
+plt.figure(figsize=(10, 8))
+
+plt.subplot(2, 1, 1)
+for waveform in ['sine', 'triangle', 'saw', 'square']:
+    plt.plot(t[:fs // 2], LFO(fs, 4.0, waveform).generate(fs // 2), label=waveform)
+plt.title('LFO Waveforms (4 Hz)')
+plt.legend()
+plt.grid(True)
+
+plt.subplot(2, 1, 2)
+plt.plot(t, tremolo_signal, label='Tremolo', color='blue', alpha=0.6)
+plt.plot(t, chorus_signal, label='Chorus', color='red', alpha=0.4)
+plt.title('Modulated 220 Hz Tone')
+plt.xlabel('Time (s)')
+plt.legend()
+plt.grid(True)
+
+plt.tight_layout()
+plt.savefig('./plots/mod.png')
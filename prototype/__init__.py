@@ -1,28 +1,53 @@
-from .audio_io import load_audio, save_audio, normalize_audio
-from .effects import fuzz, overdrive, delay, cabinet, generate_cab_ir
-from .filters import biquad, lowpass, highpass, bandpass
-from .dynamics import compressor, noise_gate, compute_envelope
-from .analysis import plot_time_domain, plot_frequency_domain, plot_comparison
-from .processor import guitar_processor
-
-__all__ = [
-    'load_audio',
-    'save_audio',
-    'normalize_audio',
-    'fuzz',
-    'overdrive',
-    'delay',
-    'cabinet',
-    'generate_cab_ir',
-    'biquad',
-    'lowpass',
-    'highpass',
-    'bandpass',
-    'compressor',
-    'noise_gate',
-    'compute_envelope',
-    'plot_time_domain',
-    'plot_frequency_domain',
-    'plot_comparison',
-    'guitar_processor'
-]
+import importlib
+
+
+# public names resolve on first access, so `from prototype import fuzz` only loads
+# the modules fuzz needs and never matplotlib
+_exports = {
+    'load_audio': 'audio_io',
+    'save_audio': 'audio_io',
+    'normalize_audio': 'audio_io',
+    'resample': 'resampling',
+    'resampler': 'resampling',
+    'fuzz': 'effects',
+    'overdrive': 'effects',
+    'waveshaper': 'waveshaping',
+    'delay': 'effects',
+    'cabinet': 'effects',
+    'generate_cab_ir': 'effects',
+    'biquad': 'filters',
+    'lowpass': 'filters',
+    'highpass': 'filters',
+    'bandpass': 'filters',
+    'compressor': 'dynamics',
+    'noise_gate': 'dynamics',
+    'compute_envelope': 'dynamics',
+    'tremolo': 'modulation',
+    'vibrato': 'modulation',
+    'chorus': 'modulation',
+    'flanger': 'modulation',
+    'plot_time_domain': 'analysis',
+    'plot_frequency_domain': 'analysis',
+    'plot_comparison': 'analysis',
+    'guitar_processor': 'processor',
+    'block_chain': 'streaming',
+    'block_for': 'streaming',
+    'array_reader': 'streaming',
+    'pipelined_chain': 'pipeline',
+    'render_parallel': 'parallel',
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module 'prototype' has no attribute '{name}'")
+
+    value = getattr(importlib.import_module(f'.{_exports[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,21 +1,111 @@
+import functools
+import os
+import weakref
+
 import numpy as np
-import matplotlib.pyplot as plt
 
+from .lazy import lazy_module
+
+
+plt = lazy_module('matplotlib.pyplot')
+mpl_figure = lazy_module('matplotlib.figure')
+sp_signal = lazy_module('scipy.signal')
+
+
+@functools.lru_cache(maxsize=32)
+def freq_axis(fft_size, fs):
+    freqs = np.fft.rfftfreq(fft_size, 1 / fs)
+    freqs.flags.writeable = False
+    return freqs
+
+
+@functools.lru_cache(maxsize=32)
+def analysis_window(name, size):
+    window = sp_signal.get_window(name, size).astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+
+def average_spectrum(signal, fs, fft_size=4096, window='hann', overlap=0.5, max_frames=256):
+    # welch: rms magnitude of windowed rfft frames over the whole signal, max_frames at a time
+    signal = np.asarray(signal)
+    if signal.shape[-1] < fft_size:
+        signal = np.concatenate([signal, np.zeros(signal.shape[:-1] + (fft_size - signal.shape[-1],), signal.dtype)], axis=-1)
+
+    hop = max(1, int(fft_size * (1 - overlap)))
+    frames = np.lib.stride_tricks.sliding_window_view(signal, fft_size, axis=-1)[..., ::hop, :]
+    win = analysis_window(window, fft_size)
+
+    power = np.zeros(signal.shape[:-1] + (fft_size // 2 + 1,))
+    for start in range(0, frames.shape[-2], max_frames):
+        spectra = np.fft.rfft(frames[..., start:start + max_frames, :] * win, axis=-1)
+        power += np.sum(spectra.real ** 2 + spectra.imag ** 2, axis=-2)
+
+    return freq_axis(fft_size, fs), np.sqrt(power / frames.shape[-2])
+
+
+def first_spectrum(signal, fs, fft_size=4096, start=0):
+    segment = np.asarray(signal)[..., start:start + fft_size]
+    return freq_axis(fft_size, fs), np.abs(np.fft.rfft(segment, n=fft_size, axis=-1))
+
+
+def minmax_decimate(signal, max_points=4000):
+    # min/max pairs per bin keep every peak visible with max_points vertices per line
+    num_samples = signal.shape[-1]
+    if num_samples <= max_points:
+        return np.arange(num_samples), signal
+
+    bins = max_points // 2
+    step = -(-num_samples // bins)
+    pad = [(0, 0)] * (signal.ndim - 1) + [(0, step * bins - num_samples)]
+    blocks = np.pad(signal, pad, mode='edge').reshape(signal.shape[:-1] + (bins, step))
+
+    decimated = np.empty(signal.shape[:-1] + (2 * bins,), dtype=signal.dtype)
+    decimated[..., 0::2] = blocks.min(axis=-1)
+    decimated[..., 1::2] = blocks.max(axis=-1)
+
+    # both points of a bin sit at its center, the line draws the bin's full range
+    index = np.repeat(np.minimum(np.arange(bins) * step + step // 2, num_samples - 1), 2)
+    return index, decimated
+
+
+def _new_figure(figsize, headless):
+    # headless figures are not registered with pyplot, they are freed as soon as they are dropped
+    if headless:
+        return mpl_figure.Figure(figsize=figsize)
+
+    return plt.figure(figsize=figsize)
 
-def plot_time_domain(signals_dict, fs, window_ms=50, save_path=None):
-    fig, ax = plt.subplots(figsize=(12, 6))
 
-    first_signal = list(signals_dict.values())[0]
-    peak_idx = np.argmax(np.abs(first_signal))
+def _channels(label, signal):
+    signal = np.asarray(signal)
+    if signal.ndim == 1:
+        return [(label, signal)]
+
+    return [(f"{label} ch{c}", channel) for c, channel in enumerate(signal)]
+
+
+def _time_window(first_signal, fs, window_ms):
+    num_samples = np.shape(first_signal)[-1]
+    if window_ms is None:
+        return 0, num_samples, 1000.0 * num_samples / fs
+
+    peak_idx = np.argmax(np.max(np.abs(np.reshape(first_signal, (-1, num_samples))), axis=0))
 
     window_samples = int(fs * (window_ms / 1000))
     start_idx = max(0, peak_idx - window_samples // 2)
-    end_idx = min(len(first_signal), start_idx + window_samples)
+    end_idx = min(num_samples, start_idx + window_samples)
+    return start_idx, end_idx, window_ms
+
 
-    t_axis = np.linspace(0, window_ms, end_idx - start_idx)
+def _plot_time(ax, signals_dict, fs, window_ms, max_points):
+    start_idx, end_idx, span_ms = _time_window(list(signals_dict.values())[0], fs, window_ms)
+    ms_per_sample = span_ms / max(end_idx - start_idx - 1, 1)
 
     for label, signal in signals_dict.items():
-        ax.plot(t_axis, signal[start_idx:end_idx], label=label, alpha=0.7)
+        for name, channel in _channels(label, signal):
+            index, values = minmax_decimate(channel[start_idx:end_idx], max_points)
+            ax.plot(index * ms_per_sample, values, label=name, alpha=0.7)
 
     ax.set_xlabel('time (ms)')
     ax.set_ylabel('amplitude')
@@ -23,25 +113,30 @@ def plot_time_domain(signals_dict, fs, window_ms=50, save_path=None):
     ax.legend()
     ax.grid(True)
 
-    plt.tight_layout()
 
-    if save_path:
-        plt.savefig(save_path)
+def _spectrum(signal, fs, fft_size, average, start, spectra):
+    if not average:
+        return first_spectrum(signal, fs, fft_size, start)
+    if spectra is None or not isinstance(signal, np.ndarray):
+        return average_spectrum(signal, fs, fft_size)
 
-    return fig
+    # keyed by identity, the weak reference drops the entry once the array is freed
+    key = (id(signal), fft_size)
+    if key in spectra and spectra[key][0]() is signal:
+        return spectra[key][1]
 
+    result = average_spectrum(signal, fs, fft_size)
+    spectra[key] = (weakref.ref(signal, lambda _, key=key: spectra.pop(key, None)), result)
+    return result
 
-def plot_frequency_domain(signals_dict, fs, fft_size=4096, freq_limit=3000, save_path=None):
-    fig, ax = plt.subplots(figsize=(12, 6))
 
+def _plot_spectrum(ax, signals_dict, fs, fft_size, freq_limit, average, start=0, spectra=None):
     for label, signal in signals_dict.items():
-        fft_slice = signal[:min(len(signal), fft_size)]
-        spectrum = np.fft.fft(fft_slice, n=fft_size)
-        freqs = np.fft.fftfreq(fft_size, 1/fs)
-        magnitude = np.abs(spectrum)
+        freqs, magnitude = _spectrum(signal, fs, fft_size, average, start, spectra)
 
         idx_limit = int(freq_limit * fft_size / fs)
-        ax.plot(freqs[:idx_limit], magnitude[:idx_limit], label=label, alpha=0.7)
+        for name, channel in _channels(label, magnitude):
+            ax.plot(freqs[:idx_limit], channel[:idx_limit], label=name, alpha=0.7)
 
     ax.set_xlabel('frequency (Hz)')
     ax.set_ylabel('magnitude')
@@ -50,56 +145,58 @@ def plot_frequency_domain(signals_dict, fs, fft_size=4096, freq_limit=3000, save
     ax.legend()
     ax.grid(True)
 
-    plt.tight_layout()
 
-    if save_path:
-        plt.savefig(save_path)
+def plot_time_domain(signals_dict, fs, window_ms=50, save_path=None, max_points=4000, headless=False):
+    fig = _new_figure((12, 6), headless)
+    _plot_time(fig.add_subplot(1, 1, 1), signals_dict, fs, window_ms, max_points)
 
-    return fig
+    fig.tight_layout()
 
+    if save_path:
+        fig.savefig(save_path)
 
-def plot_comparison(signals_dict, fs, window_ms=50, fft_size=4096, freq_limit=3000, save_path=None):
-    fig = plt.figure(figsize=(12, 10))
+    return fig
 
-    first_signal = list(signals_dict.values())[0]
-    peak_idx = np.argmax(np.abs(first_signal))
 
-    window_samples = int(fs * (window_ms / 1000))
-    start_idx = max(0, peak_idx - window_samples // 2)
-    end_idx = min(len(first_signal), start_idx + window_samples)
+def plot_frequency_domain(signals_dict, fs, fft_size=4096, freq_limit=3000, save_path=None, average=True, headless=False):
+    fig = _new_figure((12, 6), headless)
+    _plot_spectrum(fig.add_subplot(1, 1, 1), signals_dict, fs, fft_size, freq_limit, average)
 
-    t_axis = np.linspace(0, window_ms, end_idx - start_idx)
+    fig.tight_layout()
 
-    ax1 = plt.subplot(2, 1, 1)
-    for label, signal in signals_dict.items():
-        ax1.plot(t_axis, signal[start_idx:end_idx], label=label, alpha=0.7)
+    if save_path:
+        fig.savefig(save_path)
 
-    ax1.set_xlabel('time (ms)')
-    ax1.set_ylabel('amplitude')
-    ax1.set_title('time domain')
-    ax1.legend()
-    ax1.grid(True)
+    return fig
 
-    ax2 = plt.subplot(2, 1, 2)
-    for label, signal in signals_dict.items():
-        fft_slice = signal[start_idx:start_idx + min(fft_size, len(signal) - start_idx)]
-        spectrum = np.fft.fft(fft_slice, n=fft_size)
-        freqs = np.fft.fftfreq(fft_size, 1/fs)
-        magnitude = np.abs(spectrum)
 
-        idx_limit = int(freq_limit * fft_size / fs)
-        ax2.plot(freqs[:idx_limit], magnitude[:idx_limit], label=label, alpha=0.7)
+def plot_comparison(signals_dict, fs, window_ms=50, fft_size=4096, freq_limit=3000, save_path=None, max_points=4000,
+                    average=True, headless=False, spectra=None):
+    fig = _new_figure((12, 10), headless)
 
-    ax2.set_xlabel('frequency (Hz)')
-    ax2.set_ylabel('magnitude')
-    ax2.set_title('frequency domain')
-    ax2.set_xlim(0, freq_limit)
-    ax2.legend()
-    ax2.grid(True)
+    start_idx, _, _ = _time_window(list(signals_dict.values())[0], fs, window_ms)
+    _plot_time(fig.add_subplot(2, 1, 1), signals_dict, fs, window_ms, max_points)
+    _plot_spectrum(fig.add_subplot(2, 1, 2), signals_dict, fs, fft_size, freq_limit, average, start_idx, spectra)
 
-    plt.tight_layout()
+    fig.tight_layout()
 
     if save_path:
-        plt.savefig(save_path)
+        fig.savefig(save_path)
 
     return fig
+
+
+def batch_comparisons(comparisons, fs, out_dir, fmt='png', **kwargs):
+    # comparisons: dict or iterable of (name, signals_dict). figures are headless and dropped
+    # right after saving, and a signal shared between comparisons is transformed once
+    os.makedirs(out_dir, exist_ok=True)
+    items = comparisons.items() if isinstance(comparisons, dict) else comparisons
+
+    spectra = {}
+    paths = []
+    for name, signals_dict in items:
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        plot_comparison(signals_dict, fs, save_path=path, headless=True, spectra=spectra, **kwargs)
+        paths.append(path)
+
+    return paths
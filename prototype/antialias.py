@@ -0,0 +1,219 @@
+import functools
+
+import numpy as np
+
+from .config import get_dtype, output_buffer
+from .lazy import lazy_module
+
+
+sp_signal = lazy_module('scipy.signal')
+special = lazy_module('scipy.special')
+
+
+LOG2 = np.log(2.0)
+PI2_24 = np.pi ** 2 / 24.0
+
+
+def _clip(x):
+    return np.clip(x, -1.0, 1.0)
+
+
+# piecewise antiderivatives written in terms of c = clip(x), no branch is evaluated twice
+def _clip_ad1(x):
+    c = np.clip(x, -1.0, 1.0)
+    return x * c - 0.5 * c * c
+
+
+def _clip_ad2(x):
+    c = np.clip(x, -1.0, 1.0)
+    return c * c * c / 6.0 + 0.5 * c * x * (x - c)
+
+
+def _tanh_ad1(x):
+    # log(cosh(x)) without overflowing cosh
+    a = np.abs(x)
+    return a + np.log1p(np.exp(-2.0 * a)) - LOG2
+
+
+def _tanh_ad2(x):
+    # integral of log(cosh(x)), odd, with Li2(-e^-2|x|) = spence(1 + e^-2|x|)
+    a = np.abs(x)
+    return np.sign(x) * (0.5 * a * a + 0.5 * special.spence(1.0 + np.exp(-2.0 * a)) - a * LOG2 + PI2_24)
+
+
+# shaper, first and second antiderivative
+shapers = {
+    'clip': (_clip, _clip_ad1, _clip_ad2),
+    'tanh': (np.tanh, _tanh_ad1, _tanh_ad2),
+}
+
+
+def _adaa1(xs, shaper, tol=1e-5):
+    f, ad1, _ = shapers[shaper]
+    x0 = xs[..., 1:]
+    x1 = xs[..., :-1]
+
+    dx = x0 - x1
+    ill = np.abs(dx) < tol
+    dx[ill] = 1.0
+
+    ad = ad1(xs)
+    y = (ad[..., 1:] - ad[..., :-1]) / dx
+
+    # consecutive samples too close for the difference quotient, it tends to f at the midpoint
+    if ill.any():
+        y[ill] = f(0.5 * (x0[ill] + x1[ill]))
+
+    return y
+
+
+def _adaa2(xs, shaper, tol=1e-3):
+    f, ad1, ad2 = shapers[shaper]
+    x0 = xs[..., 2:]
+    x1 = xs[..., 1:-1]
+    x2 = xs[..., :-2]
+
+    # first divided differences of the second antiderivative, one per adjacent pair
+    ad = ad2(xs)
+    dx = xs[..., 1:] - xs[..., :-1]
+    ill = np.abs(dx) < tol
+    dx[ill] = 1.0
+    d = (ad[..., 1:] - ad[..., :-1]) / dx
+    if ill.any():
+        d[ill] = ad1(0.5 * (xs[..., 1:][ill] + xs[..., :-1][ill]))
+
+    dx2 = x0 - x2
+    ill = np.abs(dx2) < tol
+    dx2[ill] = 1.0
+    y = 2.0 * (d[..., 1:] - d[..., :-1]) / dx2
+
+    if ill.any():
+        x1 = x1[ill]
+        mid = 0.5 * (x0[ill] + x2[ill])
+        delta = mid - x1
+        close = np.abs(delta) < tol
+        delta[close] = 1.0
+
+        fallback = 2.0 / delta * (ad1(mid) + (ad[..., 1:-1][ill] - ad2(mid)) / delta)
+        fallback[close] = f(0.5 * (mid[close] + x1[close]))
+        y[ill] = fallback
+
+    return y
+
+
+class adaa_shaper:
+    def __init__(self, shaper='clip', drive=1.0, order=1):
+        if shaper not in shapers:
+            raise ValueError(f"unknown shaper '{shaper}', expected one of {sorted(shapers)}")
+        if order not in (0, 1, 2):
+            raise ValueError(f"ADAA order must be 0, 1 or 2, got {order}")
+
+        self.shaper = shaper
+        self.drive = drive
+        self.order = order
+        # ADAA evaluates the shaper between samples: half a sample late per order
+        self.latency = 0.5 * order
+        self.reset()
+
+    def process_block(self, frames, out=None):
+        out = output_buffer(np.shape(frames), out)
+
+        if self.order == 0:
+            np.multiply(frames, self.drive, out=out)
+            out[...] = shapers[self.shaper][0](out)
+            return out
+
+        # antiderivative differences cancel badly in float32, they are taken in float64
+        x = np.multiply(frames, self.drive, dtype=np.float64)
+        if self.state is None or self.state.shape[:-1] != x.shape[:-1]:
+            self.state = np.zeros(x.shape[:-1] + (self.order,))
+
+        xs = np.concatenate([self.state, x], axis=-1)
+        self.state = xs[..., xs.shape[-1] - self.order:].copy()
+
+        out[...] = _adaa1(xs, self.shaper) if self.order == 1 else _adaa2(xs, self.shaper)
+        return out
+
+    def reset(self):
+        # previous inputs, allocated on the first block once the channel layout is known
+        self.state = None
+        return self
+
+
+@functools.lru_cache(maxsize=None)
+def halfband(num_taps=31):
+    # lowpass at the base-rate nyquist, split into its even and odd polyphase branches.
+    # every other tap of a halfband filter is zero, so one branch is a plain delay
+    h = sp_signal.firwin(num_taps, 0.5, window=('kaiser', 8.0))
+    h[np.abs(h) < 1e-12] = 0.0
+
+    even, odd = 2.0 * h[0::2], 2.0 * h[1::2]
+    even.flags.writeable = False
+    odd.flags.writeable = False
+    return even, odd
+
+
+class oversampler:
+    def __init__(self, processor, num_taps=31):
+        self.processor = processor
+        self.num_taps = num_taps
+        # linear-phase up and down filters, in base-rate samples
+        self.latency = (num_taps - 1) / 2 + getattr(processor, 'latency', 0) / 2
+        self.reset()
+
+    def _filter(self, b, x, name):
+        taps = np.flatnonzero(b)
+        if len(taps) == 1:
+            return self._delay(b[taps[0]], taps[0], x, name)
+
+        b = b.astype(get_dtype())
+        zi = self.zi.get(name)
+        if zi is None or zi.shape[:-1] != x.shape[:-1]:
+            zi = np.zeros(x.shape[:-1] + (len(b) - 1,), dtype=get_dtype())
+
+        y, self.zi[name] = sp_signal.lfilter(b, 1.0, x, axis=-1, zi=zi)
+        return y
+
+    def _delay(self, gain, delay, x, name):
+        history = self.zi.get(name)
+        if history is None or history.shape[:-1] != x.shape[:-1]:
+            history = np.zeros(x.shape[:-1] + (delay,), dtype=get_dtype())
+
+        delayed = np.concatenate([history, x], axis=-1)
+        self.zi[name] = delayed[..., delayed.shape[-1] - delay:]
+        return gain * delayed[..., :x.shape[-1]]
+
+    def upsample(self, frames):
+        even, odd = halfband(self.num_taps)
+        frames = np.asarray(frames, dtype=get_dtype())
+
+        up = np.empty(frames.shape[:-1] + (2 * frames.shape[-1],), dtype=get_dtype())
+        up[..., 0::2] = self._filter(even, frames, 'up_even')
+        up[..., 1::2] = self._filter(odd, frames, 'up_odd')
+        return up
+
+    def downsample(self, frames, out=None):
+        even, odd = halfband(self.num_taps)
+        out = output_buffer(frames.shape[:-1] + (frames.shape[-1] // 2,), out)
+
+        # odd phase lags the even one by a base-rate sample
+        out[...] = self._filter(0.5 * even, frames[..., 0::2], 'down_even')
+        out += self._filter(np.concatenate([[0.0], 0.5 * odd]), frames[..., 1::2], 'down_odd')
+        return out
+
+    def process_block(self, frames, out=None):
+        up = self.upsample(frames)
+        return self.downsample(self.processor.process_block(up, out=up), out=out)
+
+    def reset(self):
+        self.zi = {}
+        self.processor.reset()
+        return self
+
+
+def antialiased(shaper, drive=1.0, adaa=0, oversample=1, num_taps=31):
+    if oversample not in (1, 2):
+        raise ValueError(f"oversample must be 1 or 2, got {oversample}")
+
+    processor = adaa_shaper(shaper, drive, adaa)
+    return oversampler(processor, num_taps) if oversample == 2 else processor
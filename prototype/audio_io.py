@@ -1,28 +1,258 @@
+import os
+import struct
+
 import numpy as np
-from scipy.io import wavfile
+
+from .config import get_dtype
+from .resampling import resample
+
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# KSDATAFORMAT_SUBTYPE_* of an extensible fmt chunk: the format tag followed by this GUID tail
+_subformat_tail = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+# RIFF sizes are 32-bit, a larger file is written as RF64 (EBU Tech 3306): its RIFF and data sizes are
+# set to the marker and the real ones go in a ds64 chunk
+riff_limit = 0xFFFFFFFF
+_rf64_marker = 0xFFFFFFFF
+
+sample_formats = {
+    'int16': (WAVE_FORMAT_PCM, 16),
+    'int24': (WAVE_FORMAT_PCM, 24),
+    'int32': (WAVE_FORMAT_PCM, 32),
+    'float32': (WAVE_FORMAT_IEEE_FLOAT, 32),
+}
 
 
-def load_audio(filename):
-    fs, data = wavfile.read(filename)
-    return fs, normalize_audio(data)
+def load_audio(filename, fs=None, quality='medium'):
+    # fs resamples to that rate on load, so files of mixed rates share IRs and presets
+    with wav_reader(filename) as reader:
+        signal = reader.read()
+        if fs is None or fs == reader.fs:
+            return reader.fs, signal
+
+    return fs, resample(signal, reader.fs, fs, quality)
 
 
 def normalize_audio(data):
-    if data.dtype == np.int16:
-        data = data / 32768.0
+    # WAV frames are (samples, channels), processing is (channels, samples) with mono kept 1-D
+    if len(data.shape) > 1:
+        data = data[:, 0] if data.shape[1] == 1 else data.T
+
+    # scale in the processing dtype, int16 / float would silently promote to float64
+    normalized = data.astype(get_dtype(), order='C')
+    if data.dtype == np.uint8:
+        normalized -= 128.0
+        normalized *= 1.0 / 128.0
+    elif data.dtype == np.int16:
+        normalized *= 1.0 / 32768.0
     elif data.dtype == np.int32:
-        data = data / 2147483648.0
+        normalized *= 1.0 / 2147483648.0
 
-    if len(data.shape) > 1:
-        data = data[:, 0]
+    return normalized
 
-    return data
 
+def save_audio(filename, signal, fs, verbose=False, sample_format='int16', block_size=65536):
+    channels = 1 if np.ndim(signal) == 1 else len(signal)
 
-def save_audio(filename, signal, fs, verbose=False):
-    signal_clipped = np.clip(signal, -1.0, 1.0)
-    scaled = np.int16(signal_clipped * 32767)
-    wavfile.write(filename, fs, scaled)
+    with wav_writer(filename, fs, channels, sample_format=sample_format) as writer:
+        for start in range(0, np.shape(signal)[-1], block_size):
+            writer.write(signal[..., start:start + block_size])
 
     if verbose:
         print(f"saved: {filename}")
+
+
+class wav_reader:
+    def __init__(self, filename, block_size=65536):
+        self.filename = filename
+        self.block_size = block_size
+
+        with open(filename, 'rb') as f:
+            riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+            if riff not in (b'RIFF', b'RF64') or wave != b'WAVE':
+                raise ValueError(f"{filename}: not a RIFF/WAVE file")
+
+            fmt = None
+            ds64_data_size = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"{filename}: no data chunk")
+
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'ds64':
+                    ds64_data_size = struct.unpack('<QQ', f.read(16))[1]
+                    f.seek(chunk_size - 16 + chunk_size % 2, 1)
+                elif chunk_id == b'fmt ':
+                    fmt = f.read(chunk_size)
+                    f.seek(chunk_size % 2, 1)
+                elif chunk_id == b'data':
+                    data_offset = f.tell()
+                    data_size = ds64_data_size if riff == b'RF64' and chunk_size == _rf64_marker else chunk_size
+                    break
+                else:
+                    f.seek(chunk_size + chunk_size % 2, 1)
+
+        if fmt is None:
+            raise ValueError(f"{filename}: data chunk before fmt chunk")
+
+        format_tag, self.channels, self.fs, _, _, self.bits = struct.unpack('<HHIIHH', fmt[:16])
+        if format_tag == WAVE_FORMAT_EXTENSIBLE:
+            format_tag = struct.unpack('<H', fmt[24:26])[0]
+
+        self.format_tag = format_tag
+        self.dtype = self._sample_dtype(format_tag, self.bits)
+
+        frame_bytes = self.channels * self.bits // 8
+        data_size = min(data_size, os.path.getsize(filename) - data_offset)
+        self.num_frames = data_size // frame_bytes
+
+        # 24-bit samples have no numpy dtype, they are mapped as bytes and widened per block
+        shape = (self.num_frames, self.channels, 3) if self.bits == 24 else (self.num_frames, self.channels)
+        if self.num_frames:
+            self.data = np.memmap(filename, dtype=self.dtype, mode='r', offset=data_offset, shape=shape)
+        else:
+            self.data = np.zeros(shape, dtype=self.dtype)
+
+    def _sample_dtype(self, format_tag, bits):
+        if format_tag == WAVE_FORMAT_PCM and bits in (8, 16, 24, 32):
+            return {8: np.uint8, 16: np.dtype('<i2'), 24: np.uint8, 32: np.dtype('<i4')}[bits]
+        if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+            return np.dtype('<f4') if bits == 32 else np.dtype('<f8')
+
+        raise ValueError(f"{self.filename}: unsupported WAV format {format_tag} with {bits} bits")
+
+    def read(self, start=0, stop=None, out=None):
+        stop = self.num_frames if stop is None else min(stop, self.num_frames)
+        frames = self.data[start:stop]
+
+        if self.bits == 24:
+            frames = _widen_int24(frames)
+
+        normalized = normalize_audio(frames)
+        if out is None:
+            return normalized
+
+        num_samples = normalized.shape[-1]
+        out[..., :num_samples] = normalized
+        return out[..., :num_samples]
+
+    def blocks(self, block_size=None):
+        block_size = self.block_size if block_size is None else block_size
+
+        for start in range(0, self.num_frames, block_size):
+            yield self.read(start, start + block_size)
+
+    def __iter__(self):
+        return self.blocks()
+
+    def __len__(self):
+        return self.num_frames
+
+    def close(self):
+        self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _widen_int24(frames):
+    widened = np.zeros(frames.shape[:-1] + (4,), dtype=np.uint8)
+    widened[..., 1:] = frames
+    return widened.view('<i4')[..., 0]
+
+
+class wav_writer:
+    def __init__(self, filename, fs, channels=1, sample_format='int16'):
+        if sample_format not in sample_formats:
+            raise ValueError(f"unsupported sample format '{sample_format}', expected one of {sorted(sample_formats)}")
+
+        self.filename = filename
+        self.fs = fs
+        self.channels = channels
+        self.sample_format = sample_format
+        self.format_tag, self.bits = sample_formats[sample_format]
+        self.num_frames = 0
+
+        self.file = open(filename, 'wb')
+        self._write_header()
+
+    def _fmt_chunk(self, block_align):
+        fields = (self.channels, self.fs, self.fs * block_align, block_align, self.bits)
+        if self.bits <= 16 and self.channels <= 2:
+            return struct.pack('<4sIHHIIHH', b'fmt ', 16, self.format_tag, *fields)
+
+        # more than 16 bits or 2 channels needs WAVE_FORMAT_EXTENSIBLE: valid bits, speaker mask (none
+        # assigned past stereo) and the format as a subformat GUID
+        mask = {1: 0x4, 2: 0x3}.get(self.channels, 0)
+        return struct.pack('<4sIHHIIHHHHI', b'fmt ', 40, WAVE_FORMAT_EXTENSIBLE, *fields, 22, self.bits, mask) + \
+            struct.pack('<H', self.format_tag) + _subformat_tail
+
+    def _write_header(self):
+        block_align = self.channels * self.bits // 8
+        data_size = self.num_frames * block_align
+        fmt = self._fmt_chunk(block_align)
+        # RIFF, the JUNK/ds64 chunk (36 bytes), fmt and the data chunk header
+        riff_size = 4 + 36 + len(fmt) + 8 + data_size + data_size % 2
+
+        if riff_size <= riff_limit:
+            self.file.write(struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE'))
+            # reserves room for a ds64 chunk, so the header can grow into RF64 in place on close
+            self.file.write(struct.pack('<4sI', b'JUNK', 28) + bytes(28))
+            self.file.write(fmt)
+            self.file.write(struct.pack('<4sI', b'data', data_size))
+        else:
+            self.file.write(struct.pack('<4sI4s', b'RF64', _rf64_marker, b'WAVE'))
+            self.file.write(struct.pack('<4sIQQQI', b'ds64', 28, riff_size, data_size, self.num_frames, 0))
+            self.file.write(fmt)
+            self.file.write(struct.pack('<4sI', b'data', _rf64_marker))
+
+    def write(self, block):
+        # blocks are (channels, samples) or 1-D mono, WAV frames interleave them as (samples, channels).
+        # the transpose is copied to C order, the int24 path views each sample's bytes in place
+        block = np.asarray(block)
+        block = block[:, None] if block.ndim == 1 else np.ascontiguousarray(block.T)
+
+        if self.sample_format == 'float32':
+            samples = block.astype('<f4')
+        else:
+            full_scale = 2 ** (self.bits - 1) - 1
+            if self.bits > 16:
+                block = block.astype(np.float64)
+
+            scaled = np.clip(block, -1.0, 1.0) * full_scale
+            samples = scaled.astype('<i4') if self.bits > 16 else scaled.astype('<i2')
+
+            if self.bits == 24:
+                samples = samples.view(np.uint8).reshape(samples.shape + (4,))[..., :3]
+
+        self.file.write(np.ascontiguousarray(samples).tobytes())
+        self.num_frames += len(block)
+
+    def close(self):
+        if self.file is None:
+            return
+
+        # sizes are only known once every block has been written
+        try:
+            if (self.num_frames * self.channels * self.bits // 8) % 2:
+                self.file.write(b'\0')
+
+            self.file.seek(0)
+            self._write_header()
+        finally:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,255 @@
+import argparse
+import glob
+import inspect
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+from .audio_io import load_audio, save_audio
+from .compiler import compile_chain
+from .config import precision
+from .effects import fuzz, overdrive, delay, cabinet
+from .filters import biquad, lowpass, highpass, bandpass
+from .dynamics import compressor, noise_gate
+from .modulation import tremolo, vibrato, chorus, flanger
+from .waveshaping import waveshaper
+
+
+preset_effects = {
+    'fuzz': fuzz,
+    'overdrive': overdrive,
+    'delay': delay,
+    'cabinet': cabinet,
+    'biquad': biquad,
+    'lowpass': lowpass,
+    'highpass': highpass,
+    'bandpass': bandpass,
+    'compressor': compressor,
+    'noise_gate': noise_gate,
+    'tremolo': tremolo,
+    'vibrato': vibrato,
+    'chorus': chorus,
+    'flanger': flanger,
+    'waveshaper': waveshaper,
+}
+
+
+def load_preset(filename):
+    if filename.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError("TOML presets need python 3.11+ (tomllib)")
+
+        with open(filename, 'rb') as f:
+            preset = tomllib.load(f)
+    else:
+        with open(filename) as f:
+            preset = json.load(f)
+
+    if not isinstance(preset.get('chain'), list):
+        raise ValueError(f"{filename}: preset needs a 'chain' list of effects")
+
+    for stage in preset['chain']:
+        if not isinstance(stage, dict):
+            raise ValueError(f"{filename}: chain entries are tables of an 'effect' and its kwargs, got {stage!r}")
+        if stage.get('effect') not in preset_effects:
+            raise ValueError(f"{filename}: unknown effect '{stage.get('effect')}', expected one of {sorted(preset_effects)}")
+
+    return preset
+
+
+def build_chain(preset, fs):
+    chain = []
+
+    for stage in preset['chain']:
+        kwargs = dict(stage)
+        effect_fn = preset_effects[kwargs.pop('effect')]
+
+        if 'fs' in inspect.signature(effect_fn).parameters:
+            kwargs['fs'] = fs
+
+        chain.append((effect_fn, kwargs))
+
+    return chain
+
+
+def render_file(preset, in_path, out_path):
+    start = time.perf_counter()
+    # written next to the output and renamed over it once complete, an interrupted render never leaves
+    # a truncated file that is_up_to_date would take as done
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+
+    try:
+        with precision(preset.get('precision', 'float32')):
+            # a preset with an fs renders every file at that rate, whatever rate it was recorded at
+            fs, signal = load_audio(in_path, preset.get('fs'), preset.get('quality', 'medium'))
+            output = compile_chain(build_chain(preset, fs)).run(signal)
+            save_audio(tmp_path, output, fs)
+            os.replace(tmp_path, out_path)
+    except Exception as e:
+        return in_path, 0.0, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return in_path, signal.shape[-1] / fs, time.perf_counter() - start, None
+
+
+def _glob_root(pattern):
+    # the leading directories of a pattern without wildcards, outputs keep their path below it
+    parts = os.path.normpath(pattern).split(os.sep)
+    literal = list(itertools.takewhile(lambda part: not glob.has_magic(part), parts))
+    if len(literal) == len(parts):
+        literal = literal[:-1]
+
+    return os.sep.join(literal) or os.curdir
+
+
+def find_inputs(patterns):
+    # (input path, path of its output below the output directory)
+    inputs = {}
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root, paths = pattern, sorted(glob.glob(os.path.join(pattern, '*.wav')))
+        else:
+            root, paths = _glob_root(pattern), sorted(glob.glob(pattern, recursive=True))
+
+        for path in paths:
+            inputs.setdefault(path, os.path.relpath(path, root))
+
+    return list(inputs.items())
+
+
+def output_paths(inputs, output_dir):
+    # refused before anything renders: two inputs onto one output would keep whichever finished last,
+    # an output onto its input would overwrite the source
+    outputs = {}
+    for in_path, relative in inputs:
+        out_path = os.path.join(output_dir, relative)
+        if os.path.realpath(out_path) == os.path.realpath(in_path):
+            raise ValueError(f"{in_path}: output would overwrite the input, choose another --output-dir")
+
+        outputs.setdefault(os.path.realpath(out_path), []).append((in_path, out_path))
+
+    clashes = [group for group in outputs.values() if len(group) > 1]
+    if clashes:
+        listed = '; '.join(f"{group[0][1]} <- {', '.join(in_path for in_path, _ in group)}" for group in clashes)
+        raise ValueError(f"several inputs render to the same output: {listed}")
+
+    return [group[0] for group in outputs.values()]
+
+
+def is_up_to_date(in_path, out_path, preset_path):
+    if not os.path.exists(out_path):
+        return False
+
+    return os.path.getmtime(out_path) >= max(os.path.getmtime(in_path), os.path.getmtime(preset_path))
+
+
+def render(args):
+    preset = load_preset(args.preset)
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        raise ValueError(f"no input files match {' '.join(args.inputs)}")
+
+    jobs = []
+    skipped = 0
+    for in_path, out_path in output_paths(inputs, args.output_dir):
+        os.makedirs(os.path.dirname(out_path) or os.curdir, exist_ok=True)
+
+        if not args.force and is_up_to_date(in_path, out_path, args.preset):
+            skipped += 1
+        else:
+            jobs.append((in_path, out_path))
+
+    print(f"{len(inputs)} inputs, {skipped} up to date, rendering {len(jobs)} with {args.jobs or os.cpu_count()} workers",
+          file=sys.stderr)
+
+    start = time.perf_counter()
+    audio_seconds = 0.0
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(render_file, preset, in_path, out_path) for in_path, out_path in jobs]
+
+        for done, future in enumerate(as_completed(futures), 1):
+            in_path, seconds, elapsed, error = future.result()
+
+            if error is None:
+                audio_seconds += seconds
+                status = f"{seconds / elapsed:.1f}x real-time" if elapsed > 0 else "done"
+            else:
+                failed.append((in_path, error))
+                status = f"failed: {error}"
+
+            print(f"[{done}/{len(jobs)}] {in_path} - {status}", file=sys.stderr)
+
+    wall = time.perf_counter() - start
+    rendered = len(jobs) - len(failed)
+    if jobs and wall > 0:
+        print(f"rendered {rendered} files in {wall:.2f} s: {rendered / wall:.2f} files/s, "
+              f"{audio_seconds / wall:.1f}x real-time", file=sys.stderr)
+
+    if failed:
+        print(f"{len(failed)} files failed:", file=sys.stderr)
+        for in_path, error in failed:
+            print(f"  {in_path}: {error}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def realtime(args):
+    from .realtime import fake_device, realtime_engine
+
+    preset = load_preset(args.preset)
+    with precision(preset.get('precision', 'float32')):
+        device = fake_device(args.fs, args.block_size, source=args.input, seconds=args.seconds, paced=not args.unpaced,
+                             record=False)
+        engine = realtime_engine(device, budget=args.budget)
+        for effect_fn, kwargs in build_chain(preset, device.fs):
+            engine.apply(effect_fn, **kwargs)
+
+        engine.run()
+
+    print(engine.summary())
+    return 1 if engine.misses else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m prototype')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    render_parser = commands.add_parser('render', help='render input files through a preset chain')
+    render_parser.add_argument('preset', help='JSON or TOML preset with a chain of effects')
+    render_parser.add_argument('inputs', nargs='+', help='input files, directories or glob patterns')
+    render_parser.add_argument('-o', '--output-dir', default='rendered', help='output directory (default: rendered)')
+    render_parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    render_parser.add_argument('-f', '--force', action='store_true', help='render even if the output is up to date')
+    render_parser.set_defaults(run=render)
+
+    realtime_parser = commands.add_parser('realtime', help='run a preset chain in the real-time engine on a simulated device')
+    realtime_parser.add_argument('preset', help='JSON or TOML preset with a chain of effects')
+    realtime_parser.add_argument('-i', '--input', default=None, help='WAV file to play (default: synthetic plucked notes)')
+    realtime_parser.add_argument('--fs', type=int, default=44100, help='sample rate of the synthetic input')
+    realtime_parser.add_argument('-b', '--block-size', type=int, default=256, help='frames per callback (default: 256)')
+    realtime_parser.add_argument('--seconds', type=float, default=10.0, help='length of the synthetic input')
+    realtime_parser.add_argument('--budget', type=float, default=1.0, help='fraction of the block period a callback may use')
+    realtime_parser.add_argument('--unpaced', action='store_true', help='call back as fast as possible instead of in real time')
+    realtime_parser.set_defaults(run=realtime)
+
+    args = parser.parse_args(argv)
+
+    try:
+        return args.run(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
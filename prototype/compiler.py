@@ -0,0 +1,239 @@
+import numpy as np
+
+from .config import get_dtype, as_processing, output_buffer
+from .convolution import partitioned_convolver
+from .effects import fuzz, overdrive, cabinet, cabinet_block
+from .filters import biquad, lowpass, highpass, bandpass
+from .lazy import lazy_module
+from .streaming import block_for
+from .waveshaping import waveshaper, default_tables
+
+
+sp_signal = lazy_module('scipy.signal')
+
+
+pointwise_effects = (fuzz, overdrive, waveshaper)
+filter_effects = (biquad, lowpass, highpass, bandpass)
+
+
+def _effect_name(effect_fn):
+    return getattr(effect_fn, '__name__', repr(effect_fn))
+
+
+def _pointwise_ops(effect_fn, kwargs):
+    if effect_fn is fuzz:
+        gain = kwargs.get('gain', 10.0)
+        threshold = kwargs.get('threshold', 0.5)
+        return [('scale', gain), ('clip', threshold), ('scale', 1.0 / threshold)]
+
+    if effect_fn is waveshaper:
+        table = default_tables.get(kwargs.get('curve', 'tanh'), kwargs.get('x_range'), kwargs.get('max_error', 1e-4))
+        return [('scale', kwargs.get('gain', 1.0)), ('table', table)]
+
+    return [('scale', kwargs.get('gain', 10.0)), ('tanh', None)]
+
+
+def _fold_scales(ops):
+    folded = []
+
+    for op, value in ops:
+        if op == 'scale' and folded and folded[-1][0] == 'scale':
+            folded[-1] = ('scale', folded[-1][1] * value)
+        else:
+            folded.append((op, value))
+
+    return folded
+
+
+def _filter_tail(sos, max_len, tol=1e-12):
+    # shortest truncation of the impulse response leaving at most tol of its energy behind, None when
+    # that is longer than max_len or the filter does not decay
+    _, poles, _ = sp_signal.sos2zpk(sos)
+    radius = np.max(np.abs(poles)) if len(poles) else 0.0
+    if radius >= 1.0:
+        return None
+
+    impulse = np.zeros(2 * max_len + 2 * len(sos))
+    impulse[0] = 1.0
+    h = sp_signal.sosfilt(sos, impulse)
+
+    # energy from each sample on, plus what the slowest pole leaves past the computed response
+    remaining = np.cumsum((h ** 2)[::-1])[::-1]
+    remaining += np.max(h[-2 * len(sos):] ** 2) / max(1.0 - radius ** 2, 1e-12)
+    tail = int(np.argmax(remaining <= tol * remaining[0])) if remaining[-1] <= tol * remaining[0] else None
+    return tail if tail is not None and tail <= max_len else None
+
+
+class pointwise_stage:
+    def __init__(self, stages):
+        self.sources = [name for _, name, _ in stages]
+        ops = []
+        for effect_fn, _, kwargs in stages:
+            ops.extend(_pointwise_ops(effect_fn, kwargs))
+
+        self.ops = _fold_scales(ops)
+
+    def run(self, signal):
+        # one output buffer, every shaper applied in place
+        output = output_buffer(np.shape(signal))
+
+        op, value = self.ops[0]
+        if op == 'scale':
+            np.multiply(signal, value, out=output)
+            ops = self.ops[1:]
+        else:
+            output[:] = signal
+            ops = self.ops
+
+        for op, value in ops:
+            if op == 'scale':
+                output *= value
+            elif op == 'clip':
+                np.clip(output, -value, value, out=output)
+            elif op == 'table':
+                value.apply(output, out=output)
+            else:
+                np.tanh(output, out=output)
+
+        return output
+
+
+class filter_stage:
+    def __init__(self, stages):
+        self.sources = [name for _, name, _ in stages]
+        self.sos = np.vstack([block_for(effect_fn, **kwargs).sos for effect_fn, _, kwargs in stages])
+
+    def run(self, signal):
+        return sp_signal.sosfilt(self.sos.astype(get_dtype()), as_processing(signal), axis=-1)
+
+
+class convolution_stage:
+    def __init__(self, stages, ir, gain, block_size):
+        self.sources = [name for _, name, _ in stages]
+        self.convolver = partitioned_convolver(ir, block_size, gain=gain)
+
+    def run(self, signal):
+        return self.convolver.reset().process_block(signal)
+
+
+class effect_stage:
+    def __init__(self, stage):
+        effect_fn, name, kwargs = stage
+        self.sources = [name]
+        self.effect_fn = effect_fn
+        self.kwargs = kwargs
+
+    def run(self, signal):
+        return self.effect_fn(signal, **self.kwargs)
+
+
+def _max_tail(ir_len, block_size):
+    # a folded filter tail adds partitions to the convolution. past about half a partition or half the
+    # IR they cost more than the sosfilt pass they replace
+    return max(ir_len, block_size) // 2
+
+
+def _linear_stage(stages):
+    filters = [stage for stage in stages if stage[0] in filter_effects]
+    cabinets = [stage for stage in stages if stage[0] is cabinet]
+
+    if not cabinets:
+        return filter_stage(stages), f"merged {len(filters)} filters into one SOS cascade"
+
+    # convolution and filtering commute, so every cabinet IR and filter collapses into one IR
+    ir = np.ones(1)
+    gain = 1.0
+    block_size = 1024
+    for _, _, kwargs in cabinets:
+        kwargs = dict(kwargs)
+        block_size = kwargs.pop('block_size', block_size)
+        convolver = cabinet_block(block_size=block_size, **kwargs)
+        ir = np.convolve(ir, convolver.ir)
+        gain *= convolver.gain
+
+    if filters:
+        sos = filter_stage(filters).sos
+        tail = _filter_tail(sos, max_len=_max_tail(len(ir), block_size))
+        if tail is None:
+            return None, None
+
+        ir = sp_signal.sosfilt(sos, np.concatenate([ir, np.zeros(tail)]))
+
+    folded = f"{len(filters)} filters and {len(cabinets)} cabinet IRs" if filters else f"{len(cabinets)} cabinet IRs"
+    return convolution_stage(stages, ir, gain, block_size), f"folded {folded} into one {len(ir)}-tap convolution"
+
+
+def _group_kind(stage):
+    effect_fn, _, kwargs = stage
+
+    # antialiased shapers carry state between samples, they are not pointwise anymore
+    if effect_fn in pointwise_effects and not kwargs.get('adaa') and kwargs.get('oversample', 1) == 1:
+        return 'pointwise'
+    if effect_fn in filter_effects or effect_fn is cabinet:
+        return 'linear'
+    return None
+
+
+class compiled_chain:
+    def __init__(self, chain):
+        self.plan = []
+        self.report = []
+
+        for kind, stages in _group(chain, _group_kind):
+            names = _names(stages)
+
+            if kind == 'pointwise' and len(stages) > 1:
+                self.plan.append(pointwise_stage(stages))
+                self.report.append(f"{names}: fused {len(stages)} pointwise stages into one in-place pass")
+                continue
+
+            if kind == 'linear' and len(stages) > 1:
+                stage, message = _linear_stage(stages)
+                if stage is not None:
+                    self.plan.append(stage)
+                    self.report.append(f"{names}: {message}")
+                    continue
+
+                self.report.append(f"{names}: filter tail too long or too costly to fold into the cabinet IR")
+                self._add_linear_runs(stages)
+                continue
+
+            self.plan.extend(effect_stage(stage) for stage in stages)
+
+    def _add_linear_runs(self, stages):
+        # filters and cabinets still merge among themselves
+        for _, run in _group(stages, lambda stage: stage[0] is cabinet):
+            if len(run) > 1:
+                stage, message = _linear_stage(run)
+                self.plan.append(stage)
+                self.report.append(f"{_names(run)}: {message}")
+            else:
+                self.plan.extend(effect_stage(stage) for stage in run)
+
+    def run(self, signal):
+        for stage in self.plan:
+            signal = stage.run(signal)
+
+        return signal
+
+
+def _group(chain, kind_of):
+    groups = []
+
+    for stage in chain:
+        kind = kind_of(stage)
+        if kind is not None and groups and groups[-1][0] == kind:
+            groups[-1][1].append(stage)
+        else:
+            groups.append((kind, [stage]))
+
+    return groups
+
+
+def _names(stages):
+    return ' -> '.join(name or _effect_name(effect_fn) for effect_fn, name, _ in stages)
+
+
+def compile_chain(chain):
+    chain = [stage if len(stage) == 3 else (stage[0], None, stage[1]) for stage in chain]
+    return compiled_chain(chain)
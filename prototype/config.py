@@ -0,0 +1,50 @@
+import contextlib
+
+import numpy as np
+
+
+processing_dtypes = (np.dtype(np.float32), np.dtype(np.float64))
+processing_dtype = np.dtype(np.float32)
+
+
+def get_dtype():
+    return processing_dtype
+
+
+def set_dtype(dtype):
+    global processing_dtype
+
+    dtype = np.dtype(dtype)
+    if dtype not in processing_dtypes:
+        raise ValueError(f"processing dtype must be float32 or float64, got {dtype}")
+
+    processing_dtype = dtype
+
+
+def complex_dtype():
+    return np.result_type(processing_dtype, np.complex64)
+
+
+@contextlib.contextmanager
+def precision(dtype):
+    previous = processing_dtype
+    set_dtype(dtype)
+
+    try:
+        yield
+    finally:
+        set_dtype(previous)
+
+
+def as_processing(signal):
+    return np.asarray(signal, dtype=processing_dtype)
+
+
+def output_buffer(shape, out=None):
+    if out is None:
+        return np.empty(shape, dtype=processing_dtype)
+
+    if out.shape != tuple(shape):
+        raise ValueError(f"out has shape {out.shape}, expected {tuple(shape)}")
+
+    return out
@@ -0,0 +1,177 @@
+import numpy as np
+
+from .config import get_dtype, complex_dtype, output_buffer
+
+
+def uniform_layout(ir_len, partition_size):
+    count = max(1, -(-ir_len // partition_size))
+    return ((0, partition_size, count),)
+
+
+def nonuniform_layout(ir_len, block_size, max_partition=8192):
+    # partitions double in size, each one starting no earlier than its own length
+    # so it has a full block of time to compute before its output is due
+    layout = []
+    offset = 0
+    size = block_size
+
+    while offset < ir_len:
+        remaining = -(-(ir_len - offset) // size)
+        count = remaining if size >= max_partition else min(2, remaining)
+        layout.append((offset, size, count))
+
+        offset += size * count
+        if size < max_partition and offset >= size * 2:
+            size *= 2
+
+    return tuple(layout)
+
+
+def partition_ir(ir, layout):
+    spectra = []
+
+    for offset, size, count in layout:
+        segment = np.zeros(size * count)
+        taps = ir[offset:offset + size * count]
+        segment[:len(taps)] = taps
+
+        spectra.append(np.fft.rfft(segment.reshape(count, size), n=2 * size, axis=-1).astype(complex_dtype()))
+
+    return spectra
+
+
+def ir_gain(ir):
+    n_fft = 4 * (1 << int(np.ceil(np.log2(max(len(ir), 1)))))
+    return 1.0 / np.max(np.abs(np.fft.rfft(ir, n=n_fft)))
+
+
+def _mac(fdl, newest, spectra, lag):
+    # sum over k >= lag of X[j - (k - lag)] * H[k], reading the frequency-domain
+    # delay line backwards from its newest slot without copying it
+    count = len(spectra) - lag
+    if count <= 0:
+        return 0.0
+
+    head = min(newest + 1, count)
+    acc = np.einsum('k...f,kf->...f', fdl[newest::-1][:head], spectra[lag:lag + head])
+
+    if count > head:
+        wrap = count - head
+        acc += np.einsum('k...f,kf->...f', fdl[len(fdl) - wrap:][::-1], spectra[lag + head:])
+
+    return acc
+
+
+class _segment:
+    def __init__(self, offset, size, spectra, channels=()):
+        self.offset = offset
+        self.size = size
+        self.spectra = spectra
+        self.window = np.zeros(channels + (2 * size,), dtype=get_dtype())
+        self.fdl = np.zeros((len(spectra),) + channels + (spectra.shape[-1],), dtype=spectra.dtype)
+        self.newest = len(spectra) - 1
+
+    def push(self, spectrum):
+        self.newest = (self.newest + 1) % len(self.fdl)
+        self.fdl[self.newest] = spectrum
+        self.window[..., :self.size] = self.window[..., self.size:]
+        self.window[..., self.size:] = 0.0
+
+
+class partitioned_convolver:
+    def __init__(self, ir, block_size=256, layout=None, spectra=None, gain=None):
+        self.ir = np.asarray(ir, dtype=float)
+        self.block_size = block_size
+        self.layout = tuple(layout) if layout is not None else uniform_layout(len(self.ir), block_size)
+
+        if self.layout[0][0] != 0 or self.layout[0][1] != block_size:
+            raise ValueError("first partition must start at 0 and match block_size")
+
+        for offset, size, count in self.layout[1:]:
+            if size % block_size or offset < size:
+                raise ValueError(f"partition of {size} at offset {offset} cannot meet its deadline")
+
+        if spectra is None:
+            spectra = partition_ir(self.ir, self.layout)
+
+        self.spectra = [part.astype(complex_dtype(), copy=False) for part in spectra]
+        self.gain = ir_gain(self.ir) if gain is None else gain
+        self.latency = 0
+        self.reset()
+
+    def reset(self):
+        # state is allocated on the first block, once the channel layout is known
+        self.channels = None
+        self.time = 0
+        return self
+
+    def _allocate(self, channels):
+        self.channels = channels
+        self.segments = [_segment(offset, size, spectra, channels) for (offset, size, _), spectra in zip(self.layout, self.spectra)]
+        self.pending = np.zeros(channels + (max(offset for offset, _, _ in self.layout) + self.block_size,), dtype=get_dtype())
+        self.rest = np.zeros(channels + (self.block_size + 1,), dtype=complex_dtype())
+
+    def process_block(self, frames, out=None):
+        num_samples = np.shape(frames)[-1]
+        output = output_buffer(np.shape(frames), out)
+
+        if self.channels != np.shape(frames)[:-1]:
+            self._allocate(np.shape(frames)[:-1])
+
+        head = self.segments[0]
+        start = 0
+        while start < num_samples:
+            fill = self.time % self.block_size
+            run = min(self.block_size - fill, num_samples - start)
+            piece = frames[..., start:start + run]
+
+            for segment in self.segments:
+                pos = self.time % segment.size
+                segment.window[..., segment.size + pos:segment.size + pos + run] = piece
+
+            # the head partition is recomputed on the partial block, so output is never delayed
+            spectrum = np.fft.rfft(head.window)
+            y = np.fft.irfft(spectrum * head.spectra[0] + self.rest, n=2 * self.block_size)
+            output[..., start:start + run] = y[..., self.block_size + fill:self.block_size + fill + run]
+            self._take_pending(output[..., start:start + run])
+
+            self.time += run
+            start += run
+
+            if self.time % self.block_size == 0:
+                head.push(spectrum)
+                self.rest = _mac(head.fdl, head.newest, head.spectra, 1)
+
+                for segment in self.segments[1:]:
+                    if self.time % segment.size == 0:
+                        self._complete(segment)
+
+        output *= self.gain
+        return output
+
+    def _complete(self, segment):
+        spectrum = np.fft.rfft(segment.window)
+        segment.push(spectrum)
+
+        y = np.fft.irfft(_mac(segment.fdl, segment.newest, segment.spectra, 0), n=2 * segment.size)
+        self._add_pending(segment.offset - segment.size, y[..., segment.size:])
+
+    def _add_pending(self, delay, data):
+        size = data.shape[-1]
+        length = self.pending.shape[-1]
+        pos = (self.time + delay) % length
+        first = min(size, length - pos)
+
+        self.pending[..., pos:pos + first] += data[..., :first]
+        self.pending[..., :size - first] += data[..., first:]
+
+    def _take_pending(self, output):
+        run = output.shape[-1]
+        length = self.pending.shape[-1]
+        pos = self.time % length
+        first = min(run, length - pos)
+
+        output[..., :first] += self.pending[..., pos:pos + first]
+        output[..., first:] += self.pending[..., :run - first]
+        self.pending[..., pos:pos + first] = 0.0
+        self.pending[..., :run - first] = 0.0
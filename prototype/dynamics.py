@@ -1,16 +1,11 @@
 import numpy as np
 
+from .config import get_dtype, output_buffer
+from .resampling import control_decimator, control_interpolator
 
-def compute_envelope(signal, fs, attack_ms, release_ms):
-    num_samples = len(signal)
-    envelope = np.zeros(num_samples)
 
-    attack_coeff = np.exp(-1000.0 / (fs * attack_ms))
-    release_coeff = np.exp(-1000.0 / (fs * release_ms))
-
-    current_level = 0.0
-
-    for i in range(num_samples):
+def _follow(signal, envelope, attack_coeff, release_coeff, current_level):
+    for i in range(len(signal)):
         abs_input = abs(signal[i])
 
         if abs_input > current_level:
@@ -20,29 +15,362 @@ def compute_envelope(signal, fs, attack_ms, release_ms):
 
         envelope[i] = current_level
 
-    return envelope
+    return current_level
+
+
+def _follow_channels(signal, envelope, attack_coeff, release_coeff, levels):
+    for c in range(signal.shape[0]):
+        levels[c] = _follow(signal[c], envelope[c], attack_coeff[c], release_coeff[c], levels[c])
+
+
+def _follow_across(channels, envelope, attack_coeff, release_coeff, levels):
+    # without numba: one step of numpy ops per sample advances every channel at once, a fixed cost per
+    # sample instead of one python loop per channel
+    samples = np.abs(channels).T.astype(float)
+    history = np.empty_like(samples)
+    level = levels.copy()
+    rising = np.empty(len(level), dtype=bool)
+    coeff, gain, held = np.empty_like(level), np.empty_like(level), np.empty_like(level)
+    one_minus_attack, one_minus_release = 1 - attack_coeff, 1 - release_coeff
+
+    for i in range(len(samples)):
+        x = samples[i]
+        np.greater(x, level, out=rising)
+        np.copyto(coeff, release_coeff)
+        np.copyto(coeff, attack_coeff, where=rising)
+        np.copyto(gain, one_minus_release)
+        np.copyto(gain, one_minus_attack, where=rising)
+        np.multiply(coeff, level, out=held)
+        np.multiply(gain, x, out=level)
+        level += held
+        history[i] = level
+
+    envelope[...] = history.T
+    levels[...] = level
+
+
+# the per-sample numpy step costs about as much as a python loop over 8 channels
+across_channels = 8
+
+# numba is optional and slow to import, the kernel is compiled on the first block
+_follow_jit = None
+
+
+def _kernel():
+    global _follow, _follow_jit
+
+    if _follow_jit is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _follow_jit = False
+        else:
+            _follow = njit(cache=True, nogil=True)(_follow)
+            _follow_jit = njit(cache=True, nogil=True)(_follow_channels)
+
+    return _follow_jit
+
+
+class envelope_follower:
+    def __init__(self, fs, attack_ms, release_ms):
+        self.fs = fs
+        self.attack_coeff = np.exp(-1000.0 / (fs * np.asarray(attack_ms, dtype=float)))
+        self.release_coeff = np.exp(-1000.0 / (fs * np.asarray(release_ms, dtype=float)))
+        self.reset()
+
+    def process_block(self, frames, out=None):
+        shape = np.shape(frames)
+        out = output_buffer(shape, out)
+
+        # every channel runs through one kernel call, each with its own detector level
+        channels = np.reshape(frames, (-1, shape[-1]))
+        envelope = out.reshape(channels.shape)
+        if self.levels is None or len(self.levels) != len(channels):
+            self.levels = np.zeros(len(channels))
+
+        attack_coeff = np.broadcast_to(self.attack_coeff, shape[:-1]).reshape(-1)
+        release_coeff = np.broadcast_to(self.release_coeff, shape[:-1]).reshape(-1)
+
+        kernel = _kernel()
+        if kernel:
+            channels = np.ascontiguousarray(channels, dtype=out.dtype)
+            kernel(channels, envelope, attack_coeff, release_coeff, self.levels)
+        elif len(channels) >= across_channels:
+            _follow_across(channels, envelope, attack_coeff, release_coeff, self.levels)
+        else:
+            # plain python floats are several times faster to loop over than numpy scalars
+            for c in range(len(channels)):
+                level = [0.0] * shape[-1]
+                self.levels[c] = _follow(channels[c].tolist(), level, attack_coeff[c], release_coeff[c], self.levels[c])
+                envelope[c] = level
+
+        if not np.shares_memory(envelope, out):
+            out[...] = envelope.reshape(shape)
+
+        return out
+
+    def reset(self):
+        # allocated on the first block, once the channel layout is known
+        self.levels = None
+        return self
+
+
+def compute_envelope(signal, fs, attack_ms, release_ms, out=None):
+    return envelope_follower(fs, attack_ms, release_ms).process_block(signal, out=out)
+
+
+def sliding_max(signal, window):
+    # max of signal[..., i:i + window] for every full window. van herk / gil-werman: a running max
+    # forward and one backward inside segments of `window` samples, so the cost is linear in the
+    # length whatever the window
+    signal = np.asarray(signal)
+    length = signal.shape[-1]
+    num_out = length - window + 1
+    if window == 1:
+        return signal.copy()
+
+    segments = -(-length // window)
+    padded = np.full(signal.shape[:-1] + (segments * window,), -np.inf, dtype=signal.dtype)
+    padded[..., :length] = signal
+    blocks = padded.reshape(signal.shape[:-1] + (segments, window))
+
+    forward = np.maximum.accumulate(blocks, axis=-1).reshape(padded.shape)
+    backward = np.maximum.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+
+    # a window starting at i spans the end of i's segment and the start of the next one
+    return np.maximum(backward[..., :num_out], forward[..., window - 1:window - 1 + num_out])
+
+
+class lookahead_peak:
+    def __init__(self, fs, lookahead_ms):
+        self.latency = int(round(fs * lookahead_ms / 1000.0))
+        self.reset()
+
+    def _extend(self, history, frames):
+        # the last `latency` samples of the previous block followed by this one
+        shape = np.shape(frames)
+        if history is None or history.shape[:-1] != shape[:-1]:
+            history = np.zeros(shape[:-1] + (self.latency,), dtype=get_dtype())
+
+        extended = np.empty(shape[:-1] + (self.latency + shape[-1],), dtype=get_dtype())
+        extended[..., :self.latency] = history
+        extended[..., self.latency:] = frames
+        return extended
+
+    def process_block(self, detector_input, frames):
+        # returns the peak of each sample and the `latency` samples after it, and frames delayed by
+        # `latency`, so gain changes are in place before the transient that causes them
+        num_samples = np.shape(frames)[-1]
+        levels = self._extend(self.peak_history, np.abs(detector_input))
+        audio = self._extend(self.audio_history, frames)
+
+        self.peak_history = levels[..., num_samples:].copy()
+        self.audio_history = audio[..., num_samples:].copy()
+        return sliding_max(levels, self.latency + 1), audio[..., :num_samples]
+
+    def reset(self):
+        # allocated on the first block, once the channel layout is known
+        self.peak_history = None
+        self.audio_history = None
+        return self
+
+
+class gate_logic:
+    def __init__(self, fs, threshold_db=-40.0, hysteresis_db=0.0, hold_ms=10.0):
+        # opens at threshold_db, closes below threshold_db - hysteresis_db, and stays open for
+        # hold_ms after the last sample it was open
+        threshold_db = np.asarray(threshold_db, dtype=float)
+        self.open_level = 10 ** (threshold_db / 20.0)
+        self.close_level = 10 ** ((threshold_db - hysteresis_db) / 20.0)
+        self.hold = int(round(fs * hold_ms / 1000.0))
+        self.reset()
+
+    def process_block(self, level, out=None):
+        # level -> 0 / 1 gate gain, in place when out is level. every transition is found with
+        # running maxima of sample indices, the state between blocks is two numbers per channel
+        shape = np.shape(level)
+        index = np.arange(shape[-1])
+        if self.is_open is None or self.is_open.shape != shape[:-1]:
+            self.is_open = np.zeros(shape[:-1], dtype=bool)
+            self.since = np.full(shape[:-1], self.hold + 1)
+
+        level = level + 1e-6
+        above = level >= self.open_level
+        decided = above | (level < self.close_level)
+
+        # hysteresis: each sample follows the last one above open or below close, samples in
+        # between keep the state, before the first decision it comes from the previous block
+        last = np.where(decided, index, -1)
+        np.maximum.accumulate(last, axis=-1, out=last)
+        is_open = np.take_along_axis(above, np.maximum(last, 0), axis=-1)
+        is_open = np.where(last >= 0, is_open, self.is_open[..., np.newaxis])
+
+        # hold: index of the last open sample, before this block it was `since` samples ago
+        opened = np.where(is_open, index, -1 - self.since[..., np.newaxis])
+        np.maximum.accumulate(opened, axis=-1, out=opened)
+
+        self.is_open = is_open[..., -1].copy()
+        self.since = np.minimum(shape[-1] - 1 - opened[..., -1], self.hold + 1)
+
+        out = output_buffer(shape, out)
+        np.less_equal(index - opened, self.hold, out=out)
+        return out
+
+    def reset(self):
+        # closed, with the hold long expired
+        self.is_open = None
+        self.since = None
+        return self
+
+
+def _compressor_gain(env, threshold_db, ratio, makeup_gain_db):
+    # 10 ** (-max(env_db - threshold_db, 0) * (1 - 1 / ratio) / 20) * makeup, as one in-place pass
+    env += 1e-6
+    env *= 10 ** (-threshold_db / 20.0)
+    np.maximum(env, 1.0, out=env)
+    np.power(env, -(1 - (1 / ratio)), out=env)
+    env *= 10 ** (makeup_gain_db / 20.0)
+    return env
+
+
+def _detector_input(frames, link):
+    # a linked detector follows the loudest channel (axis -2) and applies one gain to all of them
+    if link and np.ndim(frames) > 1:
+        return np.max(np.abs(frames), axis=-2, keepdims=True)
+
+    return frames
+
+
+def _apply_gain(gain, frames, out):
+    # the gain was computed in out, or in a buffer of its own when there is no out
+    if gain is out or (out is None and gain.shape == np.shape(frames)):
+        gain *= frames
+        return gain
+
+    out = output_buffer(np.shape(frames), out)
+    np.multiply(frames, gain, out=out)
+    return out
+
+
+class control_path:
+    def __init__(self, control_rate, initial):
+        # the detector and gain computer run on the peak of every control_rate samples, their gain
+        # is interpolated back to full rate
+        self.decimator = control_decimator(control_rate) if control_rate > 1 else None
+        self.interpolator = control_interpolator(control_rate, initial) if control_rate > 1 else None
+
+    def process_block(self, detector, gain_fn, detector_input, frames, out):
+        gain_out = _detector_out(detector_input, frames, out)
+        if self.decimator is None:
+            return gain_fn(detector.process_block(detector_input, out=gain_out))
+
+        control = gain_fn(detector.process_block(self.decimator.process_block(detector_input)))
+        return self.interpolator.process_block(control, np.shape(frames)[-1], out=gain_out)
+
+    def reset(self):
+        if self.decimator is not None:
+            self.decimator.reset()
+            self.interpolator.reset()
+        return self
+
+
+class noise_gate_block:
+    def __init__(self, fs, threshold_db=-40.0, attack_ms=2.0, release_ms=100.0, hold_ms=10.0, link=False,
+                 lookahead_ms=0.0, hysteresis_db=0.0, control_rate=1):
+        control_fs = fs / control_rate
+        self.link = link
+        self.detector = envelope_follower(control_fs, attack_ms, release_ms)
+        self.logic = gate_logic(control_fs, threshold_db, hysteresis_db, hold_ms)
+        self.smoother = envelope_follower(control_fs, attack_ms, release_ms)
+        self.control = control_path(control_rate, initial=0.0)
+        self.lookahead = lookahead_peak(fs, lookahead_ms) if lookahead_ms else None
+        self.latency = self.lookahead.latency if self.lookahead else 0
+
+    def _gain(self, level):
+        self.logic.process_block(level, out=level)
+        return self.smoother.process_block(level, out=level)
+
+    def process_block(self, frames, out=None):
+        detector_input = _detector_input(frames, self.link)
+        if self.lookahead is not None:
+            detector_input, frames = self.lookahead.process_block(detector_input, frames)
+
+        gain = self.control.process_block(self.detector, self._gain, detector_input, frames, out)
+        return _apply_gain(gain, frames, out)
+
+    def reset(self):
+        self.detector.reset()
+        self.logic.reset()
+        self.smoother.reset()
+        self.control.reset()
+        if self.lookahead is not None:
+            self.lookahead.reset()
+        return self
+
+
+class compressor_block:
+    def __init__(self, fs, threshold_db=-20.0, ratio=4.0, attack_ms=5.0, release_ms=50.0, makeup_gain_db=5.0, link=False,
+                 lookahead_ms=0.0, control_rate=1):
+        self.threshold_db = threshold_db
+        self.ratio = ratio
+        self.makeup_gain_db = makeup_gain_db
+        self.link = link
+        self.detector = envelope_follower(fs / control_rate, attack_ms, release_ms)
+        # silence gets the makeup gain only
+        self.control = control_path(control_rate, initial=10 ** (makeup_gain_db / 20.0))
+        self.lookahead = lookahead_peak(fs, lookahead_ms) if lookahead_ms else None
+        self.latency = self.lookahead.latency if self.lookahead else 0
+
+    def _gain(self, level):
+        return _compressor_gain(level, self.threshold_db, self.ratio, self.makeup_gain_db)
+
+    def process_block(self, frames, out=None):
+        detector_input = _detector_input(frames, self.link)
+        if self.lookahead is not None:
+            detector_input, frames = self.lookahead.process_block(detector_input, frames)
+
+        gain = self.control.process_block(self.detector, self._gain, detector_input, frames, out)
+        return _apply_gain(gain, frames, out)
+
+    def reset(self):
+        self.detector.reset()
+        self.control.reset()
+        if self.lookahead is not None:
+            self.lookahead.reset()
+        return self
 
 
-def noise_gate(signal, fs, threshold_db=-40.0, attack_ms=2.0, release_ms=100.0, hold_ms=10.0):
-    env = compute_envelope(signal, fs, attack_ms, release_ms)
-    env_db = 20 * np.log10(env + 1e-6)
+def _detector_out(detector_input, frames, out):
+    # the gain is computed in out when it has the signal's shape (not linked), unless out is the signal
+    # itself: the gain would overwrite it before it is applied
+    if out is None or np.shape(detector_input) != np.shape(frames) or np.shares_memory(out, frames):
+        return None
 
-    target_gain = np.where(env_db < threshold_db, 0.0, 1.0)
-    smooth_gain = compute_envelope(target_gain, fs, attack_ms, release_ms)
+    return out
 
-    return signal * smooth_gain
 
+def _aligned(block, signal, out):
+    # offline, lookahead latency is compensated: the input is flushed with `latency` zeros
+    # and the output starts `latency` samples in, so it lines up with the input
+    if not block.latency:
+        return block.process_block(signal, out=out)
 
-def compressor(signal, fs, threshold_db=-20.0, ratio=4.0, attack_ms=5.0, release_ms=50.0, makeup_gain_db=5.0):
-    env = compute_envelope(signal, fs, attack_ms, release_ms)
-    env_db = 20 * np.log10(env + 1e-6)
+    shape = np.shape(signal)
+    out = output_buffer(shape, out)
+    flushed = np.concatenate([signal, np.zeros(shape[:-1] + (block.latency,), dtype=get_dtype())], axis=-1)
+    out[...] = block.process_block(flushed)[..., block.latency:]
+    return out
 
-    over_db = env_db - threshold_db
-    over_db = np.maximum(over_db, 0)
 
-    gain_reduction_db = over_db * (1 - (1 / ratio))
+def noise_gate(signal, fs, threshold_db=-40.0, attack_ms=2.0, release_ms=100.0, hold_ms=10.0, link=False,
+               lookahead_ms=0.0, hysteresis_db=0.0, control_rate=1, out=None):
+    block = noise_gate_block(fs, threshold_db, attack_ms, release_ms, hold_ms, link, lookahead_ms, hysteresis_db,
+                             control_rate)
+    return _aligned(block, signal, out)
 
-    gain_linear = np.power(10, -gain_reduction_db / 20.0)
-    makeup_linear = np.power(10, makeup_gain_db / 20.0)
 
-    return signal * gain_linear * makeup_linear
+def compressor(signal, fs, threshold_db=-20.0, ratio=4.0, attack_ms=5.0, release_ms=50.0, makeup_gain_db=5.0,
+               link=False, lookahead_ms=0.0, control_rate=1, out=None):
+    block = compressor_block(fs, threshold_db, ratio, attack_ms, release_ms, makeup_gain_db, link, lookahead_ms,
+                             control_rate)
+    return _aligned(block, signal, out)
@@ -1,45 +1,143 @@
 import numpy as np
-from scipy import signal as sp_signal
 
+from .antialias import antialiased
+from .config import get_dtype, output_buffer
+from .convolution import partitioned_convolver
+from .ir_library import default_library
 
-def fuzz(signal, gain=10.0, threshold=0.5):
-    boosted = signal * gain
-    clipped = np.clip(boosted, -threshold, threshold)
-    return clipped / threshold
 
+def fuzz(signal, gain=10.0, threshold=0.5, adaa=0, oversample=1, out=None):
+    if adaa or oversample > 1:
+        return fuzz_block(gain, threshold, adaa, oversample).process_block(signal, out=out)
 
-def overdrive(signal, gain=10.0):
-    boosted = signal * gain
-    return np.tanh(boosted)
+    out = output_buffer(np.shape(signal), out)
 
+    np.multiply(signal, gain, out=out)
+    np.clip(out, -threshold, threshold, out=out)
+    np.divide(out, threshold, out=out)
+    return out
 
-def delay(signal, fs, delay_ms=400.0, feedback=0.6, mix=0.5):
-    delay_samples = int(fs * (delay_ms / 1000.0))
-    total_len = len(signal) + delay_samples * 5
 
-    padded_input = np.zeros(total_len)
-    padded_input[:len(signal)] = signal
+def overdrive(signal, gain=10.0, adaa=0, oversample=1, out=None):
+    if adaa or oversample > 1:
+        return overdrive_block(gain, adaa, oversample).process_block(signal, out=out)
 
-    wet_buffer = np.zeros(total_len)
+    out = output_buffer(np.shape(signal), out)
 
-    for i in range(total_len):
-        dry_sample = padded_input[i]
+    np.multiply(signal, gain, out=out)
+    np.tanh(out, out=out)
+    return out
 
-        if i >= delay_samples:
-            delayed_sample = wet_buffer[i - delay_samples]
-        else:
-            delayed_sample = 0.0
 
-        wet_sample = delayed_sample * feedback
-        wet_buffer[i] = dry_sample + wet_sample
+class fuzz_block:
+    def __init__(self, gain=10.0, threshold=0.5, adaa=0, oversample=1):
+        self.gain = gain
+        self.threshold = threshold
+        # the clip is normalized to +-1, so the whole stage is clip(x * gain / threshold)
+        self.shaper = antialiased('clip', gain / threshold, adaa, oversample) if adaa or oversample > 1 else None
 
-    dry_gain = 1.0 - mix
-    wet_gain = mix
+    def process_block(self, frames, out=None):
+        if self.shaper is not None:
+            return self.shaper.process_block(frames, out=out)
 
-    wet_slice = wet_buffer[:len(signal)]
-    output = (signal * dry_gain) + (wet_slice * wet_gain)
+        return fuzz(frames, self.gain, self.threshold, out=out)
 
-    return output
+    def reset(self):
+        if self.shaper is not None:
+            self.shaper.reset()
+
+        return self
+
+
+class overdrive_block:
+    def __init__(self, gain=10.0, adaa=0, oversample=1):
+        self.gain = gain
+        self.shaper = antialiased('tanh', gain, adaa, oversample) if adaa or oversample > 1 else None
+
+    def process_block(self, frames, out=None):
+        if self.shaper is not None:
+            return self.shaper.process_block(frames, out=out)
+
+        return overdrive(frames, self.gain, out=out)
+
+    def reset(self):
+        if self.shaper is not None:
+            self.shaper.reset()
+
+        return self
+
+
+class delay_line:
+    def __init__(self, fs, delay_ms=400.0, feedback=0.6, mix=0.5):
+        self.fs = fs
+        self.delay_samples = int(fs * (delay_ms / 1000.0))
+        self.feedback = feedback
+        self.mix = mix
+        self.reset()
+
+    def process_block(self, frames, out=None):
+        num_samples = np.shape(frames)[-1]
+        out = output_buffer(np.shape(frames), out)
+
+        if self.delay_samples == 0:
+            out[:] = frames
+            return out
+
+        if self.buffer is None or self.buffer.shape[:-1] != np.shape(frames)[:-1]:
+            self.buffer = np.zeros(np.shape(frames)[:-1] + (self.delay_samples,), dtype=get_dtype())
+
+        # the feedback tap is always delay_samples back, so every contiguous
+        # run of at most delay_samples only reads echoes written earlier
+        start = 0
+        while start < num_samples:
+            run = min(self.delay_samples - self.pos, num_samples - start)
+            tap = self.buffer[..., self.pos:self.pos + run]
+            dry = frames[..., start:start + run]
+            wet = out[..., start:start + run]
+
+            # the echo goes back into the delay line, then is mixed straight into out
+            tap *= self.feedback
+            tap += dry
+
+            if np.all(self.mix):
+                np.multiply(dry, (1.0 - self.mix) / self.mix, out=wet)
+                wet += tap
+                wet *= self.mix
+            else:
+                # mix may be 0 (for some channels), blend without dividing by it
+                np.multiply(dry, 1.0 - self.mix, out=wet)
+                wet += tap * self.mix
+
+            self.pos = (self.pos + run) % self.delay_samples
+            start += run
+
+        return out
+
+    def tail(self, num_samples=None, out=None):
+        if num_samples is None:
+            num_samples = self.delay_samples * 5
+
+        channels = () if self.buffer is None else self.buffer.shape[:-1]
+        return self.process_block(np.zeros(channels + (num_samples,), dtype=get_dtype()), out=out)
+
+    def reset(self):
+        # allocated on the first block, once the channel layout is known
+        self.buffer = None
+        self.pos = 0
+        return self
+
+
+def delay(signal, fs, delay_ms=400.0, feedback=0.6, mix=0.5, tail=False, out=None):
+    line = delay_line(fs, delay_ms, feedback, mix)
+
+    if not tail:
+        return line.process_block(signal, out=out)
+
+    num_samples = np.shape(signal)[-1]
+    out = output_buffer(np.shape(signal)[:-1] + (num_samples + line.delay_samples * 5,), out)
+    line.process_block(signal, out=out[..., :num_samples])
+    line.tail(out=out[..., num_samples:])
+    return out
 
 
 def generate_cab_ir(fs, duration_ms=20):
@@ -58,9 +156,20 @@ def generate_cab_ir(fs, duration_ms=20):
     return ir / np.max(np.abs(ir))
 
 
-def cabinet(signal, fs, ir=None, duration_ms=20):
-    if ir is None:
-        ir = generate_cab_ir(fs, duration_ms)
+def cabinet(signal, fs, ir=None, duration_ms=20, block_size=1024, layout=None, gain=None, library=None, out=None):
+    return cabinet_block(fs, ir, duration_ms, block_size, layout, gain, library).process_block(signal, out=out)
+
+
+class cabinet_block(partitioned_convolver):
+    def __init__(self, fs, ir=None, duration_ms=20, block_size=256, layout=None, gain=None, library=None):
+        if ir is not None and not isinstance(ir, str):
+            super().__init__(ir, block_size, layout=layout, gain=gain)
+            return
+
+        # synthetic and file IRs come from the library, so their partitions are transformed once
+        library = default_library if library is None else library
+        source = ('synthetic', duration_ms) if ir is None else ir
+        entry = library.get(source, fs, partition_size=block_size, layout=layout)
 
-    output = sp_signal.convolve(signal, ir, mode='same')
-    return output / np.max(np.abs(output))
+        super().__init__(entry.ir, block_size, layout=entry.layout, spectra=entry.spectra,
+                         gain=entry.gain if gain is None else gain)
@@ -1,49 +1,83 @@
 import numpy as np
-from scipy import signal as sp_signal
 
+from .config import get_dtype, as_processing, output_buffer
+from .lazy import lazy_module
 
-def biquad(input_signal, b0, b1, b2, a1, a2):
-    output_signal = np.zeros_like(input_signal)
 
-    x_1 = 0.0
-    x_2 = 0.0
-    y_1 = 0.0
-    y_2 = 0.0
+sp_signal = lazy_module('scipy.signal')
 
-    for i in range(len(input_signal)):
-        x_0 = input_signal[i]
 
-        y_0 = (b0 * x_0) + (b1 * x_1) + (b2 * x_2) - (a1 * y_1) - (a2 * y_2)
+class sos_filter:
+    def __init__(self, sos):
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=get_dtype()))
+        self.reset()
 
-        x_2 = x_1
-        x_1 = x_0
-        y_2 = y_1
-        y_1 = y_0
+    def process_block(self, frames, out=None):
+        frames = as_processing(frames)
+        if self.zi is None or self.zi.shape[1:-1] != frames.shape[:-1]:
+            self.zi = np.zeros((self.sos.shape[0],) + frames.shape[:-1] + (2,), dtype=self.sos.dtype)
 
-        output_signal[i] = y_0
+        output, self.zi = sp_signal.sosfilt(self.sos, frames, axis=-1, zi=self.zi)
+        return _into(output, out)
 
-    return output_signal
+    def reset(self):
+        # allocated on the first block, once the channel layout is known
+        self.zi = None
+        return self
 
 
-def lowpass(signal, fs, cutoff_freq=800.0, order=2):
-    sos = sp_signal.butter(N=order, Wn=cutoff_freq, btype='low', fs=fs, output='sos')
-    coeffs = sos[0]
-    b0, b1, b2, a0, a1, a2 = coeffs
+class biquad_block(sos_filter):
+    def __init__(self, b0, b1, b2, a1, a2):
+        super().__init__(biquad_sos(b0, b1, b2, a1, a2))
 
-    return biquad(signal, b0, b1, b2, a1, a2)
 
+class lowpass_block(sos_filter):
+    def __init__(self, fs, cutoff_freq=800.0, order=2):
+        super().__init__(butter_sos('low', cutoff_freq, fs, order))
 
-def highpass(signal, fs, cutoff_freq=800.0, order=2):
-    sos = sp_signal.butter(N=order, Wn=cutoff_freq, btype='high', fs=fs, output='sos')
-    coeffs = sos[0]
-    b0, b1, b2, a0, a1, a2 = coeffs
 
-    return biquad(signal, b0, b1, b2, a1, a2)
+class highpass_block(sos_filter):
+    def __init__(self, fs, cutoff_freq=800.0, order=2):
+        super().__init__(butter_sos('high', cutoff_freq, fs, order))
 
 
-def bandpass(signal, fs, low_freq=300.0, high_freq=3000.0, order=2):
-    sos = sp_signal.butter(N=order, Wn=[low_freq, high_freq], btype='band', fs=fs, output='sos')
-    coeffs = sos[0]
-    b0, b1, b2, a0, a1, a2 = coeffs
+class bandpass_block(sos_filter):
+    def __init__(self, fs, low_freq=300.0, high_freq=3000.0, order=2):
+        super().__init__(butter_sos('band', [low_freq, high_freq], fs, order))
 
-    return biquad(signal, b0, b1, b2, a1, a2)
+
+def biquad_sos(b0, b1, b2, a1, a2):
+    return np.array([[b0, b1, b2, 1.0, a1, a2]])
+
+
+def butter_sos(btype, freqs, fs, order=2):
+    return sp_signal.butter(N=order, Wn=freqs, btype=btype, fs=fs, output='sos')
+
+
+def _filter(sos, signal, out):
+    return _into(sp_signal.sosfilt(sos.astype(get_dtype()), as_processing(signal), axis=-1), out)
+
+
+def _into(output, out):
+    # sosfilt has no out argument, so the result is copied into a caller buffer
+    if out is None:
+        return output
+
+    output_buffer(output.shape, out)[:] = output
+    return out
+
+
+def biquad(input_signal, b0, b1, b2, a1, a2, out=None):
+    return _filter(biquad_sos(b0, b1, b2, a1, a2), input_signal, out)
+
+
+def lowpass(signal, fs, cutoff_freq=800.0, order=2, out=None):
+    return _filter(butter_sos('low', cutoff_freq, fs, order), signal, out)
+
+
+def highpass(signal, fs, cutoff_freq=800.0, order=2, out=None):
+    return _filter(butter_sos('high', cutoff_freq, fs, order), signal, out)
+
+
+def bandpass(signal, fs, low_freq=300.0, high_freq=3000.0, order=2, out=None):
+    return _filter(butter_sos('band', [low_freq, high_freq], fs, order), signal, out)
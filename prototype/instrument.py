@@ -0,0 +1,135 @@
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+
+class profiler:
+    def __init__(self, fs, memory=True, max_events=100000):
+        self.fs = fs
+        self.memory = memory
+        self.max_events = max_events
+        self.started_tracing = False
+        self.reset()
+
+    def reset(self):
+        self.events = []
+        self.stages = {}
+        self.dropped = 0
+        self.origin = time.perf_counter()
+        return self
+
+    def _start_tracing(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def close(self):
+        # only stop tracemalloc if this profiler started it
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def measure(self, stage, name, fn, signal, *args, **kwargs):
+        # stage: the position in the chain, the key stages are accumulated under. name labels it
+        self._start_tracing()
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        output = fn(signal, *args, **kwargs)
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - start
+
+        allocated = tracemalloc.get_traced_memory()[1] - before if self.memory else None
+        self.record(stage, name, start, wall, cpu, np.shape(output)[-1], allocated, output)
+        return output
+
+    def record(self, index, name, start, wall, cpu, num_samples, allocated, output):
+        output = np.asarray(output, dtype=np.float64).ravel()
+        peak = float(np.max(np.abs(output))) if output.size else 0.0
+        square_sum = float(np.dot(output, output))
+
+        stage = self.stages.get(index)
+        if stage is None:
+            stage = self.stages[index] = {'stage': index, 'name': name, 'calls': 0, 'samples': 0, 'values': 0, 'wall': 0.0, 'cpu': 0.0,
+                                         'peak_alloc': 0, 'peak': 0.0, 'square_sum': 0.0}
+
+        stage['calls'] += 1
+        stage['samples'] += num_samples
+        stage['values'] += output.size
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        stage['peak'] = max(stage['peak'], peak)
+        stage['square_sum'] += square_sum
+        if allocated is not None:
+            stage['peak_alloc'] = max(stage['peak_alloc'], allocated)
+
+        if len(self.events) < self.max_events:
+            self.events.append((index, name, start - self.origin, wall, cpu, allocated))
+        else:
+            self.dropped += 1
+
+    def report(self):
+        # one entry per stage, in first-call order, accumulated over all calls (blocks)
+        report = []
+
+        for stage in self.stages.values():
+            seconds = stage['samples'] / self.fs
+            report.append({
+                'stage': stage['stage'],
+                'name': stage['name'],
+                'calls': stage['calls'],
+                'samples': stage['samples'],
+                'wall_s': stage['wall'],
+                'cpu_s': stage['cpu'],
+                'realtime': seconds / stage['wall'] if stage['wall'] > 0 else float('inf'),
+                'peak_alloc_bytes': stage['peak_alloc'] if self.memory else None,
+                'peak': stage['peak'],
+                'rms': float(np.sqrt(stage['square_sum'] / stage['values'])) if stage['values'] else 0.0,
+            })
+
+        return report
+
+    def summary(self):
+        lines = [f"{'#':>3} {'stage':<24} {'calls':>7} {'wall ms':>10} {'cpu ms':>10} {'x real-time':>12} "
+                 f"{'peak alloc':>12} {'peak':>8} {'rms':>8}"]
+
+        for stage in self.report():
+            alloc = '-' if stage['peak_alloc_bytes'] is None else f"{stage['peak_alloc_bytes'] / 1024 ** 2:.2f} MB"
+            lines.append(f"{stage['stage']:>3} {stage['name']:<24} {stage['calls']:>7} {stage['wall_s'] * 1e3:>10.3f} "
+                         f"{stage['cpu_s'] * 1e3:>10.3f} {stage['realtime']:>12.1f} {alloc:>12} "
+                         f"{stage['peak']:>8.3f} {stage['rms']:>8.3f}")
+
+        if self.dropped:
+            lines.append(f"({self.dropped} calls not kept as trace events, max_events={self.max_events})")
+
+        return '\n'.join(lines)
+
+    def chrome_trace(self):
+        # complete ('X') events in microseconds, load in chrome://tracing or ui.perfetto.dev
+        events = []
+
+        for index, name, start, wall, cpu, allocated in self.events:
+            args = {'stage': index, 'cpu_ms': cpu * 1e3}
+            if allocated is not None:
+                args['peak_alloc_bytes'] = allocated
+
+            events.append({'name': f"{index}: {name}", 'cat': 'stage', 'ph': 'X', 'ts': start * 1e6, 'dur': wall * 1e6,
+                           'pid': os.getpid(), 'tid': 0, 'args': args})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_trace(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
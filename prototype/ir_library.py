@@ -0,0 +1,179 @@
+import json
+import os
+import struct
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+from .audio_io import load_audio
+from .config import get_dtype
+from .convolution import uniform_layout, partition_ir, ir_gain
+from .resampling import resample
+
+
+def resample_ir(ir, fs_in, fs_out, quality='high'):
+    if fs_in == fs_out:
+        return ir
+
+    # the polyphase design is cached per ratio, a library of 44.1 kHz captures designs it once
+    return resample(ir, fs_in, fs_out, quality)
+
+
+def prepare_ir(ir, length=None, fade=1 / 16):
+    ir = np.asarray(ir, dtype=float)
+
+    if length is not None:
+        prepared = np.zeros(length)
+        prepared[:min(length, len(ir))] = ir[:length]
+        ir = prepared
+
+    # half-hann fade so a truncated IR does not end on a step
+    fade_len = int(len(ir) * fade)
+    if fade_len > 1:
+        ir = ir.copy()
+        ir[-fade_len:] *= np.hanning(2 * fade_len)[fade_len:]
+
+    peak = np.max(np.abs(ir))
+    return ir / peak if peak > 0 else ir
+
+
+class ir_entry:
+    def __init__(self, ir, layout, spectra, gain, mapped=False):
+        self.ir = ir
+        self.layout = layout
+        self.spectra = spectra
+        self.gain = gain
+        self.nbytes = 0 if mapped else ir.nbytes + sum(s.nbytes for s in spectra)
+
+
+class ir_library:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source, fs, length=None, partition_size=256, layout=None):
+        key = (_source_key(source), fs, length, layout if layout is not None else partition_size, get_dtype().name)
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        ir = self._load_source(source, fs, length)
+        if layout is None:
+            layout = uniform_layout(len(ir), partition_size)
+
+        entry = ir_entry(ir, tuple(layout), partition_ir(ir, layout), ir_gain(ir))
+        self._insert(key, entry)
+        return entry
+
+    def _load_source(self, source, fs, length):
+        if isinstance(source, tuple) and source[0] == 'synthetic':
+            from .effects import generate_cab_ir
+
+            ir = generate_cab_ir(fs, *source[1:])
+            return ir if length is None else prepare_ir(ir, length, fade=0)
+
+        fs_file, ir = load_audio(source)
+        if ir.ndim > 1:
+            # cabinets are mono IRs, a stereo capture contributes its first channel
+            ir = ir[0]
+
+        return prepare_ir(resample_ir(ir, fs_file, fs), length)
+
+    def _insert(self, key, entry):
+        self.entries[key] = entry
+        self.nbytes += entry.nbytes
+
+        # evict least recently used entries, but always keep the one just added
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        return self
+
+    def save(self, filename):
+        index = []
+        arrays = {}
+
+        for i, (key, entry) in enumerate(self.entries.items()):
+            index.append({'key': _encode_key(key), 'layout': entry.layout, 'gain': entry.gain})
+            arrays[f'ir_{i}'] = entry.ir
+            for s, spectra in enumerate(entry.spectra):
+                arrays[f'spectra_{i}_{s}'] = spectra
+
+        arrays['index'] = np.array(json.dumps(index))
+        # uncompressed, so every member is a contiguous .npy that load() can memory-map
+        np.savez(filename, **arrays)
+
+    def load(self, filename):
+        arrays = _mmap_npz(filename)
+        index = json.loads(str(arrays['index']))
+
+        for i, item in enumerate(index):
+            layout = tuple(tuple(segment) for segment in item['layout'])
+            spectra = [arrays[f'spectra_{i}_{s}'] for s in range(len(layout))]
+
+            entry = ir_entry(arrays[f'ir_{i}'], layout, spectra, item['gain'], mapped=True)
+            self._insert(_decode_key(item['key']), entry)
+
+        return self
+
+
+def _source_key(source):
+    # a file is keyed by its path and modification time, an edited or replaced IR is loaded again
+    if isinstance(source, str):
+        return ('file', os.path.abspath(source), os.path.getmtime(source))
+    return source
+
+
+def _encode_key(key):
+    return [list(part) if isinstance(part, tuple) else part for part in key]
+
+
+def _decode_key(key):
+    return tuple(_decode_key(part) if isinstance(part, list) else part for part in key)
+
+
+def _mmap_npz(filename):
+    arrays = {}
+
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.load(archive.open(info))
+                continue
+
+            # skip the local file header to reach the stored .npy bytes
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack('<HH', f.read(4))
+            start = info.header_offset + 30 + name_len + extra_len
+            f.seek(start)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject or shape == ():
+                f.seek(start)
+                arrays[name] = np.lib.format.read_array(f)
+            else:
+                arrays[name] = np.memmap(filename, dtype=dtype, mode='r', shape=shape,
+                                         order='F' if fortran_order else 'C', offset=f.tell())
+
+    return arrays
+
+
+default_library = ir_library()
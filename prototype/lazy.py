@@ -0,0 +1,21 @@
+import importlib
+
+
+class lazy_module:
+    # stands in for a module and imports it on the first attribute access, so heavy
+    # dependencies (scipy, matplotlib) are only paid for by code that uses them
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self._module is None:
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
@@ -0,0 +1,311 @@
+import numpy as np
+
+from .config import get_dtype, output_buffer
+
+
+# one cycle of each shape over phase in [0, 1), all start at 0 and rise like the sine
+waveforms = {
+    'sine': lambda phase: np.sin(2 * np.pi * phase),
+    'triangle': lambda phase: 1.0 - 4.0 * np.abs((phase + 0.25) % 1.0 - 0.5),
+    'saw': lambda phase: 2.0 * ((phase + 0.5) % 1.0) - 1.0,
+    'square': lambda phase: np.where(phase < 0.5, 1.0, -1.0),
+}
+
+
+class lfo:
+    def __init__(self, fs, rate_hz=1.0, waveform='sine', phase=0.0, control_rate=1):
+        # waveform is a name from `waveforms` or one cycle of any shape as an array (a wavetable).
+        # phase (in cycles) may be an array, e.g. shape (voices, 1) for one LFO per chorus voice.
+        # control_rate > 1 evaluates the waveform every control_rate samples and interpolates between
+        if isinstance(waveform, str) and waveform not in waveforms:
+            raise ValueError(f"unknown waveform '{waveform}', expected one of {list(waveforms)} or an array")
+
+        self.fs = fs
+        self.rate = rate_hz
+        self.waveform = waveform
+        self.initial_phase = phase
+        self.control_rate = int(control_rate)
+
+        # the table is closed with its first value so interpolation wraps around
+        self.table = None
+        if not isinstance(waveform, str):
+            table = np.asarray(waveform, dtype=np.float64)
+            self.table = np.append(table, table[0])
+
+        self.reset()
+
+    def _phase_at(self, positions):
+        # the phase accumulator at given sample counts, counted from the first sample in float64
+        # so it neither drifts nor depends on how the signal is split into blocks
+        increment = np.asarray(self.rate, dtype=np.float64) / self.fs
+        phase = self.offset + positions * increment
+        return np.mod(phase, 1.0, out=phase)
+
+    def phases(self, num_samples):
+        phase = self._phase_at(self.position + np.arange(num_samples))
+        self.position += num_samples
+        return phase
+
+    def current_phase(self):
+        return (self.offset + self.position * np.asarray(self.rate, dtype=np.float64) / self.fs) % 1.0
+
+    def start_at(self, phase):
+        # continue from a given phase, e.g. that of the LFO this one replaces
+        self.offset = np.mod(phase, 1.0)
+        self.position = 0
+        return self
+
+    def _shape(self, phase):
+        if self.table is None:
+            return waveforms[self.waveform](phase)
+
+        phase *= len(self.table) - 1
+        return np.interp(phase, np.arange(len(self.table)), self.table)
+
+    def render(self, num_samples):
+        if self.control_rate == 1:
+            return self._shape(self.phases(num_samples))
+
+        # the waveform on the grid of every control_rate-th sample around the block, the grid is
+        # fixed by the sample count so the result still does not depend on the block size
+        factor = self.control_rate
+        position = self.position + np.arange(num_samples)
+        first = self.position // factor
+        grid = self._shape(self._phase_at(np.arange(first, (self.position + num_samples - 1) // factor + 2) * factor))
+
+        index = position // factor - first
+        frac = (position % factor) / factor
+        self.position += num_samples
+
+        start = grid[..., index]
+        return start + frac * (grid[..., index + 1] - start)
+
+    def reset(self):
+        return self.start_at(self.initial_phase)
+
+
+class fractional_delay:
+    # samples needed after the integer read position by each interpolation
+    lookahead = {'linear': 1, 'cubic': 2}
+
+    def __init__(self, max_delay, interpolation='linear'):
+        if interpolation not in self.lookahead:
+            raise ValueError(f"interpolation must be one of {list(self.lookahead)}, got '{interpolation}'")
+
+        self.interpolation = interpolation
+        self.ahead = self.lookahead[interpolation]
+
+        # a read never touches the sample being written, so output does not depend on the block size
+        self.min_delay = self.ahead + 1
+        self.max_delay = max(float(max_delay), self.min_delay)
+        self.history_len = int(np.ceil(self.max_delay)) + 2
+        self.reset()
+
+    def _load(self, frames):
+        # history followed by room for the block, reused while the layout stays the same
+        shape = np.shape(frames)[:-1]
+        length = self.history_len + np.shape(frames)[-1]
+
+        if self.history is None or self.history.shape[:-1] != shape:
+            self.history = np.zeros(shape + (self.history_len,), dtype=get_dtype())
+        if self.work is None or self.work.shape != shape + (length,):
+            self.work = np.empty(shape + (length,), dtype=get_dtype())
+
+        self.work[..., :self.history_len] = self.history
+        return self.work
+
+    def _store(self, work):
+        self.history[...] = work[..., -self.history_len:]
+
+    def _positions(self, delays, num_samples):
+        # integer read index and fraction, split from the delay alone so the result does not
+        # depend on where the sample sits in the block
+        delays = np.clip(delays, self.min_delay, self.max_delay)
+        whole = np.ceil(delays)
+        index = self.history_len + np.arange(num_samples) - whole.astype(np.intp)
+        return index, (whole - delays).astype(get_dtype())
+
+    def read(self, work, index, frac):
+        # vectorized interpolated reads at index + frac along the last axis of work
+
+        if self.interpolation == 'linear':
+            a = _gather(work, index)
+            b = _gather(work, index + 1)
+            return a + frac * (b - a)
+
+        # 4-point catmull-rom
+        xm1, x0, x1, x2 = (_gather(work, index + k) for k in (-1, 0, 1, 2))
+        c1 = 0.5 * (x1 - xm1)
+        c2 = xm1 - 2.5 * x0 + 2.0 * x1 - 0.5 * x2
+        c3 = 0.5 * (x2 - xm1) + 1.5 * (x0 - x1)
+        return ((c3 * frac + c2) * frac + c1) * frac + x0
+
+    def process_block(self, frames, delays, feedback=0.0, out=None):
+        # one tap, delays in samples (scalar or one per sample); returns the delayed signal,
+        # feedback sends it back into the line
+        num_samples = np.shape(frames)[-1]
+        out = output_buffer(np.shape(frames), out)
+        work = self._load(frames)
+        index, frac = self._positions(delays, num_samples)
+
+        if not np.any(feedback):
+            work[..., self.history_len:] = frames
+            out[...] = self.read(work, index, frac)
+            self._store(work)
+            return out
+
+        # every run shorter than the smallest delay only reads samples written before it
+        run = int(np.min(np.clip(delays, self.min_delay, self.max_delay))) - self.ahead
+        frac = np.broadcast_to(frac, np.shape(index))
+
+        for start in range(0, num_samples, run):
+            stop = min(num_samples, start + run)
+            tap = out[..., start:stop]
+            tap[...] = self.read(work, index[..., start:stop], frac[..., start:stop])
+            work[..., self.history_len + start:self.history_len + stop] = frames[..., start:stop] + feedback * tap
+
+        self._store(work)
+        return out
+
+    def taps(self, frames, delays, out=None):
+        # several taps summed, delays of shape (taps, num_samples) or (taps, 1); no feedback
+        num_samples = np.shape(frames)[-1]
+        out = output_buffer(np.shape(frames), out)
+        work = self._load(frames)
+        work[..., self.history_len:] = frames
+
+        index, frac = self._positions(delays, num_samples)
+        np.sum(self.read(work[..., np.newaxis, :], index, frac), axis=-2, out=out)
+        self._store(work)
+        return out
+
+    def reset(self):
+        # allocated on the first block, once the channel layout is known
+        self.history = None
+        self.work = None
+        return self
+
+
+def _gather(work, index):
+    # take_along_axis broadcasts leading axes, they only need the same number of them
+    if index.ndim < work.ndim:
+        index = index.reshape((1,) * (work.ndim - index.ndim) + index.shape)
+    elif work.ndim < index.ndim:
+        work = work.reshape((1,) * (index.ndim - work.ndim) + work.shape)
+
+    return np.take_along_axis(work, index, axis=-1)
+
+
+def _blend(frames, wet, mix, out):
+    np.multiply(frames, 1.0 - mix, out=out)
+    wet *= mix
+    out += wet
+    return out
+
+
+class tremolo_block:
+    def __init__(self, fs, rate_hz=5.0, depth=0.5, waveform='sine', control_rate=1):
+        self.depth = depth
+        self.lfo = lfo(fs, rate_hz, waveform, control_rate=control_rate)
+
+    def process_block(self, frames, out=None):
+        out = output_buffer(np.shape(frames), out)
+
+        # the gain swings between 1 - depth and 1
+        gain = 1.0 - (0.5 * np.asarray(self.depth)) * (self.lfo.render(np.shape(frames)[-1]) + 1.0)
+        np.multiply(frames, gain, out=out)
+        return out
+
+    def reset(self):
+        self.lfo.reset()
+        return self
+
+
+class vibrato_block:
+    def __init__(self, fs, rate_hz=5.0, depth_ms=2.0, waveform='sine', interpolation='linear', control_rate=1):
+        self.depth = depth_ms * fs / 1000.0
+        self.lfo = lfo(fs, rate_hz, waveform, control_rate=control_rate)
+        # room for the depth above the minimum delay of either interpolation
+        self.line = fractional_delay(self.depth + 3, interpolation)
+
+    def process_block(self, frames, out=None):
+        # fully wet: only the pitch wobble of the moving read position is heard
+        delays = self.line.min_delay + 0.5 * self.depth * (self.lfo.render(np.shape(frames)[-1]) + 1.0)
+        return self.line.process_block(frames, delays, out=out)
+
+    def reset(self):
+        self.lfo.reset()
+        self.line.reset()
+        return self
+
+
+class chorus_block:
+    def __init__(self, fs, rate_hz=0.8, depth_ms=3.0, delay_ms=20.0, mix=0.5, voices=2, waveform='sine',
+                 interpolation='linear', control_rate=1):
+        self.base = delay_ms * fs / 1000.0
+        self.depth = depth_ms * fs / 1000.0
+        self.mix = mix
+        self.voices = voices
+
+        # one LFO phase per voice, spread evenly over the cycle
+        self.lfo = lfo(fs, rate_hz, waveform, phase=(np.arange(voices) / voices)[:, np.newaxis],
+                       control_rate=control_rate)
+        self.line = fractional_delay(self.base + 0.5 * self.depth, interpolation)
+
+    def process_block(self, frames, out=None):
+        out = output_buffer(np.shape(frames), out)
+
+        # voices sweep around the base delay, each read is a tap of the same line
+        delays = self.base + 0.5 * self.depth * self.lfo.render(np.shape(frames)[-1])
+        wet = self.line.taps(frames, delays)
+        wet *= 1.0 / self.voices
+        return _blend(frames, wet, self.mix, out)
+
+    def reset(self):
+        self.lfo.reset()
+        self.line.reset()
+        return self
+
+
+class flanger_block:
+    def __init__(self, fs, rate_hz=0.25, depth_ms=2.0, delay_ms=1.0, feedback=0.5, mix=0.5, waveform='sine',
+                 interpolation='linear', control_rate=1):
+        self.base = delay_ms * fs / 1000.0
+        self.depth = depth_ms * fs / 1000.0
+        self.feedback = feedback
+        self.mix = mix
+        self.lfo = lfo(fs, rate_hz, waveform, control_rate=control_rate)
+        self.line = fractional_delay(self.base + self.depth, interpolation)
+
+    def process_block(self, frames, out=None):
+        out = output_buffer(np.shape(frames), out)
+
+        # the delay sweeps from delay_ms up to delay_ms + depth_ms and back
+        delays = self.base + 0.5 * self.depth * (self.lfo.render(np.shape(frames)[-1]) + 1.0)
+        wet = self.line.process_block(frames, delays, self.feedback)
+        return _blend(frames, wet, self.mix, out)
+
+    def reset(self):
+        self.lfo.reset()
+        self.line.reset()
+        return self
+
+
+def tremolo(signal, fs, rate_hz=5.0, depth=0.5, waveform='sine', control_rate=1, out=None):
+    return tremolo_block(fs, rate_hz, depth, waveform, control_rate).process_block(signal, out=out)
+
+
+def vibrato(signal, fs, rate_hz=5.0, depth_ms=2.0, waveform='sine', interpolation='linear', control_rate=1, out=None):
+    return vibrato_block(fs, rate_hz, depth_ms, waveform, interpolation, control_rate).process_block(signal, out=out)
+
+
+def chorus(signal, fs, rate_hz=0.8, depth_ms=3.0, delay_ms=20.0, mix=0.5, voices=2, waveform='sine',
+           interpolation='linear', control_rate=1, out=None):
+    return chorus_block(fs, rate_hz, depth_ms, delay_ms, mix, voices, waveform, interpolation,
+                        control_rate).process_block(signal, out=out)
+
+
+def flanger(signal, fs, rate_hz=0.25, depth_ms=2.0, delay_ms=1.0, feedback=0.5, mix=0.5, waveform='sine',
+            interpolation='linear', control_rate=1, out=None):
+    return flanger_block(fs, rate_hz, depth_ms, delay_ms, feedback, mix, waveform, interpolation,
+                         control_rate).process_block(signal, out=out)
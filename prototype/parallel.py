@@ -0,0 +1,263 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .config import get_dtype, output_buffer, precision
+from .dynamics import compressor, noise_gate, compute_envelope
+from .effects import fuzz, overdrive, delay, cabinet
+from .filters import biquad, lowpass, highpass, bandpass
+from .lazy import lazy_module
+from .modulation import tremolo, vibrato, chorus, flanger
+from .streaming import block_for
+from .waveshaping import waveshaper
+
+
+sp_signal = lazy_module('scipy.signal')
+
+
+def _shaper_memory(block, tolerance):
+    # ADAA keeps `order` inputs, the oversampling halfbands are FIRs: exact, nothing decays
+    shaper = block.shaper
+    if shaper is None:
+        return 0
+
+    processor = getattr(shaper, 'processor', shaper)
+    if processor is shaper:
+        return processor.order
+
+    # halfband up and down at the base rate, ADAA in between at twice the rate
+    return shaper.num_taps + processor.order
+
+
+def _no_memory(block, tolerance):
+    return 0
+
+
+def _filter_memory(block, tolerance):
+    # samples until the impulse response stays below tolerance of its peak, the state left by older
+    # input dies out at the same rate
+    sos = np.asarray(block.sos, dtype=np.float64)
+    length = 1024
+    while True:
+        impulse = np.zeros(length)
+        impulse[0] = 1.0
+        h = np.abs(sp_signal.sosfilt(sos, impulse))
+        above = np.flatnonzero(h > tolerance * np.max(h))
+        last = above[-1] + 1 if len(above) else 0
+        if last < length // 2 or length >= 2 ** 26:
+            return int(last)
+
+        length *= 2
+
+
+def _follower_memory(follower, tolerance):
+    # two detectors started at different levels approach each other by the attack or release
+    # coefficient every sample, the larger one bounds it
+    coeff = float(np.max(np.maximum(follower.attack_coeff, follower.release_coeff)))
+    if coeff <= 0.0:
+        return 1
+
+    return int(np.ceil(np.log(tolerance) / np.log(coeff)))
+
+
+def _envelope_memory(block, tolerance):
+    return _follower_memory(block, tolerance)
+
+
+def _dynamics_memory(block, tolerance):
+    memory = _follower_memory(block.detector, tolerance)
+    if hasattr(block, 'logic'):
+        # the gate gain settles after the hold, the smoother then forgets it
+        memory += block.logic.hold + _follower_memory(block.smoother, tolerance)
+
+    # followers at the control rate forget per control sample, the interpolator adds two groups
+    factor = block.control.decimator.factor if block.control.decimator is not None else 1
+    return factor * (memory + 2)
+
+
+def _echo_memory(delay_samples, feedback, tolerance):
+    # every trip round the loop scales the echo by feedback
+    feedback = float(np.max(np.abs(feedback)))
+    if feedback <= 0.0:
+        return int(np.ceil(delay_samples))
+    if feedback >= 1.0:
+        raise ValueError(f"feedback of {feedback} never decays, the stage cannot be split into chunks")
+
+    trips = int(np.ceil(np.log(tolerance) / np.log(feedback)))
+    return int(np.ceil(delay_samples)) * (trips + 1)
+
+
+def _delay_memory(block, tolerance):
+    return _echo_memory(block.delay_samples, block.feedback, tolerance)
+
+
+def _cabinet_memory(block, tolerance):
+    return len(block.ir)
+
+
+def _line_memory(block, tolerance):
+    line = block.line
+    return _echo_memory(line.history_len, getattr(block, 'feedback', 0.0), tolerance)
+
+
+# effect -> samples of input before a chunk it needs to match a run over the whole file, within
+# `tolerance` of full scale. state that only depends on the sample position (LFOs) is set exactly
+memory_lengths = {
+    fuzz: _shaper_memory,
+    overdrive: _shaper_memory,
+    waveshaper: _no_memory,
+    delay: _delay_memory,
+    cabinet: _cabinet_memory,
+    biquad: _filter_memory,
+    lowpass: _filter_memory,
+    highpass: _filter_memory,
+    bandpass: _filter_memory,
+    compute_envelope: _envelope_memory,
+    compressor: _dynamics_memory,
+    noise_gate: _dynamics_memory,
+    tremolo: _no_memory,
+    vibrato: _line_memory,
+    chorus: _line_memory,
+    flanger: _line_memory,
+}
+
+# effects rendered through their block processor with the LFO moved to the chunk's first sample
+positioned_effects = {tremolo, vibrato, chorus, flanger}
+
+
+def stage_memory(effect_fn, kwargs, tolerance=1e-5):
+    # (samples needed before a chunk, samples needed after it) for one stage
+    if effect_fn not in memory_lengths:
+        raise ValueError(f"{getattr(effect_fn, '__name__', effect_fn)} declares no memory length, "
+                         f"it cannot be split into chunks")
+    if kwargs.get('tail'):
+        raise ValueError("delay with tail=True renders past the input, it cannot be split into chunks")
+
+    block = block_for(effect_fn, **kwargs)
+    # lookahead dynamics read `latency` samples past the one they output
+    ahead = int(getattr(block, 'latency', 0)) if effect_fn in (compressor, noise_gate) else 0
+    return memory_lengths[effect_fn](block, tolerance), ahead
+
+
+def stage_grid(effect_fn, kwargs):
+    # dynamics at a control rate decimate in groups counted from the first sample, a chunk has to start
+    # on a group boundary to see the same groups as the whole file. LFOs are positioned exactly instead
+    if effect_fn not in (compressor, noise_gate):
+        return 1
+
+    return int(kwargs.get('control_rate', 1))
+
+
+def _render_chunk(chain, input_name, output_name, shape, dtype, start, stop, preroll, postroll, grid=1):
+    # workers map the parent's blocks and only close them, the parent unlinks them. pool workers share
+    # the parent's resource tracker, so attaching does not hand them over to the worker
+    started = time.perf_counter()
+    source = shared_memory.SharedMemory(name=input_name)
+    target = shared_memory.SharedMemory(name=output_name)
+
+    try:
+        signal = np.ndarray(shape, dtype=dtype, buffer=source.buf)
+        output = np.ndarray(shape, dtype=dtype, buffer=target.buf)
+
+        # rounded down to the control-rate grid, so decimated stages keep the whole file's phase
+        first = max(0, (start - preroll) // grid * grid)
+        segment = signal[..., first:min(shape[-1], stop + postroll)]
+
+        with precision(dtype):
+            for effect_fn, kwargs in chain:
+                if effect_fn in positioned_effects:
+                    # the LFO phase comes from the sample count, so the chunk continues it exactly
+                    block = block_for(effect_fn, **kwargs)
+                    block.lfo.position = first
+                    segment = block.process_block(segment)
+                else:
+                    segment = effect_fn(segment, **kwargs)
+
+            output[..., start:stop] = segment[..., start - first:stop - first]
+            del signal, output, segment
+    finally:
+        source.close()
+        target.close()
+
+    return start, stop, time.perf_counter() - started
+
+
+class chunk_renderer:
+    def __init__(self, chain, workers=None, chunk_size=None, tolerance=1e-5):
+        # chain: (effect_fn, kwargs) or (effect_fn, name, kwargs) specs, run with the offline functions.
+        # every chunk is rendered from `preroll` samples before it, the summed memory of the stages,
+        # so the state it starts from is within tolerance of the one a whole-file run would have
+        self.chain = [(stage[0], dict(stage[-1])) for stage in chain]
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.tolerance = tolerance
+
+        self.memory = [stage_memory(effect_fn, kwargs, tolerance) for effect_fn, kwargs in self.chain]
+        self.preroll = sum(before for before, _ in self.memory)
+        self.postroll = sum(after for _, after in self.memory)
+        self.grid = math.lcm(*[stage_grid(effect_fn, kwargs) for effect_fn, kwargs in self.chain], 1)
+        self.timings = []
+
+    def chunks(self, num_samples):
+        # two chunks per worker to even out the load, each at least 4x the overlap it is rendered with.
+        # sizes are whole control-rate groups so every chunk starts on the grid
+        size = self.chunk_size
+        if size is None:
+            size = max(-(-num_samples // (2 * self.workers)), 4 * (self.preroll + self.postroll), 4096)
+        size = -(-size // self.grid) * self.grid
+
+        return [(start, min(num_samples, start + size)) for start in range(0, num_samples, size)]
+
+    def render(self, signal, out=None, pool=None):
+        # pool: an executor to reuse across renders, one is started per call otherwise
+        signal = np.asarray(signal)
+        shape = np.shape(signal)
+        dtype = get_dtype()
+        out = output_buffer(shape, out)
+        nbytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+
+        # input and output live in shared memory, tasks carry names and sample ranges, not arrays
+        source = shared_memory.SharedMemory(create=True, size=nbytes)
+        target = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            np.ndarray(shape, dtype=dtype, buffer=source.buf)[...] = signal
+
+            executor = ProcessPoolExecutor(max_workers=self.workers) if pool is None else pool
+            try:
+                futures = [executor.submit(_render_chunk, self.chain, source.name, target.name, shape, dtype.str,
+                                           start, stop, self.preroll, self.postroll, self.grid)
+                           for start, stop in self.chunks(shape[-1])]
+                self.timings = [future.result() for future in futures]
+            finally:
+                if pool is None:
+                    executor.shutdown(cancel_futures=True)
+
+            out[...] = np.ndarray(shape, dtype=dtype, buffer=target.buf)
+        finally:
+            source.close()
+            source.unlink()
+            target.close()
+            target.unlink()
+
+        return out
+
+    def summary(self):
+        lines = [f"{'stage':<24} {'memory':>10} {'lookahead':>10}"]
+        for (effect_fn, _), (before, after) in zip(self.chain, self.memory):
+            lines.append(f"{effect_fn.__name__:<24} {before:>10} {after:>10}")
+
+        lines.append(f"pre-roll {self.preroll}, post-roll {self.postroll} samples, grid {self.grid}, "
+                     f"tolerance {self.tolerance:g}")
+        if self.timings:
+            busy = sum(elapsed for _, _, elapsed in self.timings)
+            lines.append(f"{len(self.timings)} chunks on {self.workers} workers, {busy:.3f} s of work")
+
+        return '\n'.join(lines)
+
+
+def render_parallel(signal, chain, workers=None, chunk_size=None, tolerance=1e-5, out=None, pool=None):
+    return chunk_renderer(chain, workers, chunk_size, tolerance).render(signal, out=out, pool=pool)
@@ -0,0 +1,259 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .config import output_buffer
+from .streaming import array_reader, block_chain
+
+
+# marks the end of the stream in a queue
+_end = object()
+
+
+class _stopped(Exception):
+    pass
+
+
+def _put(q, item, stop):
+    # blocks while the queue is full (backpressure), gives up once another thread failed
+    while True:
+        try:
+            q.put(item, timeout=0.05)
+            return
+        except queue.Full:
+            if stop.is_set():
+                raise _stopped()
+
+
+def _get(q, stop):
+    while True:
+        try:
+            return q.get(timeout=0.05)
+        except queue.Empty:
+            if stop.is_set():
+                raise _stopped()
+
+
+def partition_stages(costs, threads):
+    # contiguous groups of stages minimizing the cost of the slowest group, stages keep their order
+    # so each one still sees its blocks in sequence. best[k][i]: slowest group splitting costs[:i] in k
+    n = len(costs)
+    threads = max(1, min(threads, n))
+    prefix = np.concatenate([[0.0], np.cumsum(costs, dtype=float)])
+
+    best = np.full((threads + 1, n + 1), np.inf)
+    split = np.zeros((threads + 1, n + 1), dtype=int)
+    best[0][0] = 0.0
+    for k in range(1, threads + 1):
+        for i in range(1, n + 1):
+            for j in range(k - 1, i):
+                cost = max(best[k - 1][j], prefix[i] - prefix[j])
+                if cost < best[k][i]:
+                    best[k][i], split[k][i] = cost, j
+
+    bounds = [n]
+    for k in range(threads, 0, -1):
+        bounds.append(split[k][bounds[-1]])
+
+    bounds = bounds[::-1]
+    return [list(range(start, stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+class _worker:
+    def __init__(self, stages, names, processors, inbox, outbox, stop):
+        self.stages = stages
+        self.names = names
+        self.processors = processors
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop = stop
+        self.error = None
+
+        self.blocks = 0
+        self.busy = [0.0] * len(stages)
+        self.cpu = [0.0] * len(stages)
+        self.starved = 0.0
+        self.blocked = 0.0
+
+    def run(self):
+        try:
+            while True:
+                start = time.perf_counter()
+                frames = _get(self.inbox, self.stop)
+                ready = time.perf_counter()
+                self.starved += ready - start
+                if frames is _end:
+                    break
+
+                # the stages of one worker run back to back on the same block, in chain order. cpu time
+                # leaves out the time the thread waited for a core or the GIL
+                for i, processor in enumerate(self.processors):
+                    cpu_start = time.thread_time()
+                    frames = processor.process_block(frames)
+                    done = time.perf_counter()
+                    self.busy[i] += done - ready
+                    self.cpu[i] += time.thread_time() - cpu_start
+                    ready = done
+
+                _put(self.outbox, frames, self.stop)
+                self.blocked += time.perf_counter() - ready
+                self.blocks += 1
+
+            _put(self.outbox, _end, self.stop)
+        except _stopped:
+            pass
+        except BaseException as e:
+            self.error = e
+            self.stop.set()
+
+
+class _feeder:
+    def __init__(self, reader, outbox, stop):
+        self.reader = reader
+        self.outbox = outbox
+        self.stop = stop
+        self.error = None
+
+    def run(self):
+        try:
+            for frames in self.reader:
+                _put(self.outbox, frames, self.stop)
+
+            _put(self.outbox, _end, self.stop)
+        except _stopped:
+            pass
+        except BaseException as e:
+            self.error = e
+            self.stop.set()
+
+
+class pipelined_chain:
+    def __init__(self, chain, threads=None, queue_size=4, costs=None):
+        # chain: a block_chain or (effect_fn, kwargs) / (effect_fn, name, kwargs) specs. stages are split
+        # into `threads` contiguous groups (default one per stage), balanced by `costs` when given,
+        # e.g. busy_s from a previous report(). each group runs on its own thread, blocks move
+        # between them through queues of `queue_size` blocks
+        if not isinstance(chain, block_chain):
+            specs = [stage if len(stage) == 3 else (stage[0], None, stage[1]) for stage in chain]
+            built = block_chain()
+            for effect_fn, name, kwargs in specs:
+                built.apply(effect_fn, name, **kwargs)
+            chain = built
+
+        self.chain = chain
+        self.queue_size = queue_size
+
+        num_stages = len(chain.processors)
+        threads = num_stages if threads is None else threads
+        costs = np.ones(num_stages) if costs is None else costs
+        self.groups = partition_stages(costs, threads) if num_stages else []
+        self.workers = []
+        self.wall = 0.0
+
+    @property
+    def names(self):
+        return self.chain.names
+
+    def reset(self):
+        self.chain.reset()
+        return self
+
+    def run(self, reader, writer):
+        # the reader is drained on its own thread and the writer is called on this one, in block order
+        stop = threading.Event()
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.groups) + 1)]
+        self.workers = [_worker(group, [self.chain.names[i] for i in group], [self.chain.processors[i] for i in group],
+                                queues[k], queues[k + 1], stop) for k, group in enumerate(self.groups)]
+
+        feeder = _feeder(reader, queues[0], stop)
+        threads = [threading.Thread(target=feeder.run, name='pipeline-reader', daemon=True)]
+        threads += [threading.Thread(target=worker.run, name=f"pipeline-{'+'.join(worker.names)}", daemon=True)
+                    for worker in self.workers]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        num_samples = 0
+        try:
+            while True:
+                frames = _get(queues[-1], stop)
+                if frames is _end:
+                    break
+
+                writer(frames)
+                num_samples += np.shape(frames)[-1]
+        except _stopped:
+            pass
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+            self.wall = time.perf_counter() - start
+
+        for worker in [feeder] + self.workers:
+            if worker.error is not None:
+                raise worker.error
+
+        return num_samples
+
+    def process(self, signal, block_size=1024):
+        output = output_buffer(np.shape(signal))
+        written = [0]
+
+        def write(frames):
+            output[..., written[0]:written[0] + np.shape(frames)[-1]] = frames
+            written[0] += np.shape(frames)[-1]
+
+        self.run(array_reader(signal, block_size), write)
+        return output
+
+    def report(self):
+        # per stage: time spent processing and its share of the wall time. per thread: time waiting for
+        # input (starved, upstream is slower) and for room downstream (blocked, downstream is slower)
+        report = []
+        for thread, worker in enumerate(self.workers):
+            for stage, name, busy, cpu in zip(worker.stages, worker.names, worker.busy, worker.cpu):
+                report.append({
+                    'name': name,
+                    'stage': stage,
+                    'thread': thread,
+                    'blocks': worker.blocks,
+                    'busy_s': busy,
+                    'cpu_s': cpu,
+                    'utilization': busy / self.wall if self.wall > 0 else 0.0,
+                    'starved_s': worker.starved,
+                    'blocked_s': worker.blocked,
+                })
+
+        return report
+
+    def _slowest_thread(self):
+        # the thread that limits throughput, the one with the most busy time
+        if not self.workers:
+            return None
+
+        return int(np.argmax([sum(worker.busy) for worker in self.workers]))
+
+    def slowest(self):
+        thread = self._slowest_thread()
+        return None if thread is None else self.workers[thread].names
+
+    def summary(self):
+        slowest = self._slowest_thread()
+        lines = [f"{'stage':<24} {'thread':>6} {'blocks':>7} {'busy ms':>10} {'cpu ms':>10} {'util':>6} "
+                 f"{'starved ms':>11} {'blocked ms':>11}"]
+
+        for stage in self.report():
+            marker = '  <- slowest' if stage['thread'] == slowest else ''
+            lines.append(f"{stage['name']:<24} {stage['thread']:>6} {stage['blocks']:>7} {stage['busy_s'] * 1e3:>10.3f} "
+                         f"{stage['cpu_s'] * 1e3:>10.3f} {stage['utilization']:>6.1%} {stage['starved_s'] * 1e3:>11.3f} "
+                         f"{stage['blocked_s'] * 1e3:>11.3f}{marker}")
+
+        lines.append(f"wall {self.wall * 1e3:.3f} ms on {len(self.workers)} threads")
+        return '\n'.join(lines)
+
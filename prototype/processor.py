@@ -1,28 +1,200 @@
+import inspect
+import os
+import tempfile
+from collections import OrderedDict
+
 import numpy as np
 
+from .compiler import compile_chain
+from .config import get_dtype
+from .parallel import chunk_renderer
+from .pipeline import pipelined_chain
+from .sweep import sweep
+
+
+history_policies = ('all', 'none', 'last', 'downsample', 'disk')
+
+
+class history_store:
+    def __init__(self, policy='all', max_stages=None, max_bytes=None, max_points=4096, spill_dir=None):
+        if policy not in history_policies:
+            raise ValueError(f"unknown history policy '{policy}', expected one of {history_policies}")
+
+        self.policy = policy
+        self.max_stages = 1 if policy == 'last' and max_stages is None else max_stages
+        self.max_bytes = max_bytes
+        self.max_points = max_points
+        self.spill_dir = spill_dir
+        self.snapshots = OrderedDict()
+        self.sizes = {}
+        self.nbytes = 0
+        self.spilled = 0
+
+    def wants(self, name):
+        return name is not None and self.policy != 'none'
+
+    def set_input(self, signal):
+        self.clear()
+        # the input is held by reference, it never costs a copy or counts against the budget
+        self.snapshots['input'] = self._downsample(signal) if self.policy == 'downsample' else signal
+        self.sizes['input'] = 0
+
+    def record(self, name, data):
+        if not self.wants(name):
+            return
+
+        self.discard(name)
+
+        if self.policy == 'downsample':
+            data = self._downsample(data)
+
+        size = data.nbytes
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        while self._over_budget(size):
+            self.discard(next(key for key in self.snapshots if key != 'input'))
+
+        self.snapshots[name] = self._snapshot(name, data)
+        self.sizes[name] = size
+        self.nbytes += size
+
+    def _over_budget(self, size):
+        stages = len(self.snapshots) - ('input' in self.snapshots)
+        if self.max_stages is not None and stages >= self.max_stages:
+            return stages > 0
+
+        return self.max_bytes is not None and stages > 0 and self.nbytes + size > self.max_bytes
+
+    def _snapshot(self, name, data):
+        if self.policy == 'downsample':
+            return data
+
+        if self.policy == 'disk':
+            if self.spill_dir is None:
+                self.spill_dir = tempfile.mkdtemp(prefix='guitar_history_')
+
+            self.spilled += 1
+            spilled = np.memmap(os.path.join(self.spill_dir, f'{self.spilled}_{name}.dat'),
+                                dtype=data.dtype, mode='w+', shape=data.shape)
+            spilled[:] = data
+            spilled.flush()
+            return spilled
+
+        return data.copy()
+
+    def _downsample(self, data):
+        # min/max pairs per bin keep the peak envelope for plotting
+        bins = self.max_points // 2
+        num_samples = data.shape[-1]
+        if num_samples <= self.max_points:
+            return data.copy()
+
+        step = -(-num_samples // bins)
+        pad = [(0, 0)] * (data.ndim - 1) + [(0, step * bins - num_samples)]
+        padded = np.pad(data, pad, mode='edge').reshape(data.shape[:-1] + (bins, step))
+
+        snapshot = np.empty(data.shape[:-1] + (2 * bins,), dtype=data.dtype)
+        snapshot[..., 0::2] = padded.min(axis=-1)
+        snapshot[..., 1::2] = padded.max(axis=-1)
+        return snapshot
+
+    def discard(self, name):
+        if name not in self.snapshots:
+            return
+
+        snapshot = self.snapshots.pop(name)
+        self.nbytes -= self.sizes.pop(name)
+
+        if isinstance(snapshot, np.memmap) and self.policy == 'disk':
+            filename = snapshot.filename
+            del snapshot
+            os.remove(filename)
+
+    def clear(self):
+        for name in list(self.snapshots):
+            self.discard(name)
+
+
+def _accepts_out(effect_fn):
+    try:
+        return 'out' in inspect.signature(effect_fn).parameters
+    except (TypeError, ValueError):
+        return False
+
 
 class guitar_processor:
-    def __init__(self, fs, signal):
+    def __init__(self, fs, signal, history='all', max_stages=None, max_bytes=None, max_points=4096, spill_dir=None,
+                 ping_pong=False, profiler=None, defer=False):
         self.fs = fs
         self.signal = signal
-        self.processed = signal.copy()
-        self.history = {'input': signal.copy()}
+        self.processed = signal
+        self.chain = []
+        self.ping_pong = ping_pong
+        self.buffers = None
+        self.history = history_store(history, max_stages, max_bytes, max_points, spill_dir)
+        self.history.set_input(signal)
+        self.profiler = profiler
+        self.defer = defer
 
     def apply(self, effect_fn, name=None, **kwargs):
-        self.processed = effect_fn(self.processed, **kwargs)
+        if self.defer:
+            # only recorded: compile() / pipeline() / parallel() / sweep() make the one pass, get_signal()
+            # renders the compiled chain on demand
+            self.chain.append((effect_fn, name, kwargs))
+            self.processed = None
+            return self
 
-        if name:
-            self.history[name] = self.processed.copy()
+        out = self._next_buffer(effect_fn, kwargs)
+        call_kwargs = kwargs if out is None else dict(kwargs, out=out)
+
+        if self.profiler is None:
+            self.processed = effect_fn(self.processed, **call_kwargs)
+        else:
+            label = name or getattr(effect_fn, '__name__', repr(effect_fn))
+            self.processed = self.profiler.measure(len(self.chain), label, effect_fn, self.processed, **call_kwargs)
+
+        self.chain.append((effect_fn, name, kwargs))
+        self.history.record(name, self.processed)
 
         return self
 
+    def _next_buffer(self, effect_fn, kwargs):
+        if not self.ping_pong or kwargs.get('tail') or not _accepts_out(effect_fn):
+            return None
+
+        if self.buffers is None:
+            self.buffers = [np.empty(np.shape(self.signal), dtype=get_dtype()) for _ in range(2)]
+
+        # write into whichever buffer does not hold the current signal
+        buffer = self.buffers[1] if self.processed is self.buffers[0] else self.buffers[0]
+        return buffer if buffer.shape == np.shape(self.processed) else None
+
     def get_signal(self):
+        if self.processed is None:
+            self.processed = self.compile().run(self.signal)
         return self.processed
 
     def get_history(self):
-        return self.history
+        return self.history.snapshots
+
+    def compile(self):
+        return compile_chain(self.chain)
+
+    def pipeline(self, threads=None, queue_size=4, costs=None):
+        # the recorded chain as block processors on worker threads, run it with .process(signal, block_size)
+        return pipelined_chain(self.chain, threads, queue_size, costs)
+
+    def parallel(self, workers=None, chunk_size=None, tolerance=1e-5):
+        # the recorded chain split into overlapping chunks on a process pool, run it with .render(signal)
+        return chunk_renderer(self.chain, workers, chunk_size, tolerance)
+
+    def sweep(self, variants, max_bytes=256 * 1024 * 1024):
+        # re-render the recorded chain for every variant, lazily in batches
+        return sweep(self.chain, variants, max_bytes).render(self.signal)
 
     def reset(self):
-        self.processed = self.signal.copy()
-        self.history = {'input': self.signal.copy()}
+        self.processed = self.signal
+        self.chain = []
+        self.history.set_input(self.signal)
         return self
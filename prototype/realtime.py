@@ -0,0 +1,309 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+try:
+    import sounddevice
+except ImportError:
+    sounddevice = None
+
+from .antialias import oversampler
+from .audio_io import wav_reader
+from .config import get_dtype
+from .dynamics import gate_logic, lookahead_peak
+from .effects import delay_line
+from .modulation import lfo, fractional_delay
+from .resampling import control_decimator, control_interpolator
+from .streaming import block_chain, block_for
+
+
+def synthetic_source(fs, seconds=10.0, channels=1):
+    # a plucked A2 every half second: decaying harmonics, loud attacks and quiet tails
+    t = np.arange(int(fs * seconds)) / fs
+    phase = t % 0.5
+    note = sum(np.sin(2 * np.pi * 110.0 * k * t) / k for k in range(1, 8)) * np.exp(-6.0 * phase)
+    signal = (0.5 * note / np.max(np.abs(note))).astype(get_dtype())
+    return signal if channels == 1 else np.tile(signal, (channels, 1))
+
+
+class fake_device:
+    def __init__(self, fs=44100, block_size=256, source=None, channels=1, seconds=10.0, paced=True, record=True):
+        self.fs = fs
+        self.block_size = block_size
+        self.channels = channels
+        self.paced = paced
+        self.record = record
+
+        # file sources are read block by block, arrays and the synthetic signal are sliced
+        if isinstance(source, str):
+            self.reader = wav_reader(source)
+            self.fs = self.reader.fs
+            self.channels = self.reader.channels
+            self.num_frames = self.reader.num_frames
+        else:
+            self.reader = None
+            self.source = synthetic_source(fs, seconds, channels) if source is None else np.asarray(source, dtype=get_dtype())
+            self.channels = 1 if self.source.ndim == 1 else len(self.source)
+            self.num_frames = self.source.shape[-1]
+
+        self.period = self.block_size / self.fs
+        self.thread = None
+        self.running = False
+        self.recorded = []
+
+    def _input(self, start):
+        if self.reader is not None:
+            return self.reader.read(start, start + self.block_size)
+        return self.source[..., start:start + self.block_size]
+
+    def run(self, callback):
+        # calls back once per block at the real block rate (or back to back when not paced)
+        self.running = True
+        shape = (self.block_size,) if self.channels == 1 else (self.channels, self.block_size)
+        outdata = np.zeros(shape, dtype=get_dtype())
+        origin = time.perf_counter()
+
+        for index, start in enumerate(range(0, self.num_frames, self.block_size)):
+            if not self.running:
+                break
+
+            if self.paced:
+                delay = origin + index * self.period - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            indata = self._input(start)
+            out = outdata[..., :indata.shape[-1]]
+            callback(indata, out)
+
+            if self.record:
+                self.recorded.append(out.copy())
+
+        self.running = False
+
+    def start(self, callback):
+        self.thread = threading.Thread(target=self.run, args=(callback,), daemon=True)
+        self.thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self
+
+    def stop(self):
+        self.running = False
+        return self.wait()
+
+    def output(self):
+        if not self.recorded:
+            return np.zeros((0,) if self.channels == 1 else (self.channels, 0), dtype=get_dtype())
+        return np.concatenate(self.recorded, axis=-1)
+
+
+class sounddevice_device:
+    def __init__(self, fs=44100, block_size=256, channels=1, device=None):
+        if sounddevice is None:
+            raise ImportError("sounddevice_device needs the sounddevice package (pip install sounddevice)")
+
+        self.fs = fs
+        self.block_size = block_size
+        self.channels = channels
+        self.device = device
+        self.period = block_size / fs
+        self.stream = None
+        self.stopped = threading.Event()
+
+    def start(self, callback):
+        def stream_callback(indata, outdata, frames, time_info, status):
+            # portaudio frames are (samples, channels), the engine works on (channels, samples)
+            if self.channels == 1:
+                callback(indata[:, 0], outdata[:, 0], status)
+            else:
+                callback(indata.T, outdata.T, status)
+
+        self.stopped.clear()
+        self.stream = sounddevice.Stream(samplerate=self.fs, blocksize=self.block_size, channels=self.channels,
+                                         dtype='float32', device=self.device, callback=stream_callback,
+                                         finished_callback=self.stopped.set)
+        self.stream.start()
+        return self
+
+    def wait(self, timeout=None):
+        # a live stream has no end of input: blocks until stop() from another thread, the stream
+        # finishing, the timeout or Ctrl-C
+        try:
+            self.stopped.wait(timeout)
+        except KeyboardInterrupt:
+            pass
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        return self
+
+
+def _carry_state(old, new):
+    # keep filter memories, echoes and detector levels across a parameter change so it does not click
+    if type(old) is not type(new):
+        return
+
+    if hasattr(old, 'zi') and getattr(old, 'sos', None) is not None and old.sos.shape == new.sos.shape:
+        new.zi = old.zi
+    if hasattr(old, 'levels'):
+        new.levels = old.levels
+    if hasattr(old, 'state') and getattr(old, 'order', None) == getattr(new, 'order', None):
+        new.state = old.state
+    if isinstance(old, delay_line) and old.delay_samples == new.delay_samples:
+        new.buffer, new.pos = old.buffer, old.pos
+    if isinstance(old, lookahead_peak) and old.latency == new.latency:
+        new.peak_history, new.audio_history = old.peak_history, old.audio_history
+    if isinstance(old, gate_logic):
+        new.is_open, new.since = old.is_open, old.since
+    if isinstance(old, lfo):
+        new.start_at(old.current_phase())
+    if isinstance(old, oversampler) and old.num_taps == new.num_taps:
+        new.zi = old.zi
+    if isinstance(old, fractional_delay) and old.history_len == new.history_len:
+        new.history = old.history
+    if isinstance(old, control_decimator) and old.factor == new.factor:
+        new.partial = old.partial
+    if isinstance(old, control_interpolator) and old.factor == new.factor:
+        new.tail, new.position = old.tail, old.position
+
+    for attr in ('detector', 'smoother', 'logic', 'lookahead', 'shaper', 'processor', 'lfo', 'line', 'control',
+                 'decimator', 'interpolator'):
+        if getattr(old, attr, None) is not None and getattr(new, attr, None) is not None:
+            _carry_state(getattr(old, attr), getattr(new, attr))
+
+
+class realtime_engine:
+    def __init__(self, device, chain=None, budget=1.0, max_stats=100000):
+        self.device = device
+        self.chain = block_chain() if chain is None else chain
+        self.specs = [None] * len(self.chain.processors)
+        self.budget = budget
+        self.updates = collections.deque()
+
+        # preallocated so the callback only writes into them
+        self.durations = np.zeros(max_stats)
+        self.starts = np.zeros(max_stats)
+        self.reset_stats()
+
+    def apply(self, effect_fn, name=None, **kwargs):
+        self.chain.apply(effect_fn, name, **kwargs)
+        self.specs.append((effect_fn, kwargs))
+        return self
+
+    def _stage(self, stage):
+        return self.chain.names.index(stage) if isinstance(stage, str) else stage
+
+    def set_params(self, stage, **params):
+        # called from the control thread: the new processor is built here, the audio thread
+        # only pops it from the deque (append / popleft are atomic) and swaps a reference
+        index = self._stage(stage)
+        if self.specs[index] is None:
+            raise ValueError(f"stage {stage} was not added with apply(), its parameters are unknown")
+
+        effect_fn, kwargs = self.specs[index]
+        kwargs = dict(kwargs, **params)
+        self.specs[index] = (effect_fn, kwargs)
+        self.updates.append((index, block_for(effect_fn, **kwargs)))
+
+    def _apply_updates(self):
+        while self.updates:
+            index, processor = self.updates.popleft()
+            _carry_state(self.chain.processors[index], processor)
+            self.chain.processors[index] = processor
+
+    def callback(self, indata, outdata, status=None):
+        start = time.perf_counter()
+
+        if self.updates:
+            self._apply_updates()
+
+        outdata[...] = self.chain.process_block(indata)
+
+        duration = time.perf_counter() - start
+        slot = self.callbacks % len(self.durations)
+        self.durations[slot] = duration
+        self.starts[slot] = start
+        self.callbacks += 1
+
+        if duration > self.budget * self.device.period:
+            self.misses += 1
+        if status:
+            self.device_xruns += 1
+
+    def start(self, warmup=True):
+        if warmup:
+            # numba compiles and IR caches fill on the first block, not inside the first callback
+            shape = (self.device.block_size,) if self.device.channels == 1 else (self.device.channels, self.device.block_size)
+            self.chain.process_block(np.zeros(shape, dtype=get_dtype()))
+
+        self.chain.reset()
+        self.device.start(self.callback)
+        return self
+
+    def stop(self):
+        self.device.stop()
+        return self
+
+    def run(self, seconds=None):
+        # blocks until the device runs out of input (fake device), is stopped, or for `seconds`
+        self.start()
+        try:
+            self.device.wait(seconds)
+        finally:
+            self.stop()
+        return self
+
+    def reset_stats(self):
+        self.callbacks = 0
+        self.misses = 0
+        self.device_xruns = 0
+        return self
+
+    def stats(self):
+        kept = min(self.callbacks, len(self.durations))
+        if kept == 0:
+            return {'callbacks': 0}
+
+        # the ring holds the most recent callbacks, put them back in time order
+        order = np.roll(np.arange(kept), -(self.callbacks % kept)) if self.callbacks > kept else np.arange(kept)
+        durations = self.durations[order]
+        intervals = np.diff(self.starts[order])
+        period = self.device.period
+        p50, p90, p99 = (float(p) for p in np.percentile(durations, [50, 90, 99]))
+
+        return {
+            'callbacks': self.callbacks,
+            'period_ms': period * 1e3,
+            'misses': self.misses,
+            'miss_rate': self.misses / self.callbacks,
+            'device_xruns': self.device_xruns,
+            'mean_ms': float(np.mean(durations)) * 1e3,
+            'p50_ms': p50 * 1e3,
+            'p90_ms': p90 * 1e3,
+            'p99_ms': p99 * 1e3,
+            'max_ms': float(np.max(durations)) * 1e3,
+            'load': float(np.mean(durations)) / period,
+            'jitter_ms': float(np.std(intervals)) * 1e3 if len(intervals) else 0.0,
+            'max_jitter_ms': float(np.max(np.abs(intervals - period))) * 1e3 if len(intervals) else 0.0,
+        }
+
+    def summary(self):
+        s = self.stats()
+        if not s['callbacks']:
+            return "no callbacks yet"
+
+        return (f"{s['callbacks']} callbacks of {s['period_ms']:.2f} ms, {s['misses']} deadline misses "
+                f"({s['miss_rate']:.2%}), load {s['load']:.1%}\n"
+                f"callback ms: p50 {s['p50_ms']:.3f}  p90 {s['p90_ms']:.3f}  p99 {s['p99_ms']:.3f}  max {s['max_ms']:.3f}\n"
+                f"start jitter: {s['jitter_ms']:.3f} ms std, {s['max_jitter_ms']:.3f} ms max")
@@ -0,0 +1,213 @@
+import functools
+from fractions import Fraction
+
+import numpy as np
+
+from .config import get_dtype, output_buffer
+from .lazy import lazy_module
+
+
+sp_signal = lazy_module('scipy.signal')
+
+
+# zero crossings of the windowed sinc on each side and kaiser beta, per quality
+qualities = {
+    'low': (8, 5.0),
+    'medium': (16, 8.0),
+    'high': (32, 10.0),
+}
+
+
+class resample_design:
+    def __init__(self, up, down, quality):
+        if quality not in qualities:
+            raise ValueError(f"quality must be one of {list(qualities)}, got '{quality}'")
+
+        half_len, beta = qualities[quality]
+        rate = max(up, down)
+        taps = sp_signal.firwin(2 * half_len * rate + 1, 1.0 / rate, window=('kaiser', beta)) * up
+
+        self.up = up
+        self.down = down
+        self.quality = quality
+        self.taps = taps
+        self.phase_len = -(-len(taps) // up)
+        # one row per phase, reversed so a row multiplies the input window oldest sample first
+        padded = np.zeros(self.phase_len * up)
+        padded[:len(taps)] = taps
+        self.phases = padded.reshape(self.phase_len, up).T[:, ::-1].copy()
+        self.phases.flags.writeable = False
+        # the filter is centered on the output, outputs start (taps - 1) / 2 upsampled samples in
+        self.shift = (len(taps) - 1) // 2
+        self._cast = {}
+
+    def coefficients(self, dtype):
+        # the phases in the processing dtype, cast once per design
+        dtype = np.dtype(dtype)
+        if dtype not in self._cast:
+            cast = self.phases.astype(dtype)
+            cast.flags.writeable = False
+            self._cast[dtype] = cast
+
+        return self._cast[dtype]
+
+
+@functools.lru_cache(maxsize=64)
+def _design(up, down, quality):
+    return resample_design(up, down, quality)
+
+
+def design(fs_in, fs_out, quality='medium'):
+    # cached per reduced ratio, 44.1 -> 48 kHz and 88.2 -> 96 kHz share one design
+    ratio = Fraction(int(fs_out), int(fs_in))
+    return _design(ratio.numerator, ratio.denominator, quality)
+
+
+def output_length(num_samples, fs_in, fs_out):
+    ratio = Fraction(int(fs_out), int(fs_in))
+    return -(-num_samples * ratio.numerator // ratio.denominator)
+
+
+class resampler:
+    def __init__(self, fs_in, fs_out, quality='medium'):
+        self.fs_in = fs_in
+        self.fs_out = fs_out
+        self.design = design(fs_in, fs_out, quality)
+        # input samples an output waits for beyond the one it is centered on
+        self.latency = self.design.shift / self.design.up
+        self.reset()
+
+    def process_block(self, frames):
+        # returns every output whose input has arrived, so the output length varies from block to block
+        d = self.design
+        shape = np.shape(frames)
+        if self.history is None or self.history.shape[:-1] != shape[:-1]:
+            self.history = np.zeros(shape[:-1] + (d.phase_len - 1,), dtype=get_dtype())
+
+        window = np.concatenate([self.history, np.asarray(frames, dtype=get_dtype())], axis=-1)
+        received = self.received + shape[-1]
+
+        # output m sits at upsampled position m * down + shift, input sample position // up
+        last = (received * d.up - 1 - d.shift) // d.down
+        positions = np.arange(self.produced, max(last + 1, self.produced), dtype=np.int64) * d.down + d.shift
+        inputs = positions // d.up - self.received
+
+        # each output is the dot product of its input window with the filter phase it falls on
+        windows = np.lib.stride_tricks.sliding_window_view(window, d.phase_len, axis=-1)
+        coefficients = d.coefficients(get_dtype())
+        phases = positions % d.up
+
+        if len(positions) < 8 * d.up:
+            out = np.einsum('...mk,mk->...m', windows[..., inputs, :], coefficients[phases])
+        else:
+            # outputs up apart share a phase and sit down inputs apart, so each phase is one strided
+            # product without gathering windows; the sums are the same as above, bit for bit
+            out = np.empty(shape[:-1] + (len(positions),), dtype=get_dtype())
+            for r in range(d.up):
+                rows = out[..., r::d.up]
+                strided = windows[..., inputs[r]::d.down, :][..., :rows.shape[-1], :]
+                rows[...] = np.einsum('...mk,k->...m', strided, coefficients[phases[r]])
+
+        self.history = window[..., window.shape[-1] - (d.phase_len - 1):].copy()
+        self.received = received
+        self.produced += len(positions)
+        return out
+
+    def flush(self):
+        # the outputs still waiting for input past the end, fed with zeros
+        channels = () if self.history is None else self.history.shape[:-1]
+        return self.process_block(np.zeros(channels + (int(np.ceil(self.latency)) + 1,), dtype=get_dtype()))
+
+    def reset(self):
+        # allocated on the first block, once the channel layout is known
+        self.history = None
+        self.received = 0
+        self.produced = 0
+        return self
+
+
+def resample(signal, fs_in, fs_out, quality='medium', block_size=65536, out=None):
+    # offline: aligned with the input, ceil(n * fs_out / fs_in) samples long
+    num_samples = np.shape(signal)[-1]
+    length = output_length(num_samples, fs_in, fs_out)
+    out = output_buffer(np.shape(signal)[:-1] + (length,), out)
+    if fs_in == fs_out:
+        out[...] = signal
+        return out
+
+    converter = resampler(fs_in, fs_out, quality)
+    written = 0
+    for start in range(0, num_samples, block_size):
+        written = _write(out, converter.process_block(signal[..., start:start + block_size]), written)
+
+    _write(out, converter.flush(), written)
+    return out
+
+
+def _write(out, output, written):
+    count = min(output.shape[-1], out.shape[-1] - written)
+    out[..., written:written + count] = output[..., :count]
+    return written + count
+
+
+class control_decimator:
+    def __init__(self, factor):
+        self.factor = factor
+        self.reset()
+
+    def process_block(self, frames):
+        # peak of |frames| over each group of `factor` samples, groups may straddle blocks
+        levels = np.abs(frames)
+        if self.partial is not None and self.partial.shape[-1]:
+            levels = np.concatenate([self.partial, levels], axis=-1)
+
+        groups = levels.shape[-1] // self.factor
+        whole = levels[..., :groups * self.factor].reshape(levels.shape[:-1] + (groups, self.factor))
+        self.partial = levels[..., groups * self.factor:].copy()
+
+        # one pass per position in the group, a reduction over the short last axis is far slower
+        peaks = whole[..., 0].copy()
+        for k in range(1, self.factor):
+            np.maximum(peaks, whole[..., k], out=peaks)
+
+        return peaks
+
+    def reset(self):
+        self.partial = None
+        return self
+
+
+class control_interpolator:
+    def __init__(self, factor, initial=0.0):
+        self.factor = factor
+        self.initial = initial
+        self.reset()
+
+    def process_block(self, control, num_samples, out=None):
+        # back to full rate: a sample in group g lies between the controls of groups g - 2 and g - 1,
+        # the last complete ones, so the control lags by one group and never waits for input
+        shape = np.shape(control)[:-1] + (num_samples,)
+        if self.tail is None or self.tail.shape[:-1] != shape[:-1]:
+            self.tail = np.full(shape[:-1] + (2,), self.initial, dtype=get_dtype())
+
+        values = np.concatenate([self.tail, control], axis=-1)
+        first = self.position // self.factor
+
+        # values[k] is reached at the start of group first + k, relative to this block
+        grid = (first + np.arange(values.shape[-1], dtype=np.float64)) * self.factor - self.position
+        position = np.arange(num_samples, dtype=np.float64)
+
+        out = output_buffer(shape, out)
+        rows = values.reshape(-1, values.shape[-1])
+        for row, channel in zip(rows, out.reshape(-1, num_samples)):
+            channel[...] = np.interp(position, grid, row)
+
+        self.position += num_samples
+        used = self.position // self.factor - first
+        self.tail = values[..., used:used + 2].copy()
+        return out
+
+    def reset(self):
+        self.tail = None
+        self.position = 0
+        return self
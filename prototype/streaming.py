@@ -0,0 +1,95 @@
+import numpy as np
+
+from .config import output_buffer
+from .effects import fuzz, overdrive, delay, cabinet, fuzz_block, overdrive_block, delay_line, cabinet_block
+from .filters import biquad, lowpass, highpass, bandpass, biquad_block, lowpass_block, highpass_block, bandpass_block
+from .dynamics import compressor, noise_gate, compute_envelope, compressor_block, noise_gate_block, envelope_follower
+from .modulation import (tremolo, vibrato, chorus, flanger, tremolo_block, vibrato_block, chorus_block,
+                         flanger_block)
+from .waveshaping import waveshaper, waveshaper_block
+
+
+block_processors = {
+    fuzz: fuzz_block,
+    overdrive: overdrive_block,
+    delay: delay_line,
+    cabinet: cabinet_block,
+    biquad: biquad_block,
+    lowpass: lowpass_block,
+    highpass: highpass_block,
+    bandpass: bandpass_block,
+    compressor: compressor_block,
+    noise_gate: noise_gate_block,
+    compute_envelope: envelope_follower,
+    tremolo: tremolo_block,
+    vibrato: vibrato_block,
+    chorus: chorus_block,
+    flanger: flanger_block,
+    waveshaper: waveshaper_block,
+}
+
+
+def block_for(effect_fn, **kwargs):
+    if effect_fn not in block_processors:
+        raise ValueError(f"no block processor for {getattr(effect_fn, '__name__', effect_fn)}")
+
+    return block_processors[effect_fn](**kwargs)
+
+
+def array_reader(signal, block_size=1024):
+    for start in range(0, np.shape(signal)[-1], block_size):
+        yield signal[..., start:start + block_size]
+
+
+class block_chain:
+    def __init__(self, processors=None, profiler=None):
+        self.processors = list(processors or [])
+        self.names = [type(processor).__name__ for processor in self.processors]
+        self.profiler = profiler
+
+    def add(self, processor, name=None):
+        self.processors.append(processor)
+        self.names.append(name or type(processor).__name__)
+        return self
+
+    def apply(self, effect_fn, name=None, **kwargs):
+        return self.add(block_for(effect_fn, **kwargs), name or getattr(effect_fn, '__name__', None))
+
+    def process_block(self, frames):
+        if self.profiler is not None:
+            return self._profiled_block(frames)
+
+        for processor in self.processors:
+            frames = processor.process_block(frames)
+
+        return frames
+
+    def _profiled_block(self, frames):
+        for stage, (name, processor) in enumerate(zip(self.names, self.processors)):
+            frames = self.profiler.measure(stage, name, processor.process_block, frames)
+
+        return frames
+
+    def reset(self):
+        for processor in self.processors:
+            processor.reset()
+
+        return self
+
+    def run(self, reader, writer):
+        num_samples = 0
+
+        for frames in reader:
+            output = self.process_block(frames)
+            writer(output)
+            num_samples += np.shape(output)[-1]
+
+        return num_samples
+
+    def process(self, signal, block_size=1024):
+        output = output_buffer(np.shape(signal))
+
+        for start in range(0, np.shape(signal)[-1], block_size):
+            output[..., start:start + block_size] = self.process_block(signal[..., start:start + block_size])
+
+        return output
@@ -0,0 +1,191 @@
+import inspect
+import itertools
+
+import numpy as np
+
+from .config import get_dtype, as_processing, output_buffer
+from .effects import fuzz, overdrive, delay
+from .filters import biquad, lowpass, highpass, bandpass
+from .dynamics import compressor, noise_gate
+from .modulation import tremolo, chorus, flanger
+from .waveshaping import waveshaper
+from .lazy import lazy_module
+from .streaming import block_for
+
+
+sp_signal = lazy_module('scipy.signal')
+
+
+filter_effects = (biquad, lowpass, highpass, bandpass)
+
+# parameters that broadcast across the variant axis, per sample or per channel (one
+# envelope coefficient per row). every other parameter changes the structure of the
+# stage (buffer lengths, antialiasing mode, IRs), variants that differ in one are
+# rendered in separate batches
+batched_params = {
+    fuzz: {'gain': 'sample', 'threshold': 'sample'},
+    overdrive: {'gain': 'sample'},
+    waveshaper: {'gain': 'sample'},
+    delay: {'feedback': 'sample', 'mix': 'sample'},
+    compressor: {'threshold_db': 'sample', 'ratio': 'sample', 'makeup_gain_db': 'sample',
+                 'attack_ms': 'channel', 'release_ms': 'channel'},
+    noise_gate: {'threshold_db': 'sample', 'hysteresis_db': 'sample', 'attack_ms': 'channel', 'release_ms': 'channel'},
+    tremolo: {'depth': 'sample', 'rate_hz': 'sample'},
+    chorus: {'mix': 'sample'},
+    flanger: {'feedback': 'sample', 'mix': 'sample'},
+}
+
+
+def parameter_grid(**axes):
+    # parameter_grid(**{'fuzz.gain': [5, 10], 'lowpass.cutoff_freq': [1e3, 2e3]}) -> 4 variants
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def _stage_name(effect_fn, name):
+    return name or getattr(effect_fn, '__name__', repr(effect_fn))
+
+
+def _defaults(effect_fn):
+    return {name: p.default for name, p in inspect.signature(effect_fn).parameters.items()
+            if p.default is not inspect.Parameter.empty}
+
+
+def _structure_key(value):
+    if isinstance(value, np.ndarray):
+        return ('array', value.shape, value.tobytes())
+    if isinstance(value, list):
+        return tuple(_structure_key(v) for v in value)
+    return value
+
+
+class sweep:
+    def __init__(self, chain, variants, max_bytes=256 * 1024 * 1024):
+        self.chain = [stage if len(stage) == 3 else (stage[0], None, stage[1]) for stage in chain]
+        self.variants = list(variants)
+        self.max_bytes = max_bytes
+
+        names = [_stage_name(effect_fn, name) for effect_fn, name, _ in self.chain]
+        lookup = {str(i): i for i in range(len(names))}
+        lookup.update({name: i for i, name in enumerate(names) if names.count(name) == 1})
+
+        # per variant, the full kwargs of every stage
+        self.kwargs = []
+        for variant in self.variants:
+            stages = [dict(kwargs) for _, _, kwargs in self.chain]
+
+            for key, value in variant.items():
+                stage, _, param = key.rpartition('.')
+                if stage not in lookup:
+                    raise ValueError(f"'{key}': no unique stage '{stage}', expected one of {sorted(lookup)}")
+
+                effect_fn = self.chain[lookup[stage]][0]
+                if param not in inspect.signature(effect_fn).parameters:
+                    raise ValueError(f"'{key}': {_stage_name(effect_fn, None)} has no parameter '{param}'")
+
+                stages[lookup[stage]][param] = value
+
+            self.kwargs.append(stages)
+
+    def __len__(self):
+        return len(self.variants)
+
+    def _groups(self):
+        # variants that only differ in batched parameters share one batch
+        groups = {}
+
+        for index, stages in enumerate(self.kwargs):
+            key = []
+            for (effect_fn, _, _), kwargs in zip(self.chain, stages):
+                if effect_fn in filter_effects:
+                    continue
+
+                batched = batched_params.get(effect_fn, {})
+                key.append(tuple(sorted((param, _structure_key(value)) for param, value in kwargs.items()
+                                        if param not in batched)))
+
+            groups.setdefault(tuple(key), []).append(index)
+
+        return list(groups.values())
+
+    def chunk_size(self, signal):
+        # input, output and scratch copies of every variant in the batch
+        per_variant = 4 * np.size(signal) * get_dtype().itemsize
+        return max(1, int(self.max_bytes // per_variant))
+
+    def render(self, signal):
+        # lazily yields (variant indices, outputs) with outputs of shape (len(indices),) + signal.shape
+        signal = as_processing(signal)
+        size = self.chunk_size(signal)
+
+        for group in self._groups():
+            for start in range(0, len(group), size):
+                indices = group[start:start + size]
+                yield indices, self.render_batch(signal, indices)
+
+    def render_batch(self, signal, indices):
+        # mono gets a channel axis, (variants, 1, samples), so a linked detector never reduces over
+        # the variant axis
+        mono = np.ndim(signal) == 1
+        frames = as_processing(signal)[None] if mono else as_processing(signal)
+        batch = np.broadcast_to(frames, (len(indices),) + np.shape(frames))
+
+        for stage, (effect_fn, _, _) in enumerate(self.chain):
+            kwargs = [self.kwargs[i][stage] for i in indices]
+
+            if effect_fn in filter_effects:
+                batch = _filter_batch(effect_fn, kwargs, batch)
+            else:
+                batch = effect_fn(batch, **_batch_kwargs(effect_fn, kwargs, batch.ndim))
+
+        return batch[:, 0] if mono else batch
+
+    def render_all(self, signal):
+        outputs = [None] * len(self)
+
+        for indices, batch in self.render(signal):
+            for i, output in zip(indices, batch):
+                outputs[i] = output
+
+        return outputs
+
+
+def _batch_kwargs(effect_fn, kwargs, ndim):
+    defaults = _defaults(effect_fn)
+    merged = dict(kwargs[0])
+
+    for param, kind in batched_params.get(effect_fn, {}).items():
+        values = [stage.get(param, defaults.get(param)) for stage in kwargs]
+        if all(np.array_equal(value, values[0]) for value in values):
+            continue
+
+        # the variant axis leads, each value broadcasts over samples (and channels) as it would on its
+        # own. per-channel arrays keep their shape, scalars are padded out to the trailing axes
+        trailing = ndim - 1 if kind == 'sample' else ndim - 2
+        values = [np.asarray(value, dtype=float) for value in values]
+        values = [value.reshape((1,) * (trailing - value.ndim) + value.shape) for value in values]
+        merged[param] = np.stack(np.broadcast_arrays(*values))
+
+    return merged
+
+
+def _filter_batch(effect_fn, kwargs, batch):
+    # each distinct parameter set is designed once
+    designs = {}
+    keys = []
+    for stage in kwargs:
+        key = tuple(sorted((param, _structure_key(value)) for param, value in stage.items()))
+        if key not in designs:
+            designs[key] = block_for(effect_fn, **stage).sos.astype(get_dtype())
+        keys.append(key)
+
+    out = output_buffer(batch.shape)
+    if len(designs) == 1:
+        out[...] = sp_signal.sosfilt(designs[keys[0]], batch, axis=-1)
+        return out
+
+    # one coefficient set per variant, sosfilt runs each row in compiled code
+    for row, key in enumerate(keys):
+        out[row] = sp_signal.sosfilt(designs[key], batch[row], axis=-1)
+
+    return out
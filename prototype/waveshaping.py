@@ -0,0 +1,211 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from .config import get_dtype, output_buffer
+
+
+def _interpolate(signal, values, slopes, scale, offset, last, out):
+    for i in range(signal.size):
+        position = min(max(signal[i] * scale + offset, 0.0), last)
+        index = int(position)
+        out[i] = values[index] + (position - index) * slopes[index]
+
+
+# numba is optional and slow to import, the kernel is compiled on the first table lookup
+_interpolate_jit = None
+
+
+def _kernel():
+    global _interpolate_jit
+
+    if _interpolate_jit is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _interpolate_jit = False
+        else:
+            _interpolate_jit = njit(cache=True, nogil=True)(_interpolate)
+
+    return _interpolate_jit
+
+
+def _soft_cubic(x):
+    c = np.clip(x, -1.0, 1.0)
+    return 1.5 * (c - c * c * c / 3.0)
+
+
+def _tube(x, bias=0.3):
+    # asymmetric: the negative half clips later than the positive one, no offset at 0
+    return np.tanh(x + bias) - np.tanh(bias)
+
+
+# name -> (transfer function, input range); the ranges reach far enough into the flat
+# part of each curve that clamping outside them stays below 1e-6
+curves = {
+    'tanh': (np.tanh, (-8.0, 8.0)),
+    'clip': (lambda x: np.clip(x, -1.0, 1.0), (-2.0, 2.0)),
+    'cubic': (_soft_cubic, (-2.0, 2.0)),
+    'tube': (_tube, (-8.0, 8.0)),
+}
+
+
+def load_curve(filename):
+    # measured transfer curve, two columns (input, output): .npy of shape (n, 2) or text/csv
+    if filename.endswith('.npy'):
+        data = np.load(filename)
+    else:
+        data = np.loadtxt(filename, delimiter=',' if filename.endswith('.csv') else None)
+
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim != 2 or data.shape[1] != 2:
+        raise ValueError(f"{filename}: expected two columns (input, output), got shape {data.shape}")
+
+    order = np.argsort(data[:, 0])
+    x, y = data[order, 0], data[order, 1]
+    return (lambda signal: np.interp(signal, x, y)), (float(x[0]), float(x[-1]))
+
+
+class lookup_table:
+    def __init__(self, fn, x_range=(-8.0, 8.0), max_error=1e-4, min_size=65, max_size=2 ** 20, dtype=None):
+        self.fn = fn
+        self.lo, self.hi = float(x_range[0]), float(x_range[1])
+        self.max_error = max_error
+        self.dtype = np.dtype(dtype or get_dtype())
+
+        if not self.hi > self.lo:
+            raise ValueError(f"x_range must be increasing, got {x_range}")
+
+        # double the resolution until linear interpolation is within max_error between every pair of points
+        size = min_size
+        while True:
+            grid = np.linspace(self.lo, self.hi, size)
+            values = np.asarray(fn(grid), dtype=np.float64)
+            self.error = _interpolation_error(fn, grid, values)
+
+            if self.error <= max_error:
+                break
+            if 2 * size - 1 > max_size:
+                raise ValueError(f"curve needs more than {max_size} points for max_error={max_error} "
+                                 f"(reached {self.error:.3g}), raise max_error or narrow x_range")
+            size = 2 * size - 1
+
+        # the last point gets a flat segment, so the clamped upper end needs no special index
+        self.size = size
+        self.values = values.astype(self.dtype)
+        self.slopes = np.append(np.diff(values), 0.0).astype(self.dtype)
+        self.scale = self.dtype.type((size - 1) / (self.hi - self.lo))
+        self.offset = self.dtype.type(-self.lo * (size - 1) / (self.hi - self.lo))
+        self.nbytes = self.values.nbytes + self.slopes.nbytes
+
+    def apply(self, signal, out=None):
+        # one pass: position on the grid, gather the segment, interpolate. inputs outside
+        # x_range are clamped to its ends, signal and out may be the same array
+        out = output_buffer(np.shape(signal), out)
+
+        kernel = _kernel()
+        if kernel and np.ndim(signal) and out.flags.c_contiguous:
+            kernel(np.ascontiguousarray(signal, dtype=self.dtype).reshape(-1), self.values, self.slopes,
+                   self.scale, self.offset, self.size - 1, out.reshape(-1))
+            return out
+
+        position = np.multiply(signal, self.scale, dtype=self.dtype)
+        position += self.offset
+        np.clip(position, 0, self.size - 1, out=position)
+
+        whole = np.floor(position)
+        index = whole.astype(np.intp)
+        position -= whole
+
+        # indices are in range by construction, 'clip' skips the bounds check
+        np.take(self.values, index, out=out, mode='clip')
+        slope = np.take(self.slopes, index, mode='clip')
+        slope *= position
+        out += slope
+        return out
+
+
+def _interpolation_error(fn, grid, values, points=8):
+    # largest deviation from the curve at `points` positions inside every segment
+    t = np.arange(1, points) / points
+    between = grid[:-1, np.newaxis] + t * (grid[1] - grid[0])
+    exact = np.asarray(fn(between.ravel()), dtype=np.float64).reshape(between.shape)
+    interpolated = values[:-1, np.newaxis] + t * np.diff(values)[:, np.newaxis]
+    return float(np.max(np.abs(exact - interpolated)))
+
+
+class table_cache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, curve='tanh', x_range=None, max_error=1e-4, key=None):
+        # curve: a name from `curves`, a measured curve file, or any vectorized callable.
+        # key defaults to the name, the file and its modification time, or the callable itself
+        if key is None:
+            key = _source_key(curve)
+        key = (key, None if x_range is None else tuple(x_range), max_error, get_dtype().name)
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        fn, default_range = _resolve(curve)
+        table = lookup_table(fn, x_range or default_range, max_error)
+        self._insert(key, table)
+        return table
+
+    def _insert(self, key, table):
+        self.entries[key] = table
+        self.nbytes += table.nbytes
+
+        # evict least recently used tables, but always keep the one just added
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        return self
+
+
+def _source_key(curve):
+    if isinstance(curve, str) and curve not in curves:
+        return ('file', os.path.abspath(curve), os.path.getmtime(curve))
+    return curve
+
+
+def _resolve(curve):
+    if callable(curve):
+        return curve, (-8.0, 8.0)
+    if curve in curves:
+        return curves[curve]
+    return load_curve(curve)
+
+
+default_tables = table_cache()
+
+
+def waveshaper(signal, curve='tanh', gain=1.0, x_range=None, max_error=1e-4, out=None):
+    return waveshaper_block(curve, gain, x_range, max_error).process_block(signal, out=out)
+
+
+class waveshaper_block:
+    def __init__(self, curve='tanh', gain=1.0, x_range=None, max_error=1e-4, tables=None):
+        self.gain = gain
+        self.table = (default_tables if tables is None else tables).get(curve, x_range, max_error)
+
+    def process_block(self, frames, out=None):
+        out = output_buffer(np.shape(frames), out)
+        np.multiply(frames, self.gain, out=out)
+        return self.table.apply(out, out=out)
+
+    def reset(self):
+        return self
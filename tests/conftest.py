@@ -0,0 +1,72 @@
+import inspect
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from prototype.config import precision  # noqa: E402
+
+
+# chains in the tests are written without fs, the fixtures fill it in for every effect that takes one
+test_fs = 48000
+
+
+def with_fs(chain, fs=test_fs):
+    # (effect_fn, kwargs) or (effect_fn, name, kwargs) specs, fs added where the effect has the parameter
+    built = []
+    for stage in chain:
+        effect_fn, kwargs = stage[0], dict(stage[-1])
+        if 'fs' in inspect.signature(effect_fn).parameters:
+            kwargs.setdefault('fs', fs)
+        built.append(stage[:-1] + (kwargs,))
+
+    return built
+
+
+def run_chain(signal, chain):
+    # the reference every fused, batched, chunked or threaded path is compared with: the offline
+    # functions, one stage after the other
+    for stage in chain:
+        signal = stage[0](signal, **stage[-1])
+
+    return signal
+
+
+def bursts(channels=2, seconds=1.0, seed=0, fs=test_fs):
+    # bursts of tone over noise, so dynamics open, close and release and filters ring out between them.
+    # 1-D for one channel
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(fs * seconds)) / fs
+    envelope = (np.sin(2 * np.pi * 1.3 * t) > 0.2) * 0.8 + 0.01
+    tone = np.sin(2 * np.pi * 220.0 * t) * envelope
+    signal = tone + 0.01 * rng.standard_normal((channels, len(t)))
+    return signal[0] if channels == 1 else signal
+
+
+@pytest.fixture
+def fs():
+    return test_fs
+
+
+@pytest.fixture
+def chain_of():
+    return with_fs
+
+
+@pytest.fixture
+def sequential():
+    return run_chain
+
+
+@pytest.fixture
+def signal_of():
+    return bursts
+
+
+@pytest.fixture
+def float64():
+    with precision('float64'):
+        yield
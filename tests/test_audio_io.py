@@ -0,0 +1,88 @@
+import struct
+
+import numpy as np
+import pytest
+
+from prototype import audio_io, load_audio, save_audio
+from prototype.audio_io import wav_reader
+
+
+# quantization step of each format, a round trip stays within it or the loaded dtype's resolution
+steps = {'int16': 2.0 ** -15, 'int24': 2.0 ** -23, 'int32': 2.0 ** -31, 'float32': 2.0 ** -24}
+steps_bits = {'int16': 16, 'int24': 24, 'int32': 32, 'float32': 32}
+
+
+@pytest.mark.parametrize('sample_format', list(steps))
+@pytest.mark.parametrize('channels', [1, 2, 3])
+def test_round_trip(tmp_path, sample_format, channels):
+    rng = np.random.default_rng(0)
+    signal = rng.uniform(-0.9, 0.9, (channels, 4801))
+    signal = signal[0] if channels == 1 else signal
+    path = str(tmp_path / 'round_trip.wav')
+
+    save_audio(path, signal, 48000, sample_format=sample_format, block_size=1000)
+    fs, loaded = load_audio(path)
+
+    assert fs == 48000
+    assert loaded.shape == signal.shape
+    assert np.max(np.abs(loaded - signal)) <= max(2 * steps[sample_format], np.finfo(loaded.dtype).eps)
+
+
+@pytest.mark.parametrize('sample_format, channels, extensible', [
+    ('int16', 2, False), ('int16', 4, True), ('int24', 1, True), ('int32', 2, True), ('float32', 2, True),
+])
+def test_fmt_chunk(tmp_path, sample_format, channels, extensible):
+    path = str(tmp_path / 'fmt.wav')
+    save_audio(path, np.zeros((channels, 10)), 48000, sample_format=sample_format)
+
+    reader = wav_reader(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    fmt = data.index(b'fmt ')
+    format_tag = struct.unpack('<H', data[fmt + 8:fmt + 10])[0]
+
+    assert (format_tag == audio_io.WAVE_FORMAT_EXTENSIBLE) == extensible
+    assert (reader.channels, reader.bits, reader.num_frames) == (channels, steps_bits[sample_format], 10)
+    assert reader.format_tag == audio_io.sample_formats[sample_format][0]
+
+
+def test_other_readers_accept_the_header(tmp_path):
+    wavfile = pytest.importorskip('scipy.io.wavfile')
+    signal = np.random.default_rng(0).uniform(-0.9, 0.9, (4, 1000))
+    path = str(tmp_path / 'scipy.wav')
+    save_audio(path, signal, 48000, sample_format='int24')
+
+    fs, data = wavfile.read(path)
+    assert fs == 48000
+    np.testing.assert_allclose(data.T / 2.0 ** 31, signal, atol=2 * steps['int24'])
+
+
+@pytest.mark.parametrize('sample_format', ['int24', 'float32'])
+def test_past_the_riff_limit_writes_rf64(tmp_path, monkeypatch, sample_format):
+    # the limit is lowered so a small file takes the path of one past 4 GiB
+    monkeypatch.setattr(audio_io, 'riff_limit', 1000)
+    signal = np.random.default_rng(0).uniform(-0.9, 0.9, (2, 4801))
+    path = str(tmp_path / 'large.wav')
+
+    save_audio(path, signal, 48000, sample_format=sample_format, block_size=1000)
+
+    with open(path, 'rb') as f:
+        assert f.read(4) == b'RF64'
+    fs, loaded = load_audio(path)
+    assert loaded.shape == signal.shape
+    assert np.max(np.abs(loaded - signal)) <= max(2 * steps[sample_format], np.finfo(loaded.dtype).eps)
+
+
+def test_a_failed_close_still_closes_the_file(tmp_path, monkeypatch):
+    writer = audio_io.wav_writer(str(tmp_path / 'fail.wav'), 48000)
+    writer.write(np.zeros(10))
+    handle = writer.file
+
+    def fail():
+        raise struct.error('header')
+
+    monkeypatch.setattr(writer, '_write_header', fail)
+    with pytest.raises(struct.error):
+        writer.close()
+
+    assert handle.closed and writer.file is None
@@ -0,0 +1,100 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from prototype import save_audio, load_audio
+from prototype import cli
+
+
+@pytest.fixture
+def preset_path(tmp_path):
+    path = tmp_path / 'preset.json'
+    path.write_text(json.dumps({'chain': [{'effect': 'fuzz', 'gain': 4.0}]}))
+    return str(path)
+
+
+@pytest.fixture
+def preset(preset_path):
+    return cli.load_preset(preset_path)
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = str(tmp_path / 'in.wav')
+    save_audio(path, 0.5 * np.sin(np.arange(4800) / 10.0), 48000)
+    return path
+
+
+def test_render_replaces_output(tmp_path, preset, input_path):
+    out_path = str(tmp_path / 'out.wav')
+    _, seconds, _, error = cli.render_file(preset, input_path, out_path)
+
+    assert error is None and seconds == pytest.approx(0.1)
+    assert load_audio(out_path)[1].shape == (4800,)
+    assert sorted(os.listdir(tmp_path)) == ['in.wav', 'out.wav', 'preset.json']
+
+
+def test_interrupted_render_leaves_no_output(tmp_path, preset, input_path, monkeypatch):
+    def interrupted(filename, *args, **kwargs):
+        with open(filename, 'wb') as f:
+            f.write(b'RIFF')
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(cli, 'save_audio', interrupted)
+    out_path = str(tmp_path / 'out.wav')
+    with pytest.raises(KeyboardInterrupt):
+        cli.render_file(preset, input_path, out_path)
+
+    assert not os.path.exists(out_path)
+    assert sorted(os.listdir(tmp_path)) == ['in.wav', 'preset.json']
+
+
+def _write_inputs(root, *names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        save_audio(str(path), 0.5 * np.sin(np.arange(480) / 10.0), 48000)
+
+
+def test_outputs_keep_their_path_below_the_input_root(tmp_path, preset_path):
+    _write_inputs(tmp_path / 'takes', 'a/take.wav', 'b/take.wav', 'c.wav')
+    out_dir = tmp_path / 'out'
+
+    assert cli.main(['render', preset_path, str(tmp_path / 'takes' / '**' / '*.wav'), '-o', str(out_dir), '-j', '1']) == 0
+    rendered = sorted(os.path.relpath(os.path.join(root, name), out_dir)
+                      for root, _, names in os.walk(out_dir) for name in names)
+    assert rendered == [os.path.join('a', 'take.wav'), os.path.join('b', 'take.wav'), 'c.wav']
+
+
+def test_clashing_outputs_are_refused(tmp_path, preset_path, capsys):
+    _write_inputs(tmp_path, 'a/take.wav', 'b/take.wav')
+    out_dir = tmp_path / 'out'
+
+    assert cli.main(['render', preset_path, str(tmp_path / 'a'), str(tmp_path / 'b'), '-o', str(out_dir)]) == 2
+    assert 'same output' in capsys.readouterr().err
+    assert not out_dir.exists() or not os.listdir(out_dir)
+
+
+def test_output_onto_its_input_is_refused(tmp_path, preset_path, capsys):
+    _write_inputs(tmp_path, 'in/take.wav')
+    before = (tmp_path / 'in' / 'take.wav').read_bytes()
+
+    assert cli.main(['render', preset_path, str(tmp_path / 'in'), '-o', str(tmp_path / 'in'), '-f']) == 2
+    assert 'overwrite the input' in capsys.readouterr().err
+    assert (tmp_path / 'in' / 'take.wav').read_bytes() == before
+
+
+def test_no_matching_inputs_fails(tmp_path, preset_path, capsys):
+    assert cli.main(['render', preset_path, str(tmp_path / 'missing' / '*.wav'), '-o', str(tmp_path / 'out')]) == 2
+    assert 'no input files match' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('chain', [['fuzz'], [{'effect': 'wah'}], 'fuzz'])
+def test_malformed_presets_are_value_errors(tmp_path, chain):
+    path = tmp_path / 'preset.json'
+    path.write_text(json.dumps({'chain': chain}))
+
+    with pytest.raises(ValueError):
+        cli.load_preset(str(path))
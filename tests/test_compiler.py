@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from prototype import guitar_processor, fuzz, overdrive, waveshaper, cabinet, biquad, lowpass, highpass, bandpass, compressor, delay
+from prototype.compiler import compile_chain, convolution_stage
+
+
+lowpass_cabinet = [(lowpass, dict(cutoff_freq=4000.0)), (cabinet, dict())]
+slow_highpass_cabinets = [(highpass, dict(cutoff_freq=20.0, order=4)), (cabinet, dict()), (cabinet, dict(duration_ms=40))]
+
+
+@pytest.mark.parametrize('chain', [
+    pytest.param([(fuzz, dict(gain=20.0, threshold=0.3)), (overdrive, dict(gain=4.0)),
+                  (waveshaper, dict(curve='tube', gain=2.0))], id='pointwise'),
+    pytest.param([(highpass, dict(cutoff_freq=80.0)), (lowpass, dict(cutoff_freq=4000.0)), (bandpass, dict()),
+                  (biquad, dict(b0=0.5, b1=0.2, b2=0.1, a1=-0.3, a2=0.1))], id='filters'),
+    pytest.param(lowpass_cabinet, id='lowpass+cabinet'),
+    pytest.param([(highpass, dict(cutoff_freq=80.0)), (cabinet, dict())], id='highpass+cabinet'),
+    pytest.param(slow_highpass_cabinets, id='slow highpass+cabinets'),
+    pytest.param([(compressor, dict(threshold_db=-24.0)), (highpass, dict(cutoff_freq=80.0)),
+                  (fuzz, dict(gain=20.0, threshold=0.3)), (overdrive, dict(gain=2.0)),
+                  (lowpass, dict(cutoff_freq=4000.0)), (cabinet, dict()),
+                  (delay, dict(delay_ms=50.0, feedback=0.4, mix=0.3))], id='full'),
+])
+@pytest.mark.parametrize('channels', [1, 2])
+def test_compiled_matches_interpreted(chain, channels, chain_of, sequential, signal_of, float64):
+    chain = chain_of(chain)
+    signal = signal_of(channels)
+
+    reference = sequential(signal, chain)
+    output = compile_chain(chain).run(signal)
+
+    assert output.shape == reference.shape
+    assert np.max(np.abs(output - reference)) <= 1e-6 * np.max(np.abs(reference))
+
+
+def test_long_filter_tails_are_not_folded(chain_of):
+    compiled = compile_chain(chain_of(slow_highpass_cabinets))
+    assert 'too long or too costly' in compiled.report[0]
+    # the two cabinets still share one convolution, the filter keeps its own sosfilt stage
+    assert sum(isinstance(stage, convolution_stage) for stage in compiled.plan) == 1
+    assert len(compiled.plan) == 2
+
+
+def test_short_filter_tails_are_folded(chain_of):
+    compiled = compile_chain(chain_of(lowpass_cabinet))
+    assert len(compiled.plan) == 1 and isinstance(compiled.plan[0], convolution_stage)
+
+
+def test_deferred_processor_only_records(chain_of, signal_of, fs):
+    calls = []
+
+    def counted(signal, gain):
+        calls.append(gain)
+        return signal * gain
+
+    chain = chain_of([(fuzz, dict(gain=20.0, threshold=0.3)), (counted, dict(gain=0.5)), (cabinet, dict())])
+    signal = signal_of(2)
+    eager = guitar_processor(fs, signal, history='none')
+    deferred = guitar_processor(fs, signal, defer=True)
+    for effect_fn, kwargs in chain:
+        eager.apply(effect_fn, **kwargs)
+        deferred.apply(effect_fn, **kwargs)
+
+    # apply only recorded the chain, compile().run is the one pass and get_signal renders on demand
+    assert calls == [0.5] and list(deferred.get_history()) == ['input']
+    np.testing.assert_allclose(deferred.compile().run(signal), eager.get_signal(), atol=1e-6)
+    np.testing.assert_allclose(deferred.get_signal(), eager.get_signal(), atol=1e-6)
+    assert calls == [0.5, 0.5, 0.5]
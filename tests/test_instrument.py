@@ -0,0 +1,68 @@
+import numpy as np
+
+from prototype import guitar_processor, block_chain, fuzz, lowpass, array_reader
+from prototype.instrument import profiler
+
+
+chain = [(lowpass, dict(cutoff_freq=2000.0)), (fuzz, dict(gain=10.0)), (lowpass, dict(cutoff_freq=500.0))]
+
+
+def _report_shape(prof):
+    return [(stage['stage'], stage['name'], stage['calls']) for stage in prof.report()]
+
+
+def test_processor_reports_every_apply(chain_of, fs, signal_of):
+    with profiler(fs, memory=False) as prof:
+        proc = guitar_processor(fs, signal_of(2), history='none', profiler=prof)
+        for effect_fn, kwargs in chain_of(chain):
+            proc.apply(effect_fn, **kwargs)
+        proc.apply(fuzz, 'drive', gain=2.0)
+
+    assert _report_shape(prof) == [(0, 'lowpass', 1), (1, 'fuzz', 1), (2, 'lowpass', 1), (3, 'drive', 1)]
+
+    report = prof.report()
+    assert set(report[0]) == {'stage', 'name', 'calls', 'samples', 'wall_s', 'cpu_s', 'realtime', 'peak_alloc_bytes',
+                              'peak', 'rms'}
+    assert all(stage['samples'] == fs for stage in report)
+    assert report[0]['peak_alloc_bytes'] is None
+
+    events = prof.chrome_trace()['traceEvents']
+    assert [event['name'] for event in events] == ['0: lowpass', '1: fuzz', '2: lowpass', '3: drive']
+    assert [event['args']['stage'] for event in events] == [0, 1, 2, 3]
+
+
+def test_block_chain_accumulates_blocks_per_stage(chain_of, fs, signal_of):
+    prof = profiler(fs, memory=False)
+    blocks = block_chain(profiler=prof)
+    for effect_fn, kwargs in chain_of(chain):
+        blocks.apply(effect_fn, **kwargs)
+
+    blocks.run(array_reader(signal_of(2), 4800), lambda frames: None)
+
+    assert _report_shape(prof) == [(0, 'lowpass', 10), (1, 'fuzz', 10), (2, 'lowpass', 10)]
+    assert len(prof.chrome_trace()['traceEvents']) == 30
+    assert '2 lowpass' in ' '.join(prof.summary().split())
+
+
+def test_memory_tracing_reports_allocations(fs, signal_of):
+    with profiler(fs) as prof:
+        guitar_processor(fs, signal_of(1), history='none', profiler=prof).apply(fuzz, gain=4.0)
+
+    assert prof.report()[0]['peak_alloc_bytes'] > 0
+
+
+def test_without_a_profiler_nothing_is_measured(monkeypatch, chain_of, fs, signal_of):
+    def fail(*args, **kwargs):
+        raise AssertionError('profiler called on the unprofiled path')
+
+    monkeypatch.setattr(profiler, 'measure', fail)
+    monkeypatch.setattr(profiler, 'record', fail)
+    monkeypatch.setattr(block_chain, '_profiled_block', fail)
+
+    proc = guitar_processor(fs, signal_of(2), history='none')
+    blocks = block_chain()
+    for effect_fn, kwargs in chain_of(chain):
+        proc.apply(effect_fn, **kwargs)
+        blocks.apply(effect_fn, **kwargs)
+
+    np.testing.assert_allclose(blocks.process(signal_of(2), 512), proc.get_signal(), atol=1e-5)
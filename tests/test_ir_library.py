@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from prototype import save_audio
+from prototype.ir_library import ir_library
+
+
+def test_edited_file_is_reloaded(tmp_path):
+    path = str(tmp_path / 'cab.wav')
+    save_audio(path, np.hanning(64), 48000)
+
+    library = ir_library()
+    first = library.get(path, 48000)
+    assert library.get(path, 48000) is first
+
+    # replaced with a different IR, stamped a second later so the change shows on coarse clocks
+    save_audio(path, np.hanning(64) * np.linspace(1.0, -1.0, 64), 48000)
+    mtime = os.path.getmtime(path)
+    os.utime(path, (mtime + 1.0, mtime + 1.0))
+
+    second = library.get(path, 48000)
+    assert second is not first
+    assert not np.allclose(second.ir, first.ir)
+    assert (library.hits, library.misses) == (1, 2)
+
+
+def test_saved_store_keeps_file_keys(tmp_path):
+    path = str(tmp_path / 'cab.wav')
+    save_audio(path, np.hanning(64), 48000)
+
+    library = ir_library()
+    library.get(path, 48000)
+    library.save(str(tmp_path / 'store.npz'))
+
+    loaded = ir_library().load(str(tmp_path / 'store.npz'))
+    loaded.get(path, 48000)
+    assert (loaded.hits, loaded.misses) == (1, 0)
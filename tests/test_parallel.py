@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from prototype import compressor, noise_gate, highpass, fuzz, cabinet, tremolo, render_parallel
+
+
+@pytest.mark.parametrize('chain', [
+    pytest.param([(compressor, dict(threshold_db=-24.0, control_rate=16))], id='compressor/control_rate'),
+    pytest.param([(noise_gate, dict(threshold_db=-50.0, control_rate=8)),
+                  (compressor, dict(threshold_db=-24.0, control_rate=12))], id='gate+compressor/control_rates'),
+    pytest.param([(compressor, dict(threshold_db=-24.0, lookahead_ms=2.0, control_rate=16))], id='lookahead'),
+    pytest.param([(highpass, dict(cutoff_freq=80.0)), (fuzz, dict(gain=20.0, threshold=0.3)),
+                  (tremolo, dict(rate_hz=5.0)), (cabinet, dict())], id='chain'),
+])
+@pytest.mark.parametrize('chunk_size', [None, 20011])
+def test_seams_within_tolerance(chain, chunk_size, chain_of, sequential, signal_of, float64):
+    chain = chain_of(chain)
+    signal = signal_of(seconds=3.0)
+    tolerance = 1e-5
+
+    reference = sequential(signal, chain)
+    output = render_parallel(signal, chain, workers=2, chunk_size=chunk_size, tolerance=tolerance)
+
+    assert np.max(np.abs(output - reference)) <= tolerance
@@ -0,0 +1,121 @@
+import threading
+
+import numpy as np
+import pytest
+
+from prototype import compressor, noise_gate, highpass, fuzz, tremolo, cabinet, delay, block_chain, pipelined_chain
+from prototype.pipeline import partition_stages
+from prototype.streaming import array_reader
+
+
+stateful_chain = [
+    (noise_gate, dict(threshold_db=-50.0)),
+    (compressor, dict(threshold_db=-24.0, control_rate=16)),
+    (highpass, dict(cutoff_freq=80.0)),
+    (fuzz, dict(gain=20.0, threshold=0.3)),
+    (tremolo, dict(rate_hz=5.0)),
+    (cabinet, dict()),
+    (delay, dict(delay_ms=50.0, feedback=0.4, mix=0.3)),
+]
+
+
+def blocks_of(chain):
+    built = block_chain()
+    for effect_fn, kwargs in chain:
+        built.apply(effect_fn, **kwargs)
+    return built
+
+
+class failing_stage:
+    # passes blocks through and raises on the n-th one
+    def __init__(self, after):
+        self.after = after
+        self.blocks = 0
+
+    def process_block(self, frames, out=None):
+        self.blocks += 1
+        if self.blocks > self.after:
+            raise ValueError('stage failed')
+        return frames
+
+    def reset(self):
+        self.blocks = 0
+        return self
+
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('pipeline-')]
+
+
+@pytest.mark.parametrize('threads', [1, 2, 3, None])
+@pytest.mark.parametrize('block_size', [64, 1000, 4096])
+@pytest.mark.parametrize('channels', [1, 2])
+def test_matches_block_chain(threads, block_size, channels, chain_of, signal_of):
+    chain = chain_of(stateful_chain)
+    signal = signal_of(channels, seconds=0.5)
+
+    reference = blocks_of(chain).process(signal, block_size)
+    # a queue of one block keeps every thread waiting on its neighbours, the tightest handoffs
+    output = pipelined_chain(chain, threads=threads, queue_size=1).process(signal, block_size)
+
+    assert np.array_equal(output, reference)
+
+
+def test_runs_again_after_reset(chain_of, signal_of):
+    chain = chain_of(stateful_chain)
+    signal = signal_of(2, seconds=0.25)
+    pipeline = pipelined_chain(chain, threads=3)
+
+    first = pipeline.process(signal, 1000)
+    second = pipeline.reset().process(signal, 1000)
+
+    assert np.array_equal(first, second)
+
+
+@pytest.mark.parametrize('threads', [1, 2, None])
+@pytest.mark.parametrize('position', [0, 2], ids=['first', 'middle'])
+def test_stage_error_is_raised(threads, position, chain_of, signal_of):
+    chain = blocks_of(chain_of([(fuzz, dict(gain=20.0)), (highpass, dict(cutoff_freq=80.0))]))
+    chain.processors.insert(position, failing_stage(after=5))
+    chain.names.insert(position, 'failing')
+    pipeline = pipelined_chain(chain, threads=threads, queue_size=1)
+
+    with pytest.raises(ValueError, match='stage failed'):
+        pipeline.process(signal_of(2), 256)
+
+    assert not pipeline_threads()
+
+
+def test_reader_error_is_raised(chain_of, signal_of):
+    def reader():
+        yield from array_reader(signal_of(2), 256)
+        raise OSError('read failed')
+
+    pipeline = pipelined_chain(chain_of([(fuzz, dict(gain=20.0)), (highpass, dict(cutoff_freq=80.0))]))
+
+    with pytest.raises(OSError, match='read failed'):
+        pipeline.run(reader(), lambda frames: None)
+
+    assert not pipeline_threads()
+
+
+def test_writer_error_is_raised(chain_of, signal_of):
+    def writer(frames):
+        raise OSError('disk full')
+
+    pipeline = pipelined_chain(chain_of([(fuzz, dict(gain=20.0)), (highpass, dict(cutoff_freq=80.0))]), queue_size=1)
+
+    with pytest.raises(OSError, match='disk full'):
+        pipeline.run(array_reader(signal_of(2), 256), writer)
+
+    assert not pipeline_threads()
+
+
+@pytest.mark.parametrize('costs, threads, groups', [
+    ([1, 1, 1, 1], 2, [[0, 1], [2, 3]]),
+    ([5, 1, 1, 1, 1, 1], 2, [[0], [1, 2, 3, 4, 5]]),
+    ([1, 1, 8, 1], 3, [[0, 1], [2], [3]]),
+    ([1, 2, 3], 5, [[0], [1], [2]]),
+])
+def test_partition_stages(costs, threads, groups):
+    assert partition_stages(costs, threads) == groups
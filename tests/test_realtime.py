@@ -0,0 +1,170 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from prototype import (block_chain, fuzz, lowpass, compressor, noise_gate, delay, chorus, flanger, tremolo,
+                       overdrive)
+from prototype import realtime
+from prototype.realtime import fake_device, realtime_engine
+
+
+block_size = 256
+
+chain = [
+    (noise_gate, dict(threshold_db=-45.0, hysteresis_db=6.0, lookahead_ms=1.0, control_rate=4)),
+    (compressor, dict(threshold_db=-24.0, control_rate=8)),
+    (fuzz, dict(gain=8.0, adaa=1)),
+    (overdrive, dict(gain=2.0, oversample=2)),
+    (lowpass, dict(cutoff_freq=3000.0)),
+    (tremolo, dict(rate_hz=4.0)),
+    (chorus, dict()),
+    (flanger, dict(feedback=0.5)),
+    (delay, dict(delay_ms=30.0, feedback=0.4, mix=0.3)),
+]
+
+
+def _engine(signal, chain, **kwargs):
+    engine = realtime_engine(fake_device(block_size=block_size, source=signal, paced=False), **kwargs)
+    for effect_fn, params in chain:
+        engine.apply(effect_fn, **params)
+    return engine
+
+
+def _reference(signal, chain):
+    blocks = block_chain()
+    for effect_fn, params in chain:
+        blocks.apply(effect_fn, **params)
+    return blocks.process(signal, block_size)
+
+
+def _drive(engine, on_block=None):
+    # the device's callback loop on this thread, so a control change lands on a known block
+    engine.chain.reset()
+    blocks = [0]
+
+    def callback(indata, outdata):
+        if on_block is not None:
+            on_block(engine, blocks[0])
+        engine.callback(indata, outdata)
+        blocks[0] += 1
+
+    engine.device.run(callback)
+    return engine.device.output()
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+def test_engine_matches_block_chain(channels, chain_of, signal_of):
+    signal = signal_of(channels, seconds=0.5).astype(np.float32)
+    engine = _engine(signal, chain_of(chain))
+
+    engine.run()
+
+    np.testing.assert_array_equal(engine.device.output(), _reference(signal, chain_of(chain)))
+    assert engine.stats()['callbacks'] == -(-signal.shape[-1] // block_size)
+
+
+def test_set_params_carries_state(chain_of, signal_of):
+    # the same parameters set mid-stream: every filter memory, echo, detector and LFO phase carries
+    # over, so the output continues as if nothing happened
+    signal = signal_of(2, seconds=0.5).astype(np.float32)
+    engine = _engine(signal, chain_of(chain))
+
+    def change(engine, block):
+        if block == 37:
+            for stage, (effect_fn, params) in enumerate(chain_of(chain)):
+                engine.set_params(stage, **params)
+
+    np.testing.assert_array_equal(_drive(engine, change), _reference(signal, chain_of(chain)))
+
+
+def test_set_params_changes_the_sound_without_a_click(chain_of, signal_of):
+    signal = signal_of(1, seconds=0.5).astype(np.float32)
+    tone = chain_of([(lowpass, dict(cutoff_freq=3000.0))])
+    engine = _engine(signal, tone)
+
+    def change(engine, block):
+        if block == 40:
+            engine.set_params(0, cutoff_freq=1000.0)
+
+    output = _drive(engine, change)
+    reference = _reference(signal, tone)
+    start = 40 * block_size
+
+    np.testing.assert_array_equal(output[:start], reference[:start])
+    assert not np.allclose(output[start:], reference[start:])
+    # the filter memory carries over: no step at the switch bigger than the signal's own steps
+    assert abs(output[start] - output[start - 1]) <= np.max(np.abs(np.diff(reference)))
+
+
+class _slow:
+    # sleeps past the block period on every third block
+    def __init__(self, period):
+        self.period = period
+        self.blocks = 0
+
+    def process_block(self, frames, out=None):
+        if self.blocks % 3 == 0:
+            time.sleep(2 * self.period)
+        self.blocks += 1
+        return frames
+
+    def reset(self):
+        self.blocks = 0
+        return self
+
+
+def test_deadline_misses_are_counted(signal_of):
+    signal = signal_of(1, seconds=0.25).astype(np.float32)
+    device = fake_device(block_size=block_size, source=signal, paced=False)
+    engine = realtime_engine(device, chain=block_chain([_slow(device.period)]), budget=1.0)
+
+    engine.run()
+
+    blocks = -(-signal.shape[-1] // block_size)
+    assert engine.stats()['callbacks'] == blocks
+    # the warm-up block runs before the stats and the chain is reset after it
+    assert engine.misses == len(range(0, blocks, 3))
+    assert engine.stats()['miss_rate'] == pytest.approx(engine.misses / blocks)
+
+
+def test_device_xruns_are_counted(signal_of):
+    engine = _engine(signal_of(1, seconds=0.05).astype(np.float32), [])
+    outdata = np.zeros(block_size, dtype=np.float32)
+
+    engine.callback(np.zeros(block_size, dtype=np.float32), outdata, status=None)
+    engine.callback(np.zeros(block_size, dtype=np.float32), outdata, status='output underflow')
+
+    assert (engine.callbacks, engine.device_xruns) == (2, 1)
+
+
+class _stream:
+    def __init__(self, callback, finished_callback, **kwargs):
+        self.finished_callback = finished_callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.finished_callback()
+
+    def close(self):
+        pass
+
+
+class _sounddevice:
+    Stream = _stream
+
+
+def test_sound_card_runs_until_stopped(monkeypatch):
+    monkeypatch.setattr(realtime, 'sounddevice', _sounddevice)
+    engine = realtime_engine(realtime.sounddevice_device(block_size=block_size))
+
+    stopper = threading.Timer(0.2, engine.stop)
+    start = time.perf_counter()
+    stopper.start()
+    engine.run()
+
+    assert time.perf_counter() - start >= 0.15
+    assert engine.device.stream is None
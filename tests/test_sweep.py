@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from prototype import fuzz, overdrive, lowpass, compressor, noise_gate, delay, tremolo
+from prototype.sweep import sweep, parameter_grid
+
+
+def _separate(signal, chain, variant, chain_of, sequential):
+    # the variant applied to the chain by hand and rendered on its own
+    stages = [(effect_fn, dict(kwargs)) for effect_fn, kwargs in chain]
+    for key, value in variant.items():
+        name, _, param = key.rpartition('.')
+        index = next(i for i, (effect_fn, _) in enumerate(stages) if effect_fn.__name__ == name)
+        stages[index][1][param] = value
+
+    return sequential(signal, chain_of(stages))
+
+
+@pytest.mark.parametrize('chain, grid', [
+    pytest.param([(fuzz, dict(gain=1.0)), (compressor, dict(threshold_db=-24.0, link=True))],
+                 parameter_grid(**{'fuzz.gain': [1.0, 0.05]}), id='upstream gain into linked compressor'),
+    pytest.param([(compressor, dict(link=True))], parameter_grid(**{'compressor.threshold_db': [-30.0, -10.0]}),
+                 id='linked compressor threshold'),
+    pytest.param([(noise_gate, dict(link=True, threshold_db=-40.0))],
+                 parameter_grid(**{'noise_gate.release_ms': [20.0, 200.0], 'noise_gate.threshold_db': [-40.0, -20.0]}),
+                 id='linked gate'),
+    pytest.param([(overdrive, dict()), (lowpass, dict()), (tremolo, dict()), (delay, dict(delay_ms=20.0))],
+                 parameter_grid(**{'overdrive.gain': [2.0, 8.0], 'lowpass.cutoff_freq': [500.0, 2000.0],
+                                   'tremolo.depth': [0.2, 0.9], 'delay.mix': [0.3]}), id='chain'),
+])
+@pytest.mark.parametrize('channels', [1, 2])
+def test_sweep_matches_separate_renders(chain, grid, channels, chain_of, sequential, signal_of, float64):
+    signal = signal_of(channels, seconds=0.25)
+    outputs = sweep(chain_of(chain), grid).render_all(signal)
+
+    for variant, output in zip(grid, outputs):
+        expected = _separate(signal, chain, variant, chain_of, sequential)
+        assert output.shape == expected.shape
+        np.testing.assert_allclose(output, expected, atol=1e-9)
+
+
+def test_per_channel_array_parameters(chain_of, sequential, signal_of, float64):
+    signal = signal_of(2, seconds=0.25)
+    chain = [(fuzz, dict(threshold=0.3)), (compressor, dict(threshold_db=-24.0))]
+    grid = [{'fuzz.gain': np.array([[2.0], [4.0]])}, {'fuzz.gain': np.array([[8.0], [1.0]])}, {'fuzz.gain': 3.0}]
+
+    outputs = sweep(chain_of(chain), grid).render_all(signal)
+
+    for variant, output in zip(grid, outputs):
+        np.testing.assert_allclose(output, _separate(signal, chain, variant, chain_of, sequential), atol=1e-9)